@@ -14,3 +14,11 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ATSms.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings
+
+if settings.WARM_UP_ON_BOOT:
+    from api.warmup import warm_up
+
+    # Before the server hands this worker any requests
+    warm_up()
@@ -13,7 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
-from decouple import config
+import sys
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'api',
     'corsheaders',
@@ -51,6 +53,10 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Before anything that queries, sessions included, so it runs against
+    # the right tenant and database
+    'api.tenants.TenantMiddleware',
+    'api.tenants.ReadReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -89,6 +95,9 @@ DATABASES = {
         'PASSWORD': 'mypassword',
         'HOST': 'localhost',
         'PORT': '5432',
+        # Keep connections across requests so warm workers skip the handshake
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': True,
 
         # 'NAME': config('DB_NAME'),
         # 'USER': config('DB_USER'),
@@ -98,6 +107,141 @@ DATABASES = {
     }
 }
 
+# Tenants: organisations served from their own database, routed by
+# api.tenants. 'default' above is the tenant for anything unmatched.
+# Each TENANTS entry gets a database alias of the same name, configured by
+# TENANT_<NAME>_DB_NAME/_DB_HOST/_DB_PORT/_DB_USER/_DB_PASSWORD (default:
+# the default database's, with NAME suffixed by the tenant), or by
+# TENANT_<NAME>_DB_SCHEMA to share a database with one schema per tenant.
+# TENANT_<NAME>_REPLICA_HOST adds a read replica, and DB_REPLICA_HOST one
+# for the default tenant; _PORT/_NAME/_USER/_PASSWORD under the same
+# prefix default to the primary's. See api.tenants for what reads it gets.
+# The test runner gets two tenants with replicas so the routing tests have
+# databases.
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+TENANTS = config('TENANTS', default='ngo_a,ngo_b' if TESTING else '', cast=Csv())
+
+def tenant_database(name):
+    prefix = f"TENANT_{name.upper()}_"
+    database = dict(DATABASES['default'])
+    for key in ('NAME', 'HOST', 'PORT', 'USER', 'PASSWORD'):
+        database[key] = config(prefix + 'DB_' + key, default=database[key])
+    schema = config(prefix + 'DB_SCHEMA', default='')
+    if schema:
+        database['OPTIONS'] = {'options': f'-c search_path={schema}'}
+    elif database['NAME'] == DATABASES['default']['NAME']:
+        database['NAME'] = f"{database['NAME']}_{name}"
+    return database
+
+def replica_database(name, primary, prefix, host):
+    database = dict(primary, HOST=host)
+    for key in ('PORT', 'NAME', 'USER', 'PASSWORD'):
+        database[key] = config(prefix + key, default=database[key])
+    # In tests the replica is the primary, so replica reads see test data
+    database['TEST'] = {'MIRROR': name}
+    return database
+
+for tenant_name in TENANTS:
+    DATABASES[tenant_name] = tenant_database(tenant_name)
+    replica_prefix = f"TENANT_{tenant_name.upper()}_REPLICA_"
+    replica_host = config(replica_prefix + 'HOST', default=DATABASES[tenant_name]['HOST'] if TESTING else '')
+    if replica_host:
+        DATABASES[f"{tenant_name}_replica"] = replica_database(
+            tenant_name, DATABASES[tenant_name], replica_prefix, replica_host
+        )
+if config('DB_REPLICA_HOST', default=''):
+    DATABASES['default_replica'] = replica_database(
+        'default', DATABASES['default'], 'DB_REPLICA_', config('DB_REPLICA_HOST')
+    )
+
+# With a replica, GET and HEAD requests read from it. A user or session
+# that writes reads from the primary for REPLICA_STICKY_SECONDS after, so
+# it sees its own changes; keep this above the worst replication lag.
+REPLICA_SAFE_READS = config('DB_REPLICA_SAFE_READS', default=True, cast=bool)
+REPLICA_STICKY_SECONDS = config('DB_REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+DATABASE_ROUTERS = ['api.tenants.TenantRouter']
+
+def tenant_map(value):
+    """
+    Parse 'key=tenant,key=tenant' into a dict
+    """
+    return dict(pair.split('=', 1) for pair in Csv()(value))
+
+# USSD service codes, SMS shortcodes and hosts that identify a tenant, e.g.
+# TENANT_SERVICE_CODES='*384*100#=ngo_a,40100=ngo_a' and TENANT_HOSTS='ngo-a.example.org=ngo_a'.
+# API clients are also routed by the 'tenant' claim of their token.
+TENANT_SERVICE_CODES = tenant_map(config('TENANT_SERVICE_CODES', default=''))
+TENANT_HOSTS = tenant_map(config('TENANT_HOSTS', default=''))
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Rate limits, locks and cached data must be shared by every worker and
+# node, so production needs REDIS_URL (or MEMCACHED_LOCATION). Their add and
+# incr are atomic, which registration dedup, rate limits and locks rely on;
+# a file cache's are not. With neither set each process keeps its own
+# cache, which is only fine for development.
+REDIS_URL = config('REDIS_URL', default='')
+MEMCACHED_LOCATION = config('MEMCACHED_LOCATION', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'atsms',
+        }
+    }
+elif MEMCACHED_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': MEMCACHED_LOCATION,
+            'KEY_PREFIX': 'atsms',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Every cache key carries the tenant, so tenants never see each other's data
+CACHES['default']['KEY_FUNCTION'] = 'api.tenants.cache_key'
+
+# Open DB connections and fill hot caches when a worker boots (api.warmup).
+# Runs when the WSGI/ASGI module is imported, so don't combine it with
+# gunicorn --preload, which would share the connections across forks.
+WARM_UP_ON_BOOT = config('WARM_UP_ON_BOOT', default=True, cast=bool)
+
+# Keep third-party libraries quiet in production
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '%(levelname)s:%(name)s:%(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': config('LOG_LEVEL', default='WARNING'),
+    },
+}
+
+# In-process cache in front of the shared one for hot data (api.caching)
+L1_CACHE_MAX_ENTRIES = config('L1_CACHE_MAX_ENTRIES', default=1000, cast=int)
+L1_CACHE_TIMEOUT = config('L1_CACHE_TIMEOUT', default=60, cast=float)
+# How stale a worker's view of an invalidation may be
+CACHE_VERSION_TIMEOUT = config('CACHE_VERSION_TIMEOUT', default=1, cast=float)
+
 # Custom user model
 AUTH_USER_MODEL = 'api.User'
 
@@ -125,6 +269,107 @@ REST_FRAMEWORK = {
     )
 }
 
+# Country code assumed for phone numbers entered without one
+PHONE_COUNTRY_CODE = config('PHONE_COUNTRY_CODE', default='254')
+
+# Africa's Talking credentials, read by the SMS gateway on first send
+AT_USERNAME = config('AT_USERNAME', default='sandbox')
+AT_API_KEY = config('AT_API_KEY', default='')
+
+# Base URL the USSD handler uses to call back into the REST API
+API_BASE_URL = config('API_BASE_URL', default='http://localhost:8000/api/')
+API_TOKEN = config('API_TOKEN', default='')
+# Seconds before a call back into the API gives up
+API_TIMEOUT = config('API_TIMEOUT', default=5.0, cast=float)
+# Where registrations are kept if the API call fails
+PENDING_REGISTRATIONS_DIR = config('PENDING_REGISTRATIONS_DIR', default=str(BASE_DIR))
+
+# Fire-and-forget work from request handlers (api.background): threads per
+# worker process, and how much may queue before new work is refused
+BACKGROUND_WORKERS = config('BACKGROUND_WORKERS', default=4, cast=int)
+BACKGROUND_QUEUE_LIMIT = config('BACKGROUND_QUEUE_LIMIT', default=1000, cast=int)
+
+# Circuit breakers (api.circuits) stop calling a dependency after this many
+# failures in a row, and let one call through to test it after this long
+CIRCUIT_FAILURE_THRESHOLD = config('CIRCUIT_FAILURE_THRESHOLD', default=5, cast=int)
+CIRCUIT_RESET_SECONDS = config('CIRCUIT_RESET_SECONDS', default=30, cast=float)
+
+# Fault injection (api.faults), never set in production. A list such as
+# 'api=partition,sms_gateway=slow:0.5,database=error' replaces the API and
+# SMS gateway with local stubs that misbehave as asked, for the given share
+# of calls, and makes database queries fail.
+FAULTS = config('FAULTS', default='', cast=Csv())
+# How long slow calls take, and how long partitioned calls without their
+# own timeout hang before failing
+FAULT_SLOW_SECONDS = config('FAULT_SLOW_SECONDS', default=2.0, cast=float)
+FAULT_PARTITION_SECONDS = config('FAULT_PARTITION_SECONDS', default=10.0, cast=float)
+
+# Outbound SMS. Use 'api.gateways.FakeGateway' to run without sending anything
+SMS_GATEWAY = config('SMS_GATEWAY', default='api.gateways.AfricasTalkingGateway')
+# Campaign sends are paced to the gateway quota
+SMS_MESSAGES_PER_SECOND = config('SMS_MESSAGES_PER_SECOND', default=10, cast=float)
+SMS_BATCH_SIZE = config('SMS_BATCH_SIZE', default=100, cast=int)
+# Built messages are shortened to fit this many billed segments
+SMS_MAX_SEGMENTS = config('SMS_MAX_SEGMENTS', default=2, cast=int)
+# Mentor-mentee SMS relay (api.relay): send rate per worker, how far sends
+# may fall behind before the oldest are dropped, and how long a phone's
+# conversations stay cached
+RELAY_MESSAGES_PER_SECOND = config('RELAY_MESSAGES_PER_SECOND', default=5, cast=float)
+RELAY_QUEUE_LIMIT = config('RELAY_QUEUE_LIMIT', default=10000, cast=int)
+RELAY_STATE_TIMEOUT = config('RELAY_STATE_TIMEOUT', default=600, cast=int)
+# Incoming SMS and delivery reports are only accepted when the callback URL
+# carries this token (?token=...) or an X-Callback-Token header, or comes
+# from one of these gateway IPs. With neither set, both callbacks refuse
+# everything.
+SMS_CALLBACK_TOKEN = config('SMS_CALLBACK_TOKEN', default='')
+SMS_CALLBACK_IPS = config('SMS_CALLBACK_IPS', default='', cast=Csv())
+
+# Resources returned by recommendations where the caller sets no limit
+RECOMMENDATION_LIMIT = config('RECOMMENDATION_LIMIT', default=20, cast=int)
+# The recommendation index is rebuilt this often to pick up popularity changes
+RECOMMENDATION_INDEX_TIMEOUT = config('RECOMMENDATION_INDEX_TIMEOUT', default=900, cast=int)
+
+# Active mentorships older than this are completed by the lifecycle worker
+MENTORSHIP_DURATION_DAYS = config('MENTORSHIP_DURATION_DAYS', default=180, cast=int)
+
+# Delivery reports are buffered and written in batches of this size,
+# or after this many seconds, whichever comes first
+DLR_BUFFER_SIZE = config('DLR_BUFFER_SIZE', default=500, cast=int)
+DLR_FLUSH_INTERVAL = config('DLR_FLUSH_INTERVAL', default=2.0, cast=float)
+
+# Resource view and click events are written in batches of this size, or
+# after this many seconds. Past the limit, the oldest unwritten are dropped.
+EVENT_BUFFER_SIZE = config('EVENT_BUFFER_SIZE', default=500, cast=int)
+EVENT_FLUSH_INTERVAL = config('EVENT_FLUSH_INTERVAL', default=5.0, cast=float)
+EVENT_BUFFER_LIMIT = config('EVENT_BUFFER_LIMIT', default=50000, cast=int)
+
+# Match attempt counters (api.analytics) are written in batches of this
+# many county/interest pairs, or after this many seconds
+MATCH_BUFFER_SIZE = config('MATCH_BUFFER_SIZE', default=500, cast=int)
+MATCH_FLUSH_INTERVAL = config('MATCH_FLUSH_INTERVAL', default=5.0, cast=float)
+
+# Mobile app sync (api.sync): changes per response, and how long deletes
+# are remembered. Apps that haven't synced for longer get a full copy.
+SYNC_PAGE_SIZE = config('SYNC_PAGE_SIZE', default=500, cast=int)
+SYNC_TOMBSTONE_DAYS = config('SYNC_TOMBSTONE_DAYS', default=30, cast=int)
+
+# Reverse proxies in front of the app that append to X-Forwarded-For.
+# Client IPs for rate limits are read from it only when this is set.
+TRUSTED_PROXY_COUNT = config('TRUSTED_PROXY_COUNT', default=0, cast=int)
+
+# Rate limits as 'requests/period', checked against the shared cache
+RATE_LIMITS = {
+    'ussd_phone': config('RATE_LIMIT_USSD_PHONE', default='30/min'),
+    'ussd_session': config('RATE_LIMIT_USSD_SESSION', default='20/min'),
+    # Africa's Talking forwards every USSD user from a few gateway IPs
+    'ussd_ip': config('RATE_LIMIT_USSD_IP', default='3000/min'),
+    'auth_ip': config('RATE_LIMIT_AUTH_IP', default='20/min'),
+    'auth_account': config('RATE_LIMIT_AUTH_ACCOUNT', default='5/min'),
+    'relay_phone': config('RATE_LIMIT_RELAY_PHONE', default='10/min'),
+    # Requests per user to the resource event endpoint, each up to 100 events
+    'resource_events': config('RATE_LIMIT_RESOURCE_EVENTS', default='30/min'),
+}
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
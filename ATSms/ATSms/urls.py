@@ -16,12 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from api.lazy import lazy_view
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/', lazy_view('api.auth_views.ThrottledTokenObtainPairView', csrf_exempt=True), name='token_obtain_pair'),
+    path('api/token/refresh/', lazy_view('api.auth_views.ThrottledTokenRefreshView', csrf_exempt=True), name='token_refresh'),
     path('api/', include('api.urls')),
 ]
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ATSms.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings
+
+if settings.WARM_UP_ON_BOOT:
+    from api.warmup import warm_up
+
+    # Before the server hands this worker any requests
+    warm_up()
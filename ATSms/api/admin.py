@@ -1,6 +1,70 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.contrib.postgres.search import SearchQuery
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 from .models import User, Mentee, Mentor, Mentorship, Resource
+from .tenants import read_connection
+
+# Below this many rows an exact COUNT(*) is cheap enough
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+COUNTY_CHOICES_KEY = 'admin_county_choices'
+COUNTY_CHOICES_TIMEOUT = 3600
+
+def estimated_count(model):
+    """
+    Row count estimate from the planner statistics, kept current by autovacuum
+    """
+    with read_connection().cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else -1
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that skips COUNT(*) on large unfiltered changelists.
+    Filtered or searched lists still get an exact count.
+    """
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_count(self.object_list.model)
+            if estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Avoid the second, unfiltered COUNT(*) shown next to search results
+    show_full_result_count = False
+
+class CountyListFilter(admin.SimpleListFilter):
+    """
+    County filter whose choices are cached, instead of the DISTINCT scan
+    the default filter runs on every changelist load.
+    """
+    title = 'county'
+    parameter_name = 'county'
+    
+    def lookups(self, request, model_admin):
+        counties = cache.get(COUNTY_CHOICES_KEY)
+        if counties is None:
+            counties = list(
+                Mentee.objects.order_by('county').values_list('county', flat=True).distinct()
+            )
+            cache.set(COUNTY_CHOICES_KEY, counties, COUNTY_CHOICES_TIMEOUT)
+        return [(county, county) for county in counties]
+    
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(county=self.value())
+        return queryset
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('email', 'phone', 'is_mentor', 'is_mentee', 'is_staff')
@@ -18,25 +82,42 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ('email', 'phone')
     ordering = ('email',)
 
-class MenteeAdmin(admin.ModelAdmin):
+class MenteeAdmin(ScalableAdmin):
     list_display = ('name', 'age', 'county', 'language', 'communication_preference')
-    list_filter = ('county', 'language', 'communication_preference')
+    list_filter = (CountyListFilter, 'language', 'communication_preference')
     search_fields = ('name', 'county')
+    raw_id_fields = ('user',)
+    ordering = ('-id',)
 
-class MentorAdmin(admin.ModelAdmin):
+class MentorAdmin(ScalableAdmin):
     list_display = ('name', 'language_preference', 'mentees_count', 'max_mentees', 'visibility')
     list_filter = ('language_preference', 'visibility')
     search_fields = ('name',)
+    raw_id_fields = ('user',)
+    ordering = ('-id',)
 
-class MentorshipAdmin(admin.ModelAdmin):
+class MentorshipAdmin(ScalableAdmin):
     list_display = ('mentee', 'mentor', 'status', 'created_at')
     list_filter = ('status',)
+    list_select_related = ('mentee', 'mentor')
     search_fields = ('mentee__name', 'mentor__name')
+    autocomplete_fields = ('mentee', 'mentor')
+    ordering = ('-created_at',)
 
-class ResourceAdmin(admin.ModelAdmin):
+class ResourceAdmin(ScalableAdmin):
     list_display = ('title', 'created_by', 'created_at')
     list_filter = ('created_at',)
+    list_select_related = ('created_by',)
     search_fields = ('title', 'description', 'tags')
+    autocomplete_fields = ('created_by',)
+    ordering = ('-created_at',)
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Use the indexed search vector rather than ILIKE scans over every column
+        if not search_term:
+            return queryset, False
+        query = SearchQuery(search_term, config='simple', search_type='websearch')
+        return queryset.filter(search_vector=query), False
 
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Mentee, MenteeAdmin)
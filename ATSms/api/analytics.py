@@ -0,0 +1,219 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .models import SupplyDemand
+from .tenants import get_tenant, tenant_connection, tenant_context
+
+logger = logging.getLogger(__name__)
+
+SUPPLY_DEMAND_VERSION_KEY = 'supply_demand_version'
+SUPPLY_DEMAND_KEY = 'supply_demand'
+SUPPLY_DEMAND_TIMEOUT = 300  # match counters change live, so keep this short
+
+# One pass per source table, unnesting the interest/expertise/county arrays,
+# merged into a single upsert so readers never see a half-built summary.
+# Match counters are left alone; they are maintained by record_match_attempt.
+REFRESH_SQL = """
+WITH stats AS (
+    SELECT county, interest, count(*) AS mentees, 0 AS capacity, 0 AS active
+    FROM api_mentee, unnest(interests) AS interest
+    GROUP BY county, interest
+    UNION ALL
+    SELECT county, interest, 0, sum(greatest(max_mentees - mentees_count, 0)), 0
+    FROM api_mentor, unnest(counties) AS county, unnest(expertise) AS interest
+    GROUP BY county, interest
+    UNION ALL
+    SELECT me.county, interest, 0, 0, count(*)
+    FROM api_mentorship ms
+    JOIN api_mentee me ON me.id = ms.mentee_id, unnest(me.interests) AS interest
+    WHERE ms.status = 'active'
+    GROUP BY me.county, interest
+)
+INSERT INTO api_supplydemand (
+    county, interest, mentee_count, mentor_capacity, active_mentorships,
+    match_attempts, match_failures, refreshed_at
+)
+SELECT county, interest, sum(mentees), sum(capacity), sum(active), 0, 0, %(now)s
+FROM stats
+GROUP BY county, interest
+ON CONFLICT (county, interest) DO UPDATE SET
+    mentee_count = EXCLUDED.mentee_count,
+    mentor_capacity = EXCLUDED.mentor_capacity,
+    active_mentorships = EXCLUDED.active_mentorships,
+    refreshed_at = EXCLUDED.refreshed_at
+"""
+
+# Pairs that no longer have any mentees, mentors or mentorships
+RESET_STALE_SQL = """
+UPDATE api_supplydemand
+SET mentee_count = 0, mentor_capacity = 0, active_mentorships = 0, refreshed_at = %(now)s
+WHERE refreshed_at IS NULL OR refreshed_at < %(now)s
+"""
+
+RECORD_MATCHES_SQL = """
+INSERT INTO api_supplydemand AS sd (
+    county, interest, mentee_count, mentor_capacity, active_mentorships,
+    match_attempts, match_failures, refreshed_at
+)
+VALUES {values}
+ON CONFLICT (county, interest) DO UPDATE SET
+    match_attempts = sd.match_attempts + EXCLUDED.match_attempts,
+    match_failures = sd.match_failures + EXCLUDED.match_failures
+"""
+
+
+def refresh_supply_demand():
+    """
+    Rebuild the supply/demand counts in one transaction.
+
+    Returns:
+        int: Number of county/interest pairs refreshed
+    """
+    now = timezone.now()
+    with transaction.atomic(using=get_tenant()), tenant_connection().cursor() as cursor:
+        cursor.execute(REFRESH_SQL, {'now': now})
+        refreshed = cursor.rowcount
+        cursor.execute(RESET_STALE_SQL, {'now': now})
+    cache.set(SUPPLY_DEMAND_VERSION_KEY, now.timestamp(), None)
+    return refreshed
+
+def write_match_attempts(counts):
+    """
+    Add buffered match counters to the summary in one upsert
+
+    Args:
+        counts (dict): (county, interest) -> [attempts, failures]
+
+    Returns:
+        int: Number of county/interest pairs updated
+    """
+    params = []
+    # Sorted, so concurrent writers lock summary rows in the same order
+    for (county, interest), (attempts, failures) in sorted(counts.items()):
+        params.extend([county, interest, attempts, failures])
+    values = ', '.join(['(%s, %s, 0, 0, 0, %s, %s, NULL)'] * len(counts))
+    with tenant_connection().cursor() as cursor:
+        cursor.execute(RECORD_MATCHES_SQL.format(values=values), params)
+        return cursor.rowcount
+
+class MatchAttemptBuffer:
+    """
+    Match counters waiting to be written. Counting a match request only
+    touches memory; the summary rows every match in a county shares are
+    updated from a background thread, once per MATCH_FLUSH_INTERVAL or
+    MATCH_BUFFER_SIZE pairs. Counts still buffered when a worker is
+    killed are lost; they only feed the analytics.
+    """
+    def __init__(self, max_size=None, max_age=None):
+        self._max_size = max_size
+        self._max_age = max_age
+        self._counts = {}
+        self._timer = None
+        self._flushing = False
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return self._max_size or settings.MATCH_BUFFER_SIZE
+
+    @property
+    def max_age(self):
+        return self._max_age or settings.MATCH_FLUSH_INTERVAL
+
+    def add(self, county, interests, matched):
+        with self._lock:
+            for interest in set(interests):
+                counts = self._counts.setdefault((get_tenant(), county, interest), [0, 0])
+                counts[0] += 1
+                counts[1] += 0 if matched else 1
+            if self._timer is None:
+                # Make sure lone attempts are written even if no more arrive
+                self._timer = threading.Timer(self.max_age, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+            if len(self._counts) >= self.max_size and not self._flushing:
+                self._flushing = True
+                threading.Thread(target=self._flush_in_background, daemon=True).start()
+
+    def flush(self):
+        """
+        Write everything buffered so far
+
+        Returns:
+            int: Number of county/interest pairs updated
+        """
+        with self._lock:
+            counts, self._counts = self._counts, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        by_tenant = {}
+        for (tenant, county, interest), pair_counts in counts.items():
+            by_tenant.setdefault(tenant, {})[(county, interest)] = pair_counts
+        updated = 0
+        for tenant, tenant_counts in by_tenant.items():
+            try:
+                with tenant_context(tenant):
+                    updated += write_match_attempts(tenant_counts)
+            except Exception as e:
+                logger.error(f"Failed to write match counters for {len(tenant_counts)} pairs for {tenant}: {e}")
+        return updated
+
+    def _flush_in_background(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            self._flushing = False
+            connections.close_all()
+
+match_attempts = MatchAttemptBuffer()
+atexit.register(match_attempts.flush)
+
+def record_match_attempt(county, interests, matched):
+    """
+    Count a match attempt, and a failure if no mentor was found, against
+    every interest of the mentee. Buffered, so it never holds up or fails
+    the match itself.
+    """
+    if interests:
+        match_attempts.add(county, interests, matched)
+
+def get_supply_demand(county=None):
+    """
+    Get the summary rows, cached until the next refresh or a few minutes
+    """
+    version = cache.get(SUPPLY_DEMAND_VERSION_KEY, 0)
+    key = f"{SUPPLY_DEMAND_KEY}:{version}:{county or ''}"
+    rows = cache.get(key)
+    if rows is None:
+        queryset = SupplyDemand.objects.order_by('county', 'interest')
+        if county:
+            queryset = queryset.filter(county=county)
+        rows = [
+            {
+                'county': row.county,
+                'interest': row.interest,
+                'mentees': row.mentee_count,
+                'active_mentorships': row.active_mentorships,
+                'mentor_capacity': row.mentor_capacity,
+                # Mentees still waiting for a mentor beyond what free slots can absorb
+                'shortfall': max(row.mentee_count - row.active_mentorships - row.mentor_capacity, 0),
+                'match_attempts': row.match_attempts,
+                'match_failures': row.match_failures,
+                'match_failure_rate': (
+                    round(row.match_failures / row.match_attempts, 3) if row.match_attempts else None
+                ),
+                'refreshed_at': row.refreshed_at,
+            }
+            for row in queryset
+        ]
+        cache.set(key, rows, SUPPLY_DEMAND_TIMEOUT)
+    return rows
@@ -1,24 +1,31 @@
+from collections.abc import Mapping
+
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 
 from .serializers import UserSerializer
+from .throttling import AuthRateThrottle
+from .tenants import TENANT_CLAIM, get_tenant
 
 User = get_user_model()
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [AuthRateThrottle]
     
     def post(self, request):
         data = request.data
         
         # Check if email or phone is provided
-        if not data.get('email') and not data.get('phone'):
+        if not isinstance(data, Mapping) or (not data.get('email') and not data.get('phone')):
             return Response(
                 {"error": "Either email or phone is required"},
                 status=status.HTTP_400_BAD_REQUEST
@@ -34,6 +41,7 @@ class RegisterView(APIView):
             
             # Generate tokens
             refresh = RefreshToken.for_user(user)
+            refresh[TENANT_CLAIM] = get_tenant()
             
             return Response({
                 "user": serializer.data,
@@ -41,4 +49,22 @@ class RegisterView(APIView):
                 "access": str(refresh.access_token)
             }, status=status.HTTP_201_CREATED)
         
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class TenantTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Tokens name the tenant they were issued by, so API calls are routed
+    to its database whatever host they arrive on
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[TENANT_CLAIM] = get_tenant()
+        return token
+
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    serializer_class = TenantTokenObtainPairSerializer
+    throttle_classes = [AuthRateThrottle]
+
+class ThrottledTokenRefreshView(TokenRefreshView):
+    throttle_classes = [AuthRateThrottle]
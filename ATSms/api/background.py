@@ -0,0 +1,88 @@
+"""
+Fire-and-forget work from request handlers: welcome SMS, the
+registration call into the API, saving a language choice.
+
+A thread per task piles up threads when a dependency hangs, each held
+for a full timeout. Tasks go into a bounded queue instead, run by at most
+BACKGROUND_WORKERS threads that exit once it is empty. When more than
+BACKGROUND_QUEUE_LIMIT tasks are waiting, new ones are refused so the
+caller can fall back to something local.
+"""
+import contextvars
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+logger = logging.getLogger(__name__)
+
+
+def task_name(target):
+    return getattr(target, '__name__', repr(target))
+
+
+class BackgroundTasks:
+    """
+    Bounded queue of tasks and the threads running them. Tasks run in a
+    copy of the submitter's context, so in its tenant.
+    """
+    def __init__(self, workers=None, limit=None):
+        self._workers = workers
+        self._limit = limit
+        self._queue = deque()
+        self._running = 0
+        self._lock = threading.Lock()
+        self.refused = 0
+
+    @property
+    def workers(self):
+        return self._workers or settings.BACKGROUND_WORKERS
+
+    @property
+    def limit(self):
+        return self._limit or settings.BACKGROUND_QUEUE_LIMIT
+
+    def submit(self, target, *args):
+        """
+        Queue target(*args) to run in the background
+
+        Returns:
+            bool: False if the queue is full and the task was refused
+        """
+        with self._lock:
+            if len(self._queue) >= self.limit:
+                self.refused += 1
+                logger.warning(f"Refused background task {task_name(target)}, {len(self._queue)} waiting")
+                return False
+            self._queue.append((contextvars.copy_context(), target, args))
+            if self._running < self.workers:
+                self._running += 1
+                threading.Thread(target=self._work, daemon=True).start()
+        return True
+
+    def _work(self):
+        close_old_connections()
+        try:
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        self._running -= 1
+                        return
+                    context, target, args = self._queue.popleft()
+                try:
+                    context.run(target, *args)
+                except Exception as e:
+                    logger.error(f"Background task {task_name(target)} failed: {e}")
+        finally:
+            connections.close_all()
+
+    @property
+    def running(self):
+        return self._running
+
+    def __len__(self):
+        return len(self._queue)
+
+background_tasks = BackgroundTasks()
@@ -0,0 +1,216 @@
+"""
+Two-level cache for hot, read-mostly data such as resource menus.
+
+L1 is a small in-process dict with TTL and LRU eviction, so repeat reads
+in a worker cost no network round trip. L2 is the shared Django cache
+(Redis or memcached, see CACHES in settings), so every worker and
+node sees the same data and only one of them has to build it.
+
+Keys live in namespaces with a version stored in L2. Bumping the version
+invalidates every key in the namespace on every node: other workers pick
+up the new version within CACHE_VERSION_TIMEOUT seconds and miss on the
+old keys from then on. Nothing is ever deleted key by key.
+
+Values come back shared between threads, so callers must treat them as
+read-only.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .tenants import get_tenant
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION_KEY = 'cache_version'
+REFRESH_LOCK_KEY = 'cache_refresh'
+REFRESH_LOCK_TIMEOUT = 30  # longest a rebuild may take before another worker tries
+# How long a worker waits for another node to build a missing value
+SINGLE_FLIGHT_WAIT = 2.0
+SINGLE_FLIGHT_POLL = 0.05
+
+
+class LocalCache:
+    """
+    In-process cache with a per-entry expiry and least recently used
+    eviction once max_entries is reached. Like the shared cache, entries
+    are kept apart per tenant.
+    """
+    def __init__(self, max_entries=None, clock=time.monotonic):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.clock = clock
+
+    @property
+    def max_entries(self):
+        return self._max_entries or settings.L1_CACHE_MAX_ENTRIES
+
+    def get(self, key, default=None):
+        key = (get_tenant(), key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        key = (get_tenant(), key)
+        with self._lock:
+            self._entries[key] = (value, self.clock() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        key = (get_tenant(), key)
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+local_cache = LocalCache()
+
+# Striped locks so threads of one worker build a missing key only once
+# without keeping a lock object per key around
+_build_locks = [threading.Lock() for _ in range(64)]
+
+def _build_lock(key):
+    return _build_locks[hash(key) % len(_build_locks)]
+
+
+def versioned_key(namespace, version, key):
+    """
+    Shared cache key for a key under a namespace version. Keys come from
+    request input, so they are hashed: memcached refuses keys over 250
+    characters or with spaces.
+    """
+    return f"{namespace}:{version}:{hashlib.md5(key.encode()).hexdigest()}"
+
+def get_version(namespace):
+    """
+    Current version of a namespace, read from L2 at most once per
+    CACHE_VERSION_TIMEOUT per worker. Versions are timestamps, so they
+    double as the time the namespace last changed.
+    """
+    key = f"{CACHE_VERSION_KEY}:{namespace}"
+    version = local_cache.get(key)
+    if version is None:
+        version = cache.get(key)
+        if version is None:
+            # Cold L2: we can't know when the namespace last changed, so start now
+            version = time.time()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        local_cache.set(key, version, settings.CACHE_VERSION_TIMEOUT)
+    return version
+
+def bump_version(namespace):
+    """
+    Invalidate every key in a namespace, on every node
+    """
+    key = f"{CACHE_VERSION_KEY}:{namespace}"
+    version = time.time()
+    cache.set(key, version, None)
+    local_cache.set(key, version, settings.CACHE_VERSION_TIMEOUT)
+    return version
+
+def get_or_build(namespace, key, build, timeout):
+    """
+    Read a value through L1 and L2, building it at most once across
+    workers when it is missing.
+
+    Entries carry a soft expiry. Past it, the first worker to take the
+    refresh lock rebuilds while everyone else keeps serving the old
+    value, so a hot key never expires for all callers at once. L2 keeps
+    entries for twice the timeout to leave room for that refresh.
+
+    Args:
+        namespace (str): Version namespace the key belongs to
+        key (str): Key within the namespace
+        build (callable): Produces the value on a miss
+        timeout (int): Seconds before the value is refreshed
+    """
+    full_key = versioned_key(namespace, get_version(namespace), key)
+
+    entry = local_cache.get(full_key)
+    if entry is None:
+        entry = cache.get(full_key)
+    if entry is not None:
+        value, refresh_at = entry
+        remaining = refresh_at - time.time()
+        if remaining > 0:
+            local_cache.set(full_key, entry, min(remaining, settings.L1_CACHE_TIMEOUT))
+            return value
+        # Stale: one worker refreshes, the rest keep the old value meanwhile
+        if not cache.add(f"{REFRESH_LOCK_KEY}:{full_key}", True, REFRESH_LOCK_TIMEOUT):
+            return value
+        return _build(full_key, build, timeout)
+
+    with _build_lock(full_key):
+        # Another thread of this worker may have built it while we waited
+        entry = local_cache.get(full_key) or cache.get(full_key)
+        if entry is not None:
+            return entry[0]
+
+        if not cache.add(f"{REFRESH_LOCK_KEY}:{full_key}", True, REFRESH_LOCK_TIMEOUT):
+            # Another node is building it; wait a little rather than pile on
+            deadline = time.monotonic() + SINGLE_FLIGHT_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(SINGLE_FLIGHT_POLL)
+                entry = cache.get(full_key)
+                if entry is not None:
+                    local_cache.set(full_key, entry, settings.L1_CACHE_TIMEOUT)
+                    return entry[0]
+            logger.warning(f"Gave up waiting for {full_key} to be built elsewhere")
+            return _build(full_key, build, timeout, release=False)
+        return _build(full_key, build, timeout)
+
+def _build(full_key, build, timeout, release=True):
+    try:
+        value = build()
+        entry = (value, time.time() + timeout)
+        cache.set(full_key, entry, timeout * 2)
+        local_cache.set(full_key, entry, min(timeout, settings.L1_CACHE_TIMEOUT))
+        return value
+    finally:
+        if release:
+            cache.delete(f"{REFRESH_LOCK_KEY}:{full_key}")
+
+def peek(namespace, key):
+    """
+    Read the value stored under the current version of a namespace
+    straight from L2, skipping L1 and without building it. For writers
+    that update a value in place; the result is their own copy.
+    """
+    version = cache.get(f"{CACHE_VERSION_KEY}:{namespace}")
+    if version is None:
+        return None
+    entry = cache.get(versioned_key(namespace, version, key))
+    return entry[0] if entry is not None else None
+
+def replace(namespace, key, value, timeout):
+    """
+    Store an updated value under a new version of its namespace. Meant
+    for namespaces holding one value that changes in place, such as an
+    index: other workers switch to it as they pick up the new version.
+    """
+    full_key = versioned_key(namespace, bump_version(namespace), key)
+    entry = (value, time.time() + timeout)
+    cache.set(full_key, entry, timeout * 2)
+    local_cache.set(full_key, entry, min(timeout, settings.L1_CACHE_TIMEOUT))
@@ -0,0 +1,86 @@
+import logging
+
+from django.core.cache import cache
+
+from .circuits import database_breaker
+from .models import Mentee
+from .translations import DEFAULT_LANGUAGE, normalize_language
+
+logger = logging.getLogger(__name__)
+
+# Compact profile of a USSD caller, keyed by E.164 phone number
+CALLER_KEY = 'ussd_caller'
+CALLER_CACHE_TIMEOUT = 86400
+# Unregistered numbers are re-checked sooner, they may register via the app
+UNKNOWN_CALLER_TIMEOUT = 600
+
+
+def caller_key(phone_number):
+    return f"{CALLER_KEY}:{phone_number}"
+
+def unknown_caller(language=DEFAULT_LANGUAGE):
+    return {'mentee_id': None, 'language': language}
+
+def lookup_caller(phone_number):
+    """
+    Find the mentee registered with a phone number in one query, using
+    the unique indexes on User.phone and Mentee.user
+    """
+    row = (
+        Mentee.objects.filter(user__phone=phone_number)
+        .values('id', 'name', 'language', 'interests')
+        .first()
+    )
+    if row is None:
+        return unknown_caller()
+    return {
+        'mentee_id': row['id'],
+        'name': row['name'],
+        'language': normalize_language(row['language']),
+        'interests': row['interests'],
+    }
+
+def get_caller(phone_number):
+    """
+    Get a caller's cached profile, hitting the database only on a cache miss.
+
+    Returns:
+        dict: mentee_id (None for unregistered callers) and language, plus
+        name and interests for registered mentees
+    """
+    key = caller_key(phone_number)
+    caller = cache.get(key)
+    if caller is None:
+        try:
+            with database_breaker():
+                caller = lookup_caller(phone_number)
+        except Exception as e:
+            # Serve the caller as new rather than failing the hop, and
+            # stop trying the database for a while if it keeps failing
+            logger.error(f"Caller lookup failed: {e}")
+            return unknown_caller()
+        timeout = CALLER_CACHE_TIMEOUT if caller['mentee_id'] else UNKNOWN_CALLER_TIMEOUT
+        cache.set(key, caller, timeout)
+    return caller
+
+def get_cached_language(phone_number):
+    """
+    Get a caller's language from cache only, for paths that must not query
+    """
+    caller = cache.get(caller_key(phone_number))
+    return caller['language'] if caller else DEFAULT_LANGUAGE
+
+def set_caller_language(phone_number, language):
+    """
+    Switch the language of a caller's cached profile
+    """
+    caller = dict(get_caller(phone_number), language=language)
+    timeout = CALLER_CACHE_TIMEOUT if caller['mentee_id'] else UNKNOWN_CALLER_TIMEOUT
+    cache.set(caller_key(phone_number), caller, timeout)
+
+def forget_caller(phone_number):
+    """
+    Drop a cached caller after their profile changed
+    """
+    if phone_number:
+        cache.delete(caller_key(phone_number))
@@ -0,0 +1,145 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .gateways import get_gateway, successful_recipients
+from .delivery import record_outbound
+from .models import Campaign, Mentee
+from .segments import build_resource_sms, measure
+from .translations import LANGUAGES
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_LOCK_KEY = 'campaign_lock'
+CAMPAIGN_LOCK_TIMEOUT = 300  # renewed after every batch
+
+
+def create_resource_campaigns(resource):
+    """
+    Queue one campaign per language announcing a new resource to mentees
+    interested in any of its tags, so each is told once
+    """
+    if not resource.tags:
+        return []
+    details = resource.link or resource.sms_text or ''
+    tags = '/'.join(resource.tags)
+    campaigns = [
+        Campaign(
+            name=f"New resource: {resource.title} ({tags}, {language})",
+            message=build_resource_sms(tags, resource.title, details, language)[0],
+            interests=list(resource.tags),
+            language=language,
+            resource=resource,
+        )
+        for language in LANGUAGES
+    ]
+    return Campaign.objects.bulk_create(campaigns)
+
+def campaign_recipients(campaign, batch_size):
+    """
+    Yield (last mentee id, phone numbers) batches after the campaign's
+    checkpoint, using keyset pagination over the interests GIN index
+    """
+    after = campaign.last_mentee_id
+    queryset = Mentee.objects.filter(
+        interests__overlap=campaign.interests,
+        user__phone__isnull=False
+    )
+    if campaign.language:
+        queryset = queryset.filter(language=campaign.language)
+    
+    while True:
+        rows = list(queryset.filter(id__gt=after).order_by('id').values_list('id', 'user__phone')[:batch_size])
+        if not rows:
+            return
+        after = rows[-1][0]
+        yield after, [phone for _, phone in rows]
+
+class Pacer:
+    """
+    Spaces sends so the average rate stays under messages_per_second
+    """
+    def __init__(self, messages_per_second, sleep=time.sleep, clock=time.monotonic):
+        self.interval = 1 / messages_per_second
+        self.sleep = sleep
+        self.clock = clock
+        self.next_send = clock()
+    
+    def wait(self, messages):
+        delay = self.next_send - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+        self.next_send = max(self.next_send, self.clock()) + messages * self.interval
+
+def run_campaign(campaign, gateway=None, batch_size=None, messages_per_second=None, pacer=None):
+    """
+    Send a campaign in throttled multi-recipient batches, resuming from
+    its checkpoint.
+    
+    The checkpoint is advanced before each batch goes out, so a crash in
+    the middle of a send never delivers that batch twice. If the gateway
+    raises, the checkpoint is rolled back and the campaign marked failed,
+    so the next run retries that batch.
+    
+    Returns:
+        bool: True if the campaign completed
+    """
+    gateway = gateway or get_gateway()
+    batch_size = batch_size or settings.SMS_BATCH_SIZE
+    pacer = pacer or Pacer(messages_per_second or settings.SMS_MESSAGES_PER_SECOND)
+    
+    lock_key = f"{CAMPAIGN_LOCK_KEY}:{campaign.pk}"
+    if not cache.add(lock_key, True, CAMPAIGN_LOCK_TIMEOUT):
+        logger.info(f"Campaign {campaign.pk} is already running elsewhere")
+        return False
+    
+    try:
+        campaign.refresh_from_db()
+        if campaign.status == 'completed':
+            return True
+        
+        Campaign.objects.filter(pk=campaign.pk).update(
+            status='running',
+            started_at=campaign.started_at or timezone.now()
+        )
+        
+        segments = measure(campaign.message).segments
+        for last_id, phones in campaign_recipients(campaign, batch_size):
+            pacer.wait(len(phones))
+            
+            previous = campaign.last_mentee_id
+            Campaign.objects.filter(pk=campaign.pk).update(last_mentee_id=last_id)
+            campaign.last_mentee_id = last_id
+            
+            try:
+                response = gateway.send(campaign.message, phones)
+            except Exception as e:
+                logger.error(f"Campaign {campaign.pk} batch failed: {e}")
+                Campaign.objects.filter(pk=campaign.pk).update(last_mentee_id=previous, status='failed')
+                campaign.last_mentee_id = previous
+                return False
+            
+            record_outbound(response, 'campaign', campaign, segments)
+            sent = len(successful_recipients(response))
+            Campaign.objects.filter(pk=campaign.pk).update(
+                sent_count=F('sent_count') + sent,
+                failed_count=F('failed_count') + len(phones) - sent
+            )
+            cache.touch(lock_key, CAMPAIGN_LOCK_TIMEOUT)
+        
+        Campaign.objects.filter(pk=campaign.pk).update(status='completed', completed_at=timezone.now())
+        return True
+    finally:
+        cache.delete(lock_key)
+        campaign.refresh_from_db()
+
+def run_pending_campaigns(**kwargs):
+    """
+    Run every campaign that has not completed, oldest first
+    """
+    campaigns = Campaign.objects.exclude(status='completed').order_by('created_at')
+    return [run_campaign(campaign, **kwargs) for campaign in campaigns]
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+
+from .models import Resource
+from .caching import bump_version, get_or_build, get_version
+
+# Bumped on every Resource change so stale lists are never read again, on any node
+CATALOG_NAMESPACE = 'resource_catalog'
+RESOURCE_LIST_KEY = 'resource_list'
+RESOURCE_LIST_TIMEOUT = 3600  # 1 hour, lists also go stale on any catalog change
+
+
+def get_catalog_version():
+    """
+    Get the current catalog version, which is the time it last changed
+    """
+    return get_version(CATALOG_NAMESPACE)
+
+def invalidate_catalog():
+    """
+    Move the catalog to a new version, orphaning every cached list
+    """
+    bump_version(CATALOG_NAMESPACE)
+
+def summarize_resources(resources):
+    """
+    Short summaries for mentees who use USSD
+    """
+    return [{"title": r.title, "sms_text": r.sms_text or r.description[:100]} for r in resources]
+
+def get_resource_list(tag=None, comm_pref='app'):
+    """
+    Get the serialized resources for a tag in the shape a mentee's
+    communication preference needs, from cache when possible.
+
+    Returns:
+        tuple: (data, etag, last_modified)
+    """
+    shape = 'ussd' if comm_pref == 'ussd' else 'app'
+    
+    def build():
+        # DRF is imported here rather than at module level, because the
+        # signal handlers pull this module in at startup of every process
+        from .compact import serialize_resources
+        from .conditional import etag_for
+        
+        queryset = Resource.objects.all()
+        if tag:
+            queryset = queryset.filter(tags__contains=[tag])
+        
+        if shape == 'ussd':
+            data = summarize_resources(queryset)
+        else:
+            data = serialize_resources(queryset)
+        return data, etag_for(data)
+    
+    data, etag = get_or_build(CATALOG_NAMESPACE, f"{RESOURCE_LIST_KEY}:{shape}:{tag or ''}", build, RESOURCE_LIST_TIMEOUT)
+    return data, etag, datetime.fromtimestamp(get_catalog_version(), tz=timezone.utc)
@@ -0,0 +1,132 @@
+"""
+Circuit breakers for the dependencies request handlers call: the REST
+API, the SMS gateway and each tenant's database.
+
+After CIRCUIT_FAILURE_THRESHOLD failures in a row a breaker opens, and
+calls fail at once with CircuitOpen instead of each waiting out a
+timeout. After CIRCUIT_RESET_SECONDS one call is let through to test the
+dependency: success closes the breaker, failure opens it again.
+
+Breakers live in the worker process, like the rest of its in-memory
+state, so each worker finds out about an outage on its own.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .faults import DATABASE
+from .tenants import get_tenant
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """
+    Raised instead of calling a dependency whose breaker is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Usable as a context manager around a call: entering raises CircuitOpen
+    while the breaker is open, and any exception from the block counts as
+    a failure.
+    """
+    def __init__(self, name, threshold=None, reset_seconds=None, clock=time.monotonic):
+        self.name = name
+        self._threshold = threshold
+        self._reset_seconds = reset_seconds
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def threshold(self):
+        return self._threshold or settings.CIRCUIT_FAILURE_THRESHOLD
+
+    @property
+    def reset_seconds(self):
+        return self._reset_seconds or settings.CIRCUIT_RESET_SECONDS
+
+    @property
+    def state(self):
+        return self._state
+
+    def allow(self):
+        """
+        Whether a call may go ahead now. Once the breaker has been open for
+        reset_seconds, the first caller to ask gets the trial call.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+                self._state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.warning(f"Circuit {self.name} closed, the dependency has recovered")
+            self._state = CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.threshold):
+                if self._state == CLOSED:
+                    logger.error(f"Circuit {self.name} opened after {self._failures} failures")
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+    def __enter__(self):
+        if not self.allow():
+            raise CircuitOpen(f"{self.name} circuit is open")
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.record_success()
+        else:
+            self.record_failure()
+        return False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name):
+    """
+    The process's breaker for a dependency, created on first use
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+def database_breaker():
+    """
+    Breaker for the current tenant's database
+    """
+    return get_breaker(f"{DATABASE}:{get_tenant()}")
+
+def breaker_states():
+    return {name: breaker.state for name, breaker in sorted(_breakers.items())}
+
+def reset_breakers():
+    """
+    Forget every breaker, closing them all
+    """
+    with _breakers_lock:
+        _breakers.clear()
@@ -0,0 +1,41 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .compact import render_json
+
+
+def etag_for(data):
+    """
+    Build a strong ETag from the rendered JSON of a response payload
+    """
+    return '"%s"' % hashlib.md5(render_json(data)).hexdigest()
+
+def conditional_response(request, data, etag=None, last_modified=None, private=False):
+    """
+    Return data with validators, or a 304 if the client's copy is current.
+
+    Args:
+        request: The incoming request
+        data: The response payload
+        etag (str): Precomputed ETag, derived from data if not given
+        last_modified (datetime): When the underlying data last changed
+        private (bool): Whether the payload is specific to the requesting user
+    """
+    etag = etag or etag_for(data)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = Response(data)
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+
+    # Clients may keep the payload but must revalidate before reusing it
+    if private:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True, public=True)
+
+    return get_conditional_response(request, etag=etag, last_modified=timestamp, response=response)
@@ -0,0 +1,198 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import Count, Q, Sum
+
+from .models import OutboundMessage
+from .tenants import get_tenant, tenant_connection, tenant_context
+
+logger = logging.getLogger(__name__)
+
+# Africa's Talking statuses. 'Success' on a send means the gateway accepted
+# the message; in a delivery report it means the handset received it.
+SUBMITTED = 'Submitted'
+DELIVERED = 'Success'
+FAILED_STATUSES = ('Failed', 'Rejected')
+# Every status a delivery report can carry
+REPORT_STATUSES = ('Sent', 'Submitted', 'Buffered', 'Rejected', 'Success', 'Failed', 'AbsentSubscriber')
+
+UPDATE_REPORTS_SQL = """
+UPDATE api_outboundmessage AS m
+SET status = v.status, failure_reason = v.failure_reason, updated_at = now()
+FROM (VALUES {values}) AS v(message_id, status, failure_reason)
+WHERE m.message_id = v.message_id
+"""
+
+FAILURE_REASON_LENGTH = OutboundMessage._meta.get_field('failure_reason').max_length
+
+
+def outbound_messages(response, template, campaign=None, segments=1):
+    """
+    Unsaved OutboundMessage rows for the recipients of a gateway response
+    """
+    try:
+        recipients = response['SMSMessageData']['Recipients']
+    except (KeyError, TypeError):
+        return []
+
+    return [
+        OutboundMessage(
+            message_id=r['messageId'],
+            phone=r.get('number', ''),
+            template=template,
+            campaign=campaign,
+            status=SUBMITTED if r.get('status') == 'Success' else r.get('status', ''),
+            cost=r.get('cost', ''),
+            segments=segments,
+        )
+        for r in recipients
+        if r.get('messageId') and r['messageId'] != 'None'
+    ]
+
+def record_outbound(response, template, campaign=None, segments=1):
+    """
+    Store the per-recipient message ids from a gateway response so delivery
+    reports can be matched to them later
+    """
+    messages = outbound_messages(response, template, campaign, segments)
+    return OutboundMessage.objects.bulk_create(messages, ignore_conflicts=True)
+
+def write_delivery_reports(reports):
+    """
+    Apply buffered reports with one UPDATE ... FROM (VALUES ...) statement
+
+    Args:
+        reports (dict): message id -> (status, failure reason)
+    """
+    values = ', '.join(['(%s, %s, %s)'] * len(reports))
+    params = []
+    for message_id, (status, failure_reason) in reports.items():
+        params.extend([message_id, status, failure_reason])
+    with tenant_connection().cursor() as cursor:
+        cursor.execute(UPDATE_REPORTS_SQL.format(values=values), params)
+        return cursor.rowcount
+
+class DeliveryReportBuffer:
+    """
+    Collects delivery reports in memory and writes them in batches, so a
+    flood of callbacks during a campaign costs one UPDATE per batch rather
+    than one per callback. Reports for the same message are coalesced.
+
+    Reports still buffered when a worker is killed are lost; they only
+    feed delivery metrics. add() never touches the database: full batches
+    are written from a background thread.
+    """
+    def __init__(self, max_size=None, max_age=None):
+        self._max_size = max_size
+        self._max_age = max_age
+        self._reports = {}
+        self._first_at = None
+        self._timer = None
+        self._flushing = False
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return self._max_size or settings.DLR_BUFFER_SIZE
+
+    @property
+    def max_age(self):
+        return self._max_age or settings.DLR_FLUSH_INTERVAL
+
+    def add(self, message_id, status, failure_reason=''):
+        """
+        Buffer a report. Unknown statuses are dropped and long failure
+        reasons cut to fit, as one bad value would fail its whole batch.
+
+        Returns:
+            bool: False if the report was dropped
+        """
+        if status not in REPORT_STATUSES:
+            logger.warning(f"Dropped delivery report for {message_id} with unknown status {status[:30]!r}")
+            return False
+        failure_reason = (failure_reason or '')[:FAILURE_REASON_LENGTH]
+        with self._lock:
+            self._reports[(get_tenant(), message_id)] = (status, failure_reason)
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+                # Make sure a lone report is written even if no more arrive
+                self._timer = threading.Timer(self.max_age, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+            if not self._flushing and (
+                len(self._reports) >= self.max_size
+                or time.monotonic() - self._first_at >= self.max_age
+            ):
+                self._flushing = True
+                threading.Thread(target=self._flush_in_background, daemon=True).start()
+        return True
+
+    def flush(self):
+        """
+        Write everything buffered so far
+
+        Returns:
+            int: Number of messages updated
+        """
+        with self._lock:
+            reports, self._reports = self._reports, {}
+            self._first_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        by_tenant = {}
+        for (tenant, message_id), report in reports.items():
+            by_tenant.setdefault(tenant, {})[message_id] = report
+        updated = 0
+        for tenant, tenant_reports in by_tenant.items():
+            try:
+                with tenant_context(tenant):
+                    updated += write_delivery_reports(tenant_reports)
+            except Exception as e:
+                logger.error(f"Failed to write {len(tenant_reports)} delivery reports for {tenant}: {e}")
+        return updated
+
+    def _flush_in_background(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            self._flushing = False
+            connections.close_all()
+
+delivery_reports = DeliveryReportBuffer()
+atexit.register(delivery_reports.flush)
+
+def delivery_stats():
+    """
+    Delivery rate and billed segments per template and campaign
+    """
+    rows = (
+        OutboundMessage.objects.values('template', 'campaign_id', 'campaign__name')
+        .annotate(
+            total=Count('id'),
+            delivered=Count('id', filter=Q(status=DELIVERED)),
+            failed=Count('id', filter=Q(status__in=FAILED_STATUSES)),
+            segments=Sum('segments'),
+        )
+        .order_by('template', 'campaign__name')
+    )
+    return [
+        {
+            'template': row['template'],
+            'campaign': row['campaign_id'],
+            'campaign_name': row['campaign__name'],
+            'total': row['total'],
+            'delivered': row['delivered'],
+            'failed': row['failed'],
+            'pending': row['total'] - row['delivered'] - row['failed'],
+            'delivery_rate': round(row['delivered'] / row['total'], 3),
+            'segments': row['segments'],
+            'segments_per_message': round(row['segments'] / row['total'], 2),
+        }
+        for row in rows
+    ]
@@ -0,0 +1,71 @@
+"""
+Compressed responses for clients on slow, metered networks.
+
+Brotli is used when the client accepts it and the brotli package is
+installed, gzip otherwise. Small bodies are sent as they are, where the
+compression framing would outweigh the savings.
+"""
+import gzip
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .compact import render_json
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip is always available
+    brotli = None
+
+MIN_COMPRESS_SIZE = 256
+GZIP_LEVEL = 6
+# About gzip's speed at a noticeably better ratio for JSON
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings(header):
+    """
+    Content codings an Accept-Encoding header allows
+    """
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        params = params.strip()
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def compress(content, accept_encoding):
+    """
+    Compress a body with the best coding the client accepts
+
+    Args:
+        content (bytes): Response body
+        accept_encoding (str): The request's Accept-Encoding header
+
+    Returns:
+        tuple: (body, content coding or None if sent as is)
+    """
+    if len(content) < MIN_COMPRESS_SIZE:
+        return content, None
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in accepted:
+        return brotli.compress(content, quality=BROTLI_QUALITY), 'br'
+    if 'gzip' in accepted:
+        return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0), 'gzip'
+    return content, None
+
+def compressed_json_response(request, data):
+    """
+    JSON response compressed for the requesting client
+    """
+    content, coding = compress(render_json(data), request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    response = HttpResponse(content, content_type='application/json')
+    if coding:
+        response['Content-Encoding'] = coding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,201 @@
+"""
+Resource view and click events.
+
+Events are cheap to record: they are appended to an in-memory ring and
+written in batches from a background thread, so neither the USSD hop nor
+the ingestion endpoint waits on the database. Each batch also adds to
+the per-resource totals in ResourceEngagement, which recommendations use
+as popularity.
+"""
+import atexit
+import io
+import logging
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+from .models import Mentee, Resource
+from .tenants import get_tenant, tenant_connection, tenant_context
+
+logger = logging.getLogger(__name__)
+
+VIEW = 'view'
+CLICK = 'click'
+USSD_VIEW = 'ussd_view'
+# Rollup column per event kind
+ROLLUP_COLUMNS = {
+    VIEW: 'views',
+    CLICK: 'clicks',
+    USSD_VIEW: 'ussd_views',
+}
+
+COPY_EVENTS_SQL = "COPY api_resourceevent (resource_id, mentee_id, kind, created_at) FROM STDIN"
+
+ROLLUP_SQL = """
+INSERT INTO api_resourceengagement (resource_id, views, clicks, ussd_views, updated_at)
+VALUES {values}
+ON CONFLICT (resource_id) DO UPDATE SET
+    views = api_resourceengagement.views + EXCLUDED.views,
+    clicks = api_resourceengagement.clicks + EXCLUDED.clicks,
+    ussd_views = api_resourceengagement.ussd_views + EXCLUDED.ussd_views,
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def write_events(events):
+    """
+    Insert a batch of events and add them to the rollups in one
+    transaction. Events for resources or mentees deleted since they were
+    recorded are dropped or unattributed rather than failing the batch.
+
+    Args:
+        events (list): (resource id, kind, mentee id or None, unix time) tuples
+
+    Returns:
+        int: Number of events written
+    """
+    resource_ids = {str(pk) for pk in Resource.objects.filter(
+        pk__in={event[0] for event in events}
+    ).values_list('pk', flat=True)}
+    mentee_ids = set(Mentee.objects.filter(
+        pk__in={event[2] for event in events if event[2] is not None}
+    ).values_list('pk', flat=True))
+
+    # Tab separated rows for COPY, \N for NULL. Ids and kinds never contain tabs.
+    rows = io.StringIO()
+    written = 0
+    counts = {}
+    for resource_id, kind, mentee_id, timestamp in events:
+        resource_id = str(resource_id)
+        if resource_id not in resource_ids:
+            continue
+        mentee = mentee_id if mentee_id in mentee_ids else '\\N'
+        created_at = datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+        rows.write(f"{resource_id}\t{mentee}\t{kind}\t{created_at}\n")
+        counts.setdefault(resource_id, Counter())[ROLLUP_COLUMNS[kind]] += 1
+        written += 1
+    if not written:
+        return 0
+
+    params = []
+    # Sorted, so concurrent flushes lock rollup rows in the same order
+    for resource_id in sorted(counts):
+        count = counts[resource_id]
+        params.extend([resource_id, count['views'], count['clicks'], count['ussd_views']])
+    rows.seek(0)
+    with transaction.atomic(using=get_tenant()):
+        with tenant_connection().cursor() as cursor:
+            # COPY streams the batch in one round trip, several times faster than INSERT
+            cursor.copy_expert(COPY_EVENTS_SQL, rows)
+            cursor.execute(ROLLUP_SQL.format(values=', '.join(['(%s, %s, %s, %s, now())'] * len(counts))), params)
+    return written
+
+
+class EventBuffer:
+    """
+    Events waiting to be written. add() only appends to a bounded ring
+    under a lock, never touching the database. A background thread writes
+    the ring once max_size events are waiting or the oldest is max_age
+    seconds old. If writes fall more than limit events behind, the oldest
+    are dropped and counted.
+    """
+    def __init__(self, max_size=None, max_age=None, limit=None):
+        self._max_size = max_size
+        self._max_age = max_age
+        self._limit = limit
+        self._events = None
+        self._seen = set()
+        self._timer = None
+        self._flushing = False
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def max_size(self):
+        return self._max_size or settings.EVENT_BUFFER_SIZE
+
+    @property
+    def max_age(self):
+        return self._max_age or settings.EVENT_FLUSH_INTERVAL
+
+    @property
+    def limit(self):
+        return self._limit or settings.EVENT_BUFFER_LIMIT
+
+    def add(self, resource_id, kind, mentee_id=None, once_per=None):
+        """
+        Buffer an event. With once_per, e.g. a user id, repeats of the same
+        resource and kind for it are ignored until the next write, so one
+        account can't inflate popularity by replaying events.
+
+        Returns:
+            bool: False if the event was a repeat
+        """
+        with self._lock:
+            if once_per is not None:
+                key = (get_tenant(), once_per, resource_id, kind)
+                if key in self._seen:
+                    return False
+                self._seen.add(key)
+            if self._events is None:
+                self._events = deque(maxlen=self.limit)
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append((get_tenant(), (resource_id, kind, mentee_id, time.time())))
+            if self._timer is None:
+                # Make sure a lone event is written even if no more arrive
+                self._timer = threading.Timer(self.max_age, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+            elif len(self._events) >= self.max_size and not self._flushing:
+                self._flushing = True
+                threading.Thread(target=self._flush_in_background, daemon=True).start()
+        return True
+
+    def flush(self):
+        """
+        Write everything buffered so far
+
+        Returns:
+            int: Number of events written
+        """
+        with self._lock:
+            events = list(self._events or ())
+            if self._events is not None:
+                self._events.clear()
+            self._seen.clear()
+            dropped, self.dropped = self.dropped, 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if dropped:
+            logger.warning(f"Dropped {dropped} resource events, writes are falling behind")
+        by_tenant = {}
+        for tenant, event in events:
+            by_tenant.setdefault(tenant, []).append(event)
+        written = 0
+        for tenant, tenant_events in by_tenant.items():
+            try:
+                with tenant_context(tenant):
+                    written += write_events(tenant_events)
+            except Exception as e:
+                logger.error(f"Failed to write {len(tenant_events)} resource events for {tenant}: {e}")
+        return written
+
+    def _flush_in_background(self):
+        close_old_connections()
+        try:
+            self.flush()
+        finally:
+            self._flushing = False
+            connections.close_all()
+
+    def __len__(self):
+        return len(self._events or ())
+
+engagement_events = EventBuffer()
+atexit.register(engagement_events.flush)
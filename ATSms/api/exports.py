@@ -0,0 +1,179 @@
+import csv
+import io
+import zlib
+from datetime import datetime, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Mentee, Mentor, Mentorship, Resource
+
+# Rows fetched per database round trip, kept small so memory stays flat
+EXPORT_CHUNK_SIZE = 2000
+# Bytes buffered before a chunk is handed to the response or file
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+# Columns per dataset, read with values_list so no model instances are built
+EXPORT_FIELDS = {
+    'mentees': (
+        Mentee,
+        ('id', 'name', 'age', 'county', 'language', 'device', 'interests', 'communication_preference'),
+    ),
+    'mentors': (
+        Mentor,
+        ('id', 'name', 'expertise', 'language_preference', 'counties', 'max_mentees', 'mentees_count', 'visibility'),
+    ),
+    'mentorships': (
+        Mentorship,
+        ('id', 'mentee_id', 'mentee__name', 'mentee__county', 'mentor_id', 'mentor__name',
+         'status', 'created_at', 'updated_at'),
+    ),
+    'resources': (
+        Resource,
+        ('id', 'title', 'description', 'tags', 'link', 'sms_text', 'created_by_id', 'created_at'),
+    ),
+}
+
+# How each supported filter maps onto a dataset's lookups
+EXPORT_FILTERS = {
+    'mentees': {
+        'county': 'county',
+    },
+    'mentors': {
+        'county': 'counties__contains',
+    },
+    'mentorships': {
+        'county': 'mentee__county',
+        'status': 'status',
+        'created_after': 'created_at__gte',
+        'created_before': 'created_at__lt',
+    },
+    'resources': {
+        'created_after': 'created_at__gte',
+        'created_before': 'created_at__lt',
+    },
+}
+
+DATE_FILTERS = ('created_after', 'created_before')
+
+
+def parse_filter_date(value):
+    """
+    Accept either a date (midnight) or a full ISO 8601 datetime
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+def export_rows(dataset, filters):
+    """
+    Build the header and a lazy row iterator for an export.
+
+    Args:
+        dataset (str): One of EXPORT_FIELDS
+        filters (dict): Filter name to value, empty values are ignored
+
+    Raises:
+        ValueError: For unknown datasets, unsupported filters or bad dates
+    """
+    if dataset not in EXPORT_FIELDS:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    model, fields = EXPORT_FIELDS[dataset]
+    lookups = EXPORT_FILTERS[dataset]
+
+    queryset = model.objects.all()
+    for name, value in filters.items():
+        if not value:
+            continue
+        if name not in lookups:
+            raise ValueError(f"{dataset} cannot be filtered by {name}")
+        if name in DATE_FILTERS:
+            value = parse_filter_date(value)
+        elif lookups[name].endswith('__contains'):
+            value = [value]
+        queryset = queryset.filter(**{lookups[name]: value})
+
+    # Stable order so exports can be diffed and resumed
+    queryset = queryset.order_by('pk').values_list(*fields)
+    return fields, queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+def buffered(lines):
+    """
+    Join small pieces into chunks of about EXPORT_BUFFER_SIZE
+    """
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+def render_csv(header, rows):
+    """
+    Stream rows as CSV text chunks. Arrays are joined with '|'.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def line(row):
+        writer.writerow(row)
+        value = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return value
+
+    def lines():
+        yield line(header)
+        for row in rows:
+            yield line(['|'.join(value) if isinstance(value, list) else value for value in row])
+
+    return buffered(lines())
+
+def render_ndjson(header, rows):
+    """
+    Stream rows as newline-delimited JSON objects
+    """
+    encoder = DjangoJSONEncoder()
+    return buffered(encoder.encode(dict(zip(header, row))) + '\n' for row in rows)
+
+def gzip_stream(chunks):
+    """
+    Compress text chunks into a gzip byte stream on the fly
+    """
+    compressor = zlib.compressobj(wbits=31)  # 31 selects the gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+RENDERERS = {
+    'csv': (render_csv, 'text/csv'),
+    'ndjson': (render_ndjson, 'application/x-ndjson'),
+}
+
+def stream_export(dataset, fmt, filters, compress=False):
+    """
+    Stream an export as text chunks, or gzip bytes if compress is set.
+
+    Returns:
+        tuple: (chunk iterator, content type)
+    """
+    render, content_type = RENDERERS[fmt]
+    header, rows = export_rows(dataset, filters)
+    chunks = render(header, rows)
+    if compress:
+        return gzip_stream(chunks), 'application/gzip'
+    return chunks, content_type
@@ -0,0 +1,163 @@
+"""
+Fault injection, for seeing how the platform behaves while a dependency
+is down. Toggled by settings.FAULTS and never enabled in production.
+
+Each entry names a dependency, a fault and optionally the share of calls
+it hits, e.g. 'api=partition' or 'sms_gateway=slow:0.5':
+
+    slow       the call succeeds after FAULT_SLOW_SECONDS, or times out if
+               that is longer than the caller waits
+    error      the call fails at once
+    partition  the call hangs until the caller's timeout, or for
+               FAULT_PARTITION_SECONDS, and then fails
+
+A faulted REST API or SMS gateway is replaced by a local stub that
+answers successfully whenever no fault hits, so nothing leaves the
+machine. The database cannot be stubbed: its faults are injected in
+front of real queries.
+"""
+import random
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import OperationalError, connections
+from django.db.backends.signals import connection_created
+
+SLOW = 'slow'
+ERROR = 'error'
+PARTITION = 'partition'
+MODES = (SLOW, ERROR, PARTITION)
+
+API = 'api'
+SMS_GATEWAY = 'sms_gateway'
+DATABASE = 'database'
+DEPENDENCIES = (API, SMS_GATEWAY, DATABASE)
+
+# Status a faulted API stub answers with
+API_ERROR_STATUS = 503
+
+
+class InjectedFault(ConnectionError):
+    """
+    A failure injected into a call to a dependency
+    """
+
+
+@lru_cache(maxsize=32)
+def parse_faults(entries):
+    """
+    Parse FAULTS entries such as 'api=slow:0.5'
+
+    Args:
+        entries (tuple): The entries of settings.FAULTS
+
+    Returns:
+        dict: (mode, share of calls) per dependency
+
+    Raises:
+        ValueError: For an unknown dependency or mode
+    """
+    faults = {}
+    for entry in entries:
+        dependency, _, fault = entry.strip().partition('=')
+        mode, _, share = fault.partition(':')
+        if dependency not in DEPENDENCIES or mode not in MODES:
+            raise ValueError(f"Unknown fault {entry!r}")
+        faults[dependency] = (mode, float(share) if share else 1.0)
+    return faults
+
+def is_faulted(dependency):
+    """
+    Whether a dependency has a fault configured, and so runs as a stub
+    """
+    return bool(settings.FAULTS) and dependency in parse_faults(tuple(settings.FAULTS))
+
+def active_fault(dependency):
+    """
+    The fault to inject into the current call to a dependency, or None
+    """
+    if not settings.FAULTS:
+        return None
+    fault = parse_faults(tuple(settings.FAULTS)).get(dependency)
+    if fault is None:
+        return None
+    mode, share = fault
+    return mode if share >= 1 or random.random() < share else None
+
+def delay(dependency, mode, timeout=None, error=InjectedFault):
+    """
+    Hold up a call for a slow or partition fault, failing it if the
+    caller would have timed out
+    """
+    if mode == SLOW and (timeout is None or settings.FAULT_SLOW_SECONDS < timeout):
+        time.sleep(settings.FAULT_SLOW_SECONDS)
+    elif mode in (SLOW, PARTITION):
+        time.sleep(timeout if timeout is not None else settings.FAULT_PARTITION_SECONDS)
+        raise error(f"Injected {dependency} timeout")
+
+def inject(dependency, timeout=None, error=InjectedFault):
+    """
+    Delay or fail the current call to a dependency as configured
+
+    Args:
+        dependency (str): API, SMS_GATEWAY or DATABASE
+        timeout (float): How long the caller waits, if it sets a limit
+        error (type): Exception to raise for failures
+
+    Returns:
+        str: The fault injected, or None
+    """
+    mode = active_fault(dependency)
+    if mode == ERROR:
+        raise error(f"Injected {dependency} error")
+    delay(dependency, mode, timeout, error)
+    return mode
+
+def api_stub(url, timeout=None):
+    """
+    Answer a call to the REST API locally
+
+    Returns:
+        requests.Response: 503 for an injected error, else 201 with an
+        empty JSON object
+
+    Raises:
+        requests.Timeout: For injected timeouts
+    """
+    import requests
+
+    mode = active_fault(API)
+    delay(API, mode, timeout, requests.Timeout)
+    response = requests.Response()
+    response.url = url
+    response.status_code = API_ERROR_STATUS if mode == ERROR else 201
+    response._content = b'{}'
+    return response
+
+def database_fault(execute, sql, params, many, context):
+    """
+    Execute wrapper injecting database faults in front of each query
+    """
+    inject(DATABASE, error=OperationalError)
+    return execute(sql, params, many, context)
+
+def install_database_faults(connection, **kwargs):
+    """
+    Add or remove database_fault on a connection to match FAULTS
+    """
+    installed = database_fault in connection.execute_wrappers
+    if is_faulted(DATABASE) and not installed:
+        connection.execute_wrappers.append(database_fault)
+    elif installed and not is_faulted(DATABASE):
+        connection.execute_wrappers.remove(database_fault)
+
+def faults_changed(setting, **kwargs):
+    # Connections this thread already opened, when tests change FAULTS
+    if setting == 'FAULTS':
+        for connection in connections.all(initialized_only=True):
+            install_database_faults(connection)
+
+connection_created.connect(install_database_faults)
+setting_changed.connect(faults_changed)
@@ -0,0 +1,108 @@
+import logging
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .faults import SMS_GATEWAY, inject, is_faulted
+
+logger = logging.getLogger(__name__)
+
+
+class AfricasTalkingGateway:
+    """
+    Sends SMS through Africa's Talking, initializing the SDK on first use
+    """
+    sender_id = "10136"
+    
+    def __init__(self):
+        self._sms = None
+        self._lock = threading.Lock()
+    
+    @property
+    def sms(self):
+        if self._sms is None:
+            with self._lock:
+                if self._sms is None:
+                    import africastalking
+                    
+                    if not settings.AT_API_KEY:
+                        raise RuntimeError("Africa's Talking API key is missing")
+                    africastalking.initialize(settings.AT_USERNAME, settings.AT_API_KEY)
+                    self._sms = africastalking.SMS
+        return self._sms
+    
+    def send(self, message, recipients):
+        """
+        Send one message to a list of E.164 numbers in a single request
+        
+        Returns:
+            dict: The Africa's Talking response, with per-recipient status
+        """
+        return self.sms.send(message=message, recipients=recipients, sender_id=self.sender_id)
+
+class FakeGateway:
+    """
+    Records messages in memory and answers like Africa's Talking.
+    For tests and for running campaigns locally without sending anything.
+    """
+    def __init__(self):
+        self.outbox = []
+        self._lock = threading.Lock()
+    
+    def send(self, message, recipients):
+        with self._lock:
+            start = len(self.outbox)
+            self.outbox.extend((recipient, message) for recipient in recipients)
+        return {
+            'SMSMessageData': {
+                'Message': f"Sent to {len(recipients)}/{len(recipients)} Total Cost: KES 0",
+                'Recipients': [
+                    {
+                        'number': recipient,
+                        'status': 'Success',
+                        'statusCode': 101,
+                        'messageId': f"ATXid_fake{start + i}",
+                        'cost': 'KES 0.8000',
+                    }
+                    for i, recipient in enumerate(recipients)
+                ],
+            }
+        }
+    
+    def clear(self):
+        with self._lock:
+            self.outbox = []
+
+class FaultyGateway(FakeGateway):
+    """
+    Local stand-in for the gateway while settings.FAULTS has an
+    sms_gateway fault, see api.faults
+    """
+    def send(self, message, recipients):
+        inject(SMS_GATEWAY)
+        return super().send(message, recipients)
+
+@lru_cache(maxsize=None)
+def load_gateway(path):
+    return import_string(path)()
+
+def get_gateway():
+    """
+    Get the shared gateway instance configured by settings.SMS_GATEWAY,
+    or the faulty stub in fault injection mode
+    """
+    if is_faulted(SMS_GATEWAY):
+        return load_gateway('api.gateways.FaultyGateway')
+    return load_gateway(settings.SMS_GATEWAY)
+
+def successful_recipients(response):
+    """
+    Numbers the gateway accepted, from an Africa's Talking style response
+    """
+    try:
+        recipients = response['SMSMessageData']['Recipients']
+    except (KeyError, TypeError):
+        return []
+    return [r['number'] for r in recipients if r.get('status') == 'Success']
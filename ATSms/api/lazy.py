@@ -0,0 +1,53 @@
+import threading
+from functools import update_wrapper
+
+from django.utils.module_loading import import_string
+
+
+class LazyView:
+    """
+    A URL callback that imports its view on the first request, so loading
+    the URLconf does not pull in every view module and DRF with it.
+
+    CsrfViewMiddleware looks at the callback before the view is imported,
+    so a view's exemption has to be declared here as well as on the view.
+    """
+    def __init__(self, path, actions=None, csrf_exempt=False):
+        self.path = path
+        self.actions = actions
+        self.csrf_exempt = csrf_exempt
+        self._view = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        """
+        Import and build the real view, once
+        """
+        if self._view is None:
+            with self._lock:
+                if self._view is None:
+                    target = import_string(self.path)
+                    if self.actions is not None:
+                        view = target.as_view(self.actions)
+                    elif hasattr(target, 'as_view'):
+                        view = target.as_view()
+                    else:
+                        view = target
+                    update_wrapper(self, view, updated=())
+                    self._view = view
+        return self._view
+
+    def __call__(self, request, *args, **kwargs):
+        return self.resolve()(request, *args, **kwargs)
+
+    def __repr__(self):
+        return f"<LazyView {self.path}>"
+
+def lazy_view(path, actions=None, csrf_exempt=False):
+    """
+    Route to a view by dotted path, e.g. lazy_view('api.views.ExportView').
+    Viewsets take the method to action mapping a router would generate.
+    Pass csrf_exempt=True only for views that are exempt themselves: DRF
+    views and gateway callbacks.
+    """
+    return LazyView(path, actions, csrf_exempt)
@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .relay import forget_conversations
+from .tenants import get_tenant, tenant_connection
+from .waitlist import drain_waitlist
+
+# Bulk, so no Mentorship signals fire; the phones returned are those whose
+# cached relay conversations are now stale
+COMPLETE_SQL = """
+UPDATE api_mentorship AS ms
+SET status = 'completed', updated_at = %s
+FROM api_mentee me, api_user mu, api_mentor mo, api_user ou
+WHERE ms.status = 'active' AND ms.created_at < %s
+  AND me.id = ms.mentee_id AND mu.id = me.user_id
+  AND mo.id = ms.mentor_id AND ou.id = mo.user_id
+RETURNING mu.phone, ou.phone
+"""
+
+# Active mentorships per mentor in one GROUP BY, compared with the stored
+# counter. Only mentors whose counter is wrong are returned or touched.
+ACTIVE_COUNTS_SQL = """
+SELECT m.id, m.name, m.mentees_count, coalesce(a.active, 0) AS active
+FROM api_mentor m
+LEFT JOIN (
+    SELECT mentor_id, count(*) AS active
+    FROM api_mentorship
+    WHERE status = 'active'
+    GROUP BY mentor_id
+) a ON a.mentor_id = m.id
+WHERE m.mentees_count <> coalesce(a.active, 0)
+ORDER BY m.id
+"""
+
+RECOUNT_SQL = """
+UPDATE api_mentor AS m
+SET mentees_count = counts.active
+FROM (
+    SELECT m.id, coalesce(a.active, 0) AS active
+    FROM api_mentor m
+    LEFT JOIN (
+        SELECT mentor_id, count(*) AS active
+        FROM api_mentorship
+        WHERE status = 'active'
+        GROUP BY mentor_id
+    ) a ON a.mentor_id = m.id
+    WHERE m.mentees_count <> coalesce(a.active, 0) {mentor_filter}
+) counts
+WHERE m.id = counts.id
+"""
+
+
+def complete_stale_mentorships(now=None):
+    """
+    Mark active mentorships older than MENTORSHIP_DURATION_DAYS as
+    completed in one UPDATE
+
+    Returns:
+        list: (mentee phone, mentor phone) of each mentorship completed
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.MENTORSHIP_DURATION_DAYS)
+    with tenant_connection().cursor() as cursor:
+        cursor.execute(COMPLETE_SQL, [now, cutoff])
+        return cursor.fetchall()
+
+def find_counter_drift():
+    """
+    Mentors whose mentees_count does not match their active mentorships
+
+    Returns:
+        list: dicts with id, name, mentees_count and active
+    """
+    with tenant_connection().cursor() as cursor:
+        cursor.execute(ACTIVE_COUNTS_SQL)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def recount_mentees(mentor_ids=None):
+    """
+    Reset mentees_count from the active mentorships of every mentor, or
+    only of the given mentors
+
+    Returns:
+        int: Number of mentor counters corrected
+    """
+    with tenant_connection().cursor() as cursor:
+        if mentor_ids is None:
+            cursor.execute(RECOUNT_SQL.format(mentor_filter=''))
+        else:
+            cursor.execute(RECOUNT_SQL.format(mentor_filter='AND m.id = ANY(%s)'), [list(mentor_ids)])
+        return cursor.rowcount
+
+def run_lifecycle(now=None):
+    """
+    Complete stale mentorships and release their capacity in one
+    transaction, so matching never sees the two out of step, then hand
+    the freed slots to waitlisted mentees
+
+    Returns:
+        tuple: (mentorships completed, mentor counters corrected, mentees matched)
+    """
+    with transaction.atomic(using=get_tenant()):
+        pairs = complete_stale_mentorships(now)
+        corrected = recount_mentees()
+        if pairs:
+            phones = {phone for pair in pairs for phone in pair}
+            transaction.on_commit(lambda: forget_conversations(phones), using=get_tenant())
+    matched = drain_waitlist() if pairs or corrected else 0
+    return len(pairs), corrected, matched
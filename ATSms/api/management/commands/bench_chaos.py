@@ -0,0 +1,129 @@
+import resource
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from api import ussd
+from api.background import background_tasks
+from api.caching import local_cache
+from api.circuits import breaker_states, reset_breakers
+from api.models import OutboundMessage
+
+# The API and gateway always run as local stubs here; ':0' faults none of their calls
+HEALTHY = ['api=slow:0', 'sms_gateway=slow:0']
+
+SCENARIOS = {
+    'healthy': HEALTHY,
+    'api_slow': ['api=slow', 'sms_gateway=slow:0'],
+    'api_partition': ['api=partition', 'sms_gateway=slow:0'],
+    'sms_error': ['api=slow:0', 'sms_gateway=error'],
+    'sms_partition': ['api=slow:0', 'sms_gateway=partition'],
+    'database_error': HEALTHY + ['database=error'],
+    'database_partition': HEALTHY + ['database=partition'],
+}
+
+# Hops of a USSD session; the last completes a registration
+HOPS = ['', '1', '1*Amina*19*1*1,2']
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive USSD hops while the API, SMS gateway or database misbehaves (see api.faults), "
+        "and check latency, threads and memory stay bounded and circuit breakers recover"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hops', type=int, default=3000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--p99-budget', type=float, default=250, help="Milliseconds")
+        parser.add_argument('--slow-seconds', type=float, default=2.0, help="FAULT_SLOW_SECONDS")
+        parser.add_argument('--partition-seconds', type=float, default=1.0,
+                            help="FAULT_PARTITION_SECONDS, for faults without a caller timeout")
+        parser.add_argument('--reset-seconds', type=float, default=1.0, help="CIRCUIT_RESET_SECONDS")
+        parser.add_argument('--scenario', choices=SCENARIOS, action='append',
+                            help="Scenario to run, all by default. May be repeated.")
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        try:
+            with tempfile.TemporaryDirectory() as pending, override_settings(
+                SMS_GATEWAY='api.gateways.FakeGateway',
+                PENDING_REGISTRATIONS_DIR=pending,
+                FAULT_SLOW_SECONDS=options['slow_seconds'],
+                FAULT_PARTITION_SECONDS=options['partition_seconds'],
+                CIRCUIT_RESET_SECONDS=options['reset_seconds'],
+                RATE_LIMITS={'ussd_phone': '1000/s', 'ussd_session': '1000/s', 'ussd_ip': '100000/s'},
+            ):
+                for name in options['scenario'] or SCENARIOS:
+                    self.run(name, SCENARIOS[name], options)
+        finally:
+            # Welcome SMS the gateway stub accepted were recorded for delivery reports
+            OutboundMessage.objects.filter(message_id__startswith='ATXid_fake', created_at__gte=started).delete()
+
+    def run(self, name, faults, options):
+        cache.clear()
+        local_cache.clear()
+        reset_breakers()
+        factory = RequestFactory()
+        baseline_threads = threading.active_count()
+        peak = {'threads': baseline_threads, 'backlog': 0}
+        refused = background_tasks.refused
+
+        def hop(i):
+            # A new caller every session, so each looks itself up once
+            request = factory.post('/api/ussd/callback/', {
+                'sessionId': f"ATUid_{name}_{i // len(HOPS)}",
+                'phoneNumber': f"+2547{i // len(HOPS):08d}",
+                'text': HOPS[i % len(HOPS)],
+            })
+            start = time.perf_counter()
+            ussd.ussd_callback(request)
+            elapsed = time.perf_counter() - start
+            peak['threads'] = max(peak['threads'], threading.active_count())
+            peak['backlog'] = max(peak['backlog'], len(background_tasks))
+            return elapsed
+
+        with override_settings(FAULTS=faults):
+            # Peak resident memory only grows, so this is what the outage added to it
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                timings = sorted(executor.map(hop, range(options['hops'])))
+            rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+            drain_start = time.perf_counter()
+            self.drain()
+            drained = time.perf_counter() - drain_start
+            tripped = breaker_states()
+
+        # Healthy again: after the reset time, the next calls close every breaker
+        time.sleep(options['reset_seconds'])
+        with override_settings(FAULTS=HEALTHY):
+            for i in range(len(HOPS) * 2):
+                hop(options['hops'] + i)
+            self.drain()
+        recovered = all(state == 'closed' for state in breaker_states().values())
+
+        p99 = timings[int(len(timings) * 0.99)] * 1000
+        # Request threads plus the background pool, and a little room for timers
+        thread_limit = baseline_threads + options['concurrency'] + background_tasks.workers + 2
+        ok = p99 <= options['p99_budget'] and peak['threads'] <= thread_limit and recovered
+        opened = [breaker for breaker, state in tripped.items() if state != 'closed']
+        self.stdout.write(
+            f"{name}: {'OK' if ok else 'FAIL'} p50 {statistics.median(timings) * 1000:.1f}ms, "
+            f"p99 {p99:.1f}ms, max {timings[-1] * 1000:.0f}ms, "
+            f"threads {peak['threads']}/{thread_limit}, backlog {peak['backlog']} "
+            f"({background_tasks.refused - refused} refused), peak RSS +{rss_growth}KB, "
+            f"drained in {drained:.1f}s, opened {', '.join(opened) or 'none'}, "
+            f"{'recovered' if recovered else 'NOT recovered'}"
+        )
+
+    @staticmethod
+    def drain():
+        while len(background_tasks) or background_tasks.running:
+            time.sleep(0.01)
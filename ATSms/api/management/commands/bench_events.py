@@ -0,0 +1,67 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.engagement import USSD_VIEW, VIEW, EventBuffer, write_events
+from api.models import Resource
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time recording resource events on the request path and writing them in batches. All rows are rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=50_000)
+        parser.add_argument('--resources', type=int, default=200)
+        parser.add_argument('--batch', type=int, default=500, help="Events per write, as EVENT_BUFFER_SIZE")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, options):
+        total = options['events']
+        resources = Resource.objects.bulk_create([
+            Resource(title=f"Resource {i}", description='...', tags=['Coding'])
+            for i in range(options['resources'])
+        ])
+        ids = [str(resource.pk) for resource in resources]
+        rng = random.Random(42)
+
+        # Large enough that nothing is written while timing add()
+        buffer = EventBuffer(max_size=total + 1, max_age=3600, limit=total + 1)
+        timings = []
+        for _ in range(total):
+            resource_id = rng.choice(ids)
+            start = time.perf_counter()
+            buffer.add(resource_id, USSD_VIEW)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        self.stdout.write(
+            f"add(): median {statistics.median(timings) * 1e6:.1f}us, "
+            f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.1f}us, max {timings[-1] * 1e6:.0f}us"
+        )
+        # The first add starts the flush timer; drop it with the events
+        buffer._timer.cancel()
+
+        events = [(rng.choice(ids), VIEW, None, time.time()) for _ in range(total)]
+        batch = options['batch']
+        start = time.perf_counter()
+        written = 0
+        for offset in range(0, total, batch):
+            written += write_events(events[offset:offset + batch])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"write_events: {written / elapsed:,.0f} events/s in batches of {batch}, "
+            f"{elapsed / (total / batch) * 1000:.1f}ms per batch"
+        )
@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Resource
+from api.search import search_resources, update_search_vector
+
+WORDS = [
+    'python', 'javascript', 'design', 'animation', 'graphics', 'coding', 'html', 'css',
+    'typography', 'colour', 'prototype', 'interface', 'kujifunza', 'programu', 'mtandao',
+    'ubunifu', 'kompyuta', 'michoro', 'msingi', 'mafunzo',
+]
+TAGS = ['Coding', 'Graphics', 'Animation', 'Design']
+QUERIES = [
+    ('python html', 'en'),
+    ('designing interfaces', 'en'),
+    ('mafunzo kompyuta', 'sw'),
+    ('animaton', 'en'),  # misspelt on purpose to exercise the fuzzy path
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark resource search over synthetic resources. All rows are rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resources', type=int, default=1_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, options):
+        total = options['resources']
+        batch_size = options['batch_size']
+        rng = random.Random(42)
+
+        start = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            Resource.objects.bulk_create([
+                Resource(
+                    title=' '.join(rng.choices(WORDS, k=4)),
+                    description=' '.join(rng.choices(WORDS, k=30)),
+                    tags=rng.sample(TAGS, 2),
+                )
+                for _ in range(min(batch_size, total - offset))
+            ])
+        # bulk_create skips signals, so index everything in one UPDATE
+        update_search_vector(Resource.objects.filter(search_vector__isnull=True))
+        self.stdout.write(f"Loaded and indexed {total} resources in {time.perf_counter() - start:.1f}s")
+
+        for term, language in QUERIES:
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                results = search_resources(term, language)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            self.stdout.write(
+                f"{term!r} ({language}): {len(results)} results, "
+                f"median {timings[len(timings) // 2] * 1000:.1f}ms, "
+                f"max {timings[-1] * 1000:.1f}ms"
+            )
@@ -0,0 +1,71 @@
+import random
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from api.segments import build_welcome_sms, measure
+from api.translations import SMS_CATALOG
+
+FIRST_NAMES = [
+    'Wanjiru', 'Achieng', 'Kipchoge', 'Mwanaisha', 'Njeri', 'Zawadi', 'Fatuma', 'Barasa',
+    'Chebet', 'Amina', 'Juma', 'Baraka', 'Neema', 'Grace', 'Brian', 'Mary-Anne', 'Émile',
+    'José', 'Saïd', 'Nyokabi', 'Halima', 'Omari', 'Wairimu', 'Kioko',
+]
+LAST_NAMES = [
+    'Kamau', 'Otieno', 'Keino', 'Hamisi', 'Ng’ang’a', 'Mwakilema', 'Abdallah', 'Wafula',
+    'Jepkosgei', 'O’Brien', 'Odhiambo', 'Mutua', 'Wambui', 'Njoroge', 'bin Salim', 'Ōmondi',
+]
+INTERESTS = ['Coding', 'Graphics', 'Animation', 'Design']
+
+
+class Command(BaseCommand):
+    help = "Compare segment counts and build time of welcome SMS over a corpus of English and Swahili names"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=10_000)
+        parser.add_argument('--max-segments', type=int, default=None)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        corpus = [
+            (
+                ' '.join([rng.choice(FIRST_NAMES)] + rng.sample(LAST_NAMES, rng.randint(1, 2))),
+                rng.sample(INTERESTS, rng.randint(1, 4)),
+                rng.choice(['en', 'sw']),
+            )
+            for _ in range(options['messages'])
+        ]
+
+        for label, build in (('unbounded', self.unbounded), ('builder', self.budgeted(options['max_segments']))):
+            encodings = Counter()
+            segments = 0
+            start = time.perf_counter()
+            for name, interests, language in corpus:
+                info = measure(build(name, interests, language))
+                encodings[info.encoding] += 1
+                segments += info.segments
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{label}: {segments} segments for {len(corpus)} messages "
+                f"({segments / len(corpus):.2f} per message), "
+                f"{', '.join(f'{count} {encoding}' for encoding, count in sorted(encodings.items()))}, "
+                f"{elapsed / len(corpus) * 1e6:.1f}us per message"
+            )
+
+    @staticmethod
+    def links(interests):
+        return [(interest, f"https://bit.ly/{interest.lower()}-basics") for interest in interests[:3]]
+
+    def unbounded(self, name, interests, language):
+        # Plain concatenation as the welcome SMS used to be built
+        templates = SMS_CATALOG[language]
+        message = templates['welcome_intro'].format(name=name, interests=', '.join(interests))
+        for interest, link in self.links(interests):
+            message += templates['welcome_link'].format(interest=interest, link=link)
+        return message + templates['welcome_outro']
+
+    def budgeted(self, max_segments):
+        def build(name, interests, language):
+            return build_welcome_sms(name, interests, self.links(interests), language, max_segments)[0]
+        return build
@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.compact import render_json, serialize_resources
+from api.models import Resource
+from api.serializers import ResourceSerializer
+
+WORDS = [
+    'python', 'javascript', 'design', 'animation', 'graphics', 'coding', 'html', 'css',
+    'kujifunza', 'programu', 'mtandao', 'ubunifu', 'kompyuta', 'michoro', 'msingi', 'mafunzo',
+]
+TAGS = ['Coding', 'Graphics', 'Animation', 'Design']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare DRF and compact serialization of large resource lists. All rows are rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resources', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, options):
+        total = options['resources']
+        rng = random.Random(42)
+        Resource.objects.bulk_create([
+            Resource(
+                title=' '.join(rng.choices(WORDS, k=4)),
+                description=' '.join(rng.choices(WORDS, k=30)),
+                tags=rng.sample(TAGS, 2),
+                link=f"https://example.com/{i}",
+            )
+            for i in range(total)
+        ], batch_size=2000)
+        queryset = Resource.objects.order_by('pk')
+
+        def drf():
+            return JSONRenderer().render(ResourceSerializer(queryset, many=True).data)
+
+        def compact():
+            return render_json(serialize_resources(queryset))
+
+        results = {}
+        for label, build in (('ModelSerializer + json', drf), ('values_list + orjson', compact)):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                body = build()
+                timings.append(time.perf_counter() - start)
+            results[label] = body
+            best = min(timings)
+            self.stdout.write(
+                f"{label}: {total / best:,.0f} rows/s, best {best * 1000:.0f}ms for {total} rows, {len(body):,} bytes"
+            )
+
+        bodies = list(results.values())
+        self.stdout.write("Identical output" if bodies[0] == bodies[1] else "OUTPUT DIFFERS")
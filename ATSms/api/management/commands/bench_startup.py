@@ -0,0 +1,70 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SETUP = (
+    "import os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings!r}); "
+    "import django; django.setup()"
+)
+
+# What a worker has done by the time it can answer each kind of request
+SCENARIOS = {
+    'setup': "",
+    'ussd': "from django.urls import resolve; resolve('/api/ussd/callback/').func.resolve()",
+    'urls': "from api.warmup import load_views; load_views()",
+    'warm': "from api.warmup import warm_up; warm_up()",
+}
+
+
+class Command(BaseCommand):
+    help = "Profile worker boot with python -X importtime and time each boot stage in a fresh interpreter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help="Slowest imports to list per scenario")
+        parser.add_argument('--scenario', choices=SCENARIOS, action='append',
+                            help="Scenario to run, all by default. May be repeated.")
+
+    def handle(self, *args, **options):
+        for name in options['scenario'] or SCENARIOS:
+            code = SETUP.format(settings=os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE))
+            if SCENARIOS[name]:
+                code += "; " + SCENARIOS[name]
+
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                result = subprocess.run(
+                    [sys.executable, '-X', 'importtime', '-c', code],
+                    capture_output=True, text=True, cwd=settings.BASE_DIR
+                )
+                timings.append(time.perf_counter() - start)
+                if result.returncode:
+                    self.stderr.write(result.stderr[-2000:])
+                    return
+
+            imports = self.parse_importtime(result.stderr)
+            self.stdout.write(
+                f"{name}: median {statistics.median(timings) * 1000:.0f}ms, "
+                f"min {min(timings) * 1000:.0f}ms over {len(timings)} runs, {len(imports)} modules imported"
+            )
+            for module, self_us, cumulative_us in sorted(imports, key=lambda row: -row[2])[:options['top']]:
+                self.stdout.write(f"  {cumulative_us / 1000:8.1f}ms  {self_us / 1000:7.1f}ms self  {module}")
+
+    @staticmethod
+    def parse_importtime(output):
+        """
+        Parse '-X importtime' lines into (module, self us, cumulative us)
+        """
+        rows = []
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, module = line[len('import time:'):].split('|')
+            rows.append((module.strip(), int(self_us), int(cumulative_us)))
+        return rows
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exports import EXPORT_FIELDS, RENDERERS, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream a dataset as CSV or NDJSON to a file or stdout with flat memory use"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORT_FIELDS))
+        parser.add_argument('--format', dest='fmt', choices=sorted(RENDERERS), default='csv')
+        parser.add_argument('--output', help="File to write, stdout if omitted")
+        parser.add_argument('--gzip', action='store_true', help="Compress the output on the fly")
+        parser.add_argument('--county')
+        parser.add_argument('--status')
+        parser.add_argument('--created-after')
+        parser.add_argument('--created-before')
+
+    def handle(self, *args, **options):
+        filters = {
+            name: options[name]
+            for name in ('county', 'status', 'created_after', 'created_before')
+        }
+        try:
+            chunks, content_type = stream_export(options['dataset'], options['fmt'], filters, options['gzip'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            mode = 'wb' if options['gzip'] else 'w'
+            encoding = None if options['gzip'] else 'utf-8'
+            with open(options['output'], mode, encoding=encoding, newline='' if encoding else None) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        elif options['gzip']:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
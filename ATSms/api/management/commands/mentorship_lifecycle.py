@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.lifecycle import find_counter_drift, run_lifecycle
+from api.tenants import each_tenant
+
+
+class Command(BaseCommand):
+    help = "Complete stale mentorships and recount mentor capacity. Run on a schedule."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Only report mentors whose mentees_count has drifted")
+        parser.add_argument('--loop', action='store_true', help="Keep running")
+        parser.add_argument('--interval', type=float, default=3600, help="Seconds between runs with --loop")
+        parser.add_argument('--tenant', action='append', help="Tenant to run for, all by default. May be repeated.")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            for tenant in each_tenant(options['tenant']):
+                self.check_drift(tenant)
+            return
+
+        while True:
+            for tenant in each_tenant(options['tenant']):
+                completed, corrected, matched = run_lifecycle()
+                self.stdout.write(
+                    f"{tenant}: completed {completed} mentorships, corrected {corrected} mentor counters, "
+                    f"matched {matched} waitlisted mentees"
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def check_drift(self, tenant):
+        drift = find_counter_drift()
+        for mentor in drift:
+            self.stdout.write(
+                f"Mentor {mentor['id']} ({mentor['name']}): "
+                f"mentees_count {mentor['mentees_count']}, active mentorships {mentor['active']}"
+            )
+        self.stdout.write(f"{tenant}: {len(drift)} mentors with counter drift")
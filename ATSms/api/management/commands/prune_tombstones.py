@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.sync import prune_tombstones
+from api.tenants import each_tenant
+
+
+class Command(BaseCommand):
+    help = "Delete sync tombstones older than SYNC_TOMBSTONE_DAYS. Run daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', help="Tenant to run for, all by default. May be repeated.")
+
+    def handle(self, *args, **options):
+        for tenant in each_tenant(options['tenant']):
+            self.stdout.write(f"{tenant}: deleted {prune_tombstones()} tombstones")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.analytics import refresh_supply_demand
+from api.tenants import each_tenant
+
+
+class Command(BaseCommand):
+    help = "Rebuild the county/interest supply and demand summary. Run on a schedule."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', action='append', help="Tenant to refresh, all by default. May be repeated.")
+
+    def handle(self, *args, **options):
+        for tenant in each_tenant(options['tenant']):
+            refreshed = refresh_supply_demand()
+            self.stdout.write(f"{tenant}: refreshed {refreshed} county/interest pairs")
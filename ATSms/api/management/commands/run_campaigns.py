@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.campaigns import run_pending_campaigns
+from api.tenants import each_tenant
+
+
+class Command(BaseCommand):
+    help = "Send pending SMS campaigns, resuming interrupted ones from their checkpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new campaigns")
+        parser.add_argument('--interval', type=float, default=30, help="Seconds between polls with --loop")
+        parser.add_argument('--tenant', action='append', help="Tenant to run for, all by default. May be repeated.")
+
+    def handle(self, *args, **options):
+        while True:
+            for tenant in each_tenant(options['tenant']):
+                results = run_pending_campaigns()
+                if results:
+                    self.stdout.write(f"{tenant}: ran {len(results)} campaigns, {sum(results)} completed")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
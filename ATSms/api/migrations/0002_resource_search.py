@@ -0,0 +1,53 @@
+# Generated by Django 5.2 on 2026-10-19 11:36
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+BACKFILL_SEARCH_VECTOR = """
+UPDATE api_resource SET search_vector =
+    setweight(to_tsvector('english', coalesce(title, '')), 'A')
+    || setweight(to_tsvector('simple', coalesce(title, '')), 'A')
+    || setweight(to_tsvector('english', coalesce(array_to_string(tags, ' '), '')), 'A')
+    || setweight(to_tsvector('simple', coalesce(array_to_string(tags, ' '), '')), 'A')
+    || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    || setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+"""
+
+
+def create_trigram_index(apps, schema_editor):
+    # pg_trgm is a contrib extension that not every server ships;
+    # without it search falls back to full-text matches only
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS resource_title_trgm_idx ON api_resource USING gin (title gin_trgm_ops)"
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    schema_editor.execute("DROP INDEX IF EXISTS resource_title_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='resource',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='resource_search_vector_idx'),
+        ),
+        migrations.RunSQL(BACKFILL_SEARCH_VECTOR, migrations.RunSQL.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
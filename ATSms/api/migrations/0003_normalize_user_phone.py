@@ -0,0 +1,30 @@
+from django.db import migrations
+
+from api.phone import normalize_phone
+
+
+def normalize_phones(apps, schema_editor):
+    User = apps.get_model('api', 'User')
+    taken = set(User.objects.exclude(phone=None).values_list('phone', flat=True))
+
+    for user in User.objects.exclude(phone=None).only('id', 'phone').iterator():
+        phone = normalize_phone(user.phone)
+        if phone == user.phone:
+            continue
+        # Two accounts for one subscriber: leave the duplicate for manual review
+        if phone in taken:
+            continue
+        taken.discard(user.phone)
+        taken.add(phone)
+        User.objects.filter(pk=user.pk).update(phone=phone)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_resource_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_phones, migrations.RunPython.noop),
+    ]
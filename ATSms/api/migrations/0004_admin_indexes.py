@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_normalize_user_phone'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mentee',
+            name='county',
+            field=models.CharField(db_index=True, max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='mentorship',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='resource',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='mentorship',
+            index=models.Index(fields=['status', '-created_at'], name='mentorship_status_created_idx'),
+        ),
+    ]
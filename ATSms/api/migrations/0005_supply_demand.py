@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-19 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplyDemand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('county', models.CharField(max_length=50)),
+                ('interest', models.CharField(max_length=50)),
+                ('mentee_count', models.PositiveIntegerField(default=0)),
+                ('mentor_capacity', models.PositiveIntegerField(default=0)),
+                ('active_mentorships', models.PositiveIntegerField(default=0)),
+                ('match_attempts', models.PositiveIntegerField(default=0)),
+                ('match_failures', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('county', 'interest'), name='supply_demand_county_interest')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 11:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_campaigns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.CharField(max_length=100, unique=True)),
+                ('phone', models.CharField(max_length=20)),
+                ('template', models.CharField(max_length=50)),
+                ('status', models.CharField(max_length=30)),
+                ('failure_reason', models.CharField(blank=True, max_length=100)),
+                ('cost', models.CharField(blank=True, max_length=30)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('campaign', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='messages', to='api.campaign')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['template', 'campaign'], name='outbound_template_campaign_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_outbound_messages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundmessage',
+            name='segments',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
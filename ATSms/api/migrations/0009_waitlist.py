@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-19 11:53
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_outbound_segments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('county', models.CharField(max_length=50)),
+                ('interests', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), blank=True, default=list, size=None)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('mentee', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entry', to='api.mentee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['county', 'created_at'], name='waitlist_county_created_idx'), django.contrib.postgres.indexes.GinIndex(fields=['interests'], name='waitlist_interests_gin')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_waitlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='language',
+            field=models.CharField(blank=True, max_length=5),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-19 12:08
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_resource_language'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceEngagement',
+            fields=[
+                ('resource', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='engagement', serialize=False, to='api.resource')),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('clicks', models.PositiveIntegerField(default=0)),
+                ('ussd_views', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResourceEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('view', 'View'), ('click', 'Click'), ('ussd_view', 'USSD view')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('mentee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resource_events', to='api.mentee')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='api.resource')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resource', 'created_at'], name='resource_event_resource_idx'), django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='resource_event_created_brin')],
+            },
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.2 on 2026-10-19 12:21
+
+from django.db import migrations, models
+
+SYNCED_TABLES = ('api_resource', 'api_mentorship', 'api_mentee')
+
+# Every insert and real update takes the next change number, and records
+# its transaction so api.sync can tell changes committed out of order
+CREATE_CHANGE_TRIGGERS = """
+CREATE SEQUENCE api_change_seq;
+
+CREATE FUNCTION api_record_change() RETURNS trigger AS $$
+BEGIN
+    NEW.change_seq := nextval('api_change_seq');
+    NEW.change_txid := txid_current();
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION api_record_deletion() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO api_tombstone (kind, object_id, mentee_id, change_seq, change_txid, deleted_at)
+    VALUES (TG_ARGV[0], OLD.id, (to_jsonb(OLD) ->> 'mentee_id')::bigint,
+            nextval('api_change_seq'), txid_current(), now());
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql;
+""" + "".join(f"""
+UPDATE {table} SET change_seq = nextval('api_change_seq'), change_txid = txid_current();
+CREATE TRIGGER {table}_insert_change BEFORE INSERT ON {table}
+    FOR EACH ROW EXECUTE FUNCTION api_record_change();
+CREATE TRIGGER {table}_update_change BEFORE UPDATE ON {table}
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION api_record_change();
+""" for table in SYNCED_TABLES) + """
+CREATE TRIGGER api_resource_deletion AFTER DELETE ON api_resource
+    FOR EACH ROW EXECUTE FUNCTION api_record_deletion('resource');
+CREATE TRIGGER api_mentorship_deletion AFTER DELETE ON api_mentorship
+    FOR EACH ROW EXECUTE FUNCTION api_record_deletion('mentorship');
+"""
+
+DROP_CHANGE_TRIGGERS = "".join(f"""
+DROP TRIGGER {table}_insert_change ON {table};
+DROP TRIGGER {table}_update_change ON {table};
+""" for table in SYNCED_TABLES) + """
+DROP TRIGGER api_resource_deletion ON api_resource;
+DROP TRIGGER api_mentorship_deletion ON api_mentorship;
+DROP FUNCTION api_record_change();
+DROP FUNCTION api_record_deletion();
+DROP SEQUENCE api_change_seq;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_resource_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('resource', 'Resource'), ('mentorship', 'Mentorship')], max_length=10)),
+                ('object_id', models.UUIDField()),
+                ('mentee_id', models.BigIntegerField(blank=True, null=True)),
+                ('change_seq', models.BigIntegerField(db_index=True)),
+                ('change_txid', models.BigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='mentee',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='mentee',
+            name='change_txid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='mentorship',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='mentorship',
+            name='change_txid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='change_txid',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunSQL(CREATE_CHANGE_TRIGGERS, DROP_CHANGE_TRIGGERS),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-19 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mentorship',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['mentee', 'created_at'], name='mentorship_active_mentee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mentorship',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['mentor', 'created_at'], name='mentorship_active_mentor_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_relay_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaign',
+            name='interests',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=50), default=list, size=None),
+        ),
+        migrations.RunSQL(
+            "UPDATE api_campaign SET interests = ARRAY[interest]",
+            "UPDATE api_campaign SET interest = interests[1]",
+        ),
+        migrations.RemoveField(
+            model_name='campaign',
+            name='interest',
+        ),
+    ]
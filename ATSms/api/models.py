@@ -1,8 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
 import uuid
 
+from .phone import normalize_phone
+
 class UserManager(BaseUserManager):
     def create_user(self, phone=None, email=None, password=None, **extra_fields):
         if not (phone or email):
@@ -36,6 +40,8 @@ class User(AbstractUser):
     objects = UserManager()
     
     def save(self, *args, **kwargs):
+        # Store phones in E.164 so lookups by caller number hit the unique index
+        self.phone = normalize_phone(self.phone)
         if not self.username and self.email:
             self.username = self.email
         elif not self.username and self.phone:
@@ -52,11 +58,20 @@ class Mentee(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='mentee_profile')
     name = models.CharField(max_length=100)
     age = models.PositiveIntegerField(null=False, blank=False)
-    county = models.CharField(max_length=50)
+    county = models.CharField(max_length=50, db_index=True)
     language = models.CharField(max_length=5, default='en')  # 'en' or 'sw'
     device = models.CharField(max_length=50)
     interests = ArrayField(models.CharField(max_length=50), blank=True, default=list)
     communication_preference = models.CharField(max_length=10, choices=COMMUNICATION_CHOICES, default='app')
+    # Set by a database trigger on every insert and update, see api.sync
+    change_seq = models.BigIntegerField(default=0, editable=False)
+    change_txid = models.BigIntegerField(default=0, editable=False)
+    
+    class Meta:
+        indexes = [
+            # Serves the interests__overlap (&&) lookup that selects campaign recipients
+            GinIndex(fields=['interests'], name='mentee_interests_gin'),
+        ]
     
     def __str__(self):
         return self.name
@@ -89,12 +104,44 @@ class Mentorship(models.Model):
     mentee = models.ForeignKey(Mentee, on_delete=models.CASCADE, related_name='mentorships')
     mentor = models.ForeignKey(Mentor, on_delete=models.CASCADE, related_name='mentorships')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set by a database trigger on every insert and update, see api.sync
+    change_seq = models.BigIntegerField(default=0, editable=False)
+    change_txid = models.BigIntegerField(default=0, editable=False)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='mentorship_status_created_idx'),
+            # The SMS relay looks up a phone's active mentorships from either side
+            models.Index(fields=['mentee', 'created_at'], condition=models.Q(status='active'),
+                         name='mentorship_active_mentee_idx'),
+            models.Index(fields=['mentor', 'created_at'], condition=models.Q(status='active'),
+                         name='mentorship_active_mentor_idx'),
+        ]
     
     def __str__(self):
         return f"{self.mentee.name} - {self.mentor.name}"
 
+class WaitlistEntry(models.Model):
+    """
+    A mentee waiting for a mentor after matching found none. Entries are
+    served oldest first when mentor capacity frees up in their county.
+    """
+    mentee = models.OneToOneField(Mentee, on_delete=models.CASCADE, related_name='waitlist_entry')
+    county = models.CharField(max_length=50)
+    interests = ArrayField(models.CharField(max_length=50), blank=True, default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['county', 'created_at'], name='waitlist_county_created_idx'),
+            GinIndex(fields=['interests'], name='waitlist_interests_gin'),
+        ]
+    
+    def __str__(self):
+        return f"{self.mentee.name} ({self.county})"
+
 class Resource(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=255)
@@ -102,8 +149,161 @@ class Resource(models.Model):
     tags = ArrayField(models.CharField(max_length=50), blank=True, default=list)
     link = models.URLField(blank=True, null=True)
     sms_text = models.TextField(blank=True, null=True)
+    language = models.CharField(max_length=5, blank=True)  # 'en' or 'sw', blank suits every language
     created_by = models.ForeignKey(Mentor, on_delete=models.SET_NULL, null=True, related_name='uploaded_resources')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Set by a database trigger on every insert and update, see api.sync
+    change_seq = models.BigIntegerField(default=0, editable=False, db_index=True)
+    change_txid = models.BigIntegerField(default=0, editable=False, db_index=True)
+    # Maintained by api.search.update_search_vector on save
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='resource_search_vector_idx'),
+        ]
+    
+    def __str__(self):
+        return self.title
+
+class Campaign(models.Model):
+    """
+    An SMS sent once to every mentee with any of the given interests. Recipients are
+    walked in mentee id order; last_mentee_id is the checkpoint a crashed
+    run resumes from.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255)
+    message = models.TextField()
+    interests = ArrayField(models.CharField(max_length=50), default=list)
+    language = models.CharField(max_length=5, blank=True)  # blank targets every language
+    resource = models.ForeignKey(Resource, on_delete=models.SET_NULL, null=True, blank=True, related_name='campaigns')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    last_mentee_id = models.BigIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return self.name
+
+class OutboundMessage(models.Model):
+    """
+    One SMS to one recipient, as accepted by the gateway. Status starts as
+    the gateway's answer and is updated from delivery reports.
+    """
+    message_id = models.CharField(max_length=100, unique=True)
+    phone = models.CharField(max_length=20)
+    template = models.CharField(max_length=50)  # e.g. 'welcome' or 'campaign'
+    campaign = models.ForeignKey(Campaign, on_delete=models.SET_NULL, null=True, blank=True, related_name='messages')
+    status = models.CharField(max_length=30)
+    failure_reason = models.CharField(max_length=100, blank=True)
+    cost = models.CharField(max_length=30, blank=True)
+    segments = models.PositiveSmallIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['template', 'campaign'], name='outbound_template_campaign_idx'),
+        ]
+    
+    def __str__(self):
+        return self.message_id
+
+class ResourceEvent(models.Model):
+    """
+    One view or click of a resource, in the app or in a USSD menu.
+    Written in batches by api.engagement, which also keeps the per
+    resource totals in ResourceEngagement.
+    """
+    KIND_CHOICES = (
+        ('view', 'View'),
+        ('click', 'Click'),
+        ('ussd_view', 'USSD view'),
+    )
+    
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='events')
+    mentee = models.ForeignKey(Mentee, on_delete=models.SET_NULL, null=True, blank=True, related_name='resource_events')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'created_at'], name='resource_event_resource_idx'),
+            # Append-only, so a BRIN index serves time range scans at a fraction of the size
+            BrinIndex(fields=['created_at'], name='resource_event_created_brin'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.resource_id}"
+
+class ResourceEngagement(models.Model):
+    """
+    Running event totals per resource, rolled up as events are written
+    """
+    resource = models.OneToOneField(Resource, on_delete=models.CASCADE, primary_key=True, related_name='engagement')
+    views = models.PositiveIntegerField(default=0)
+    clicks = models.PositiveIntegerField(default=0)
+    ussd_views = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @property
+    def total(self):
+        return self.views + self.clicks + self.ussd_views
+    
+    def __str__(self):
+        return f"{self.resource_id}: {self.total}"
+
+class Tombstone(models.Model):
+    """
+    A deleted resource or mentorship, kept so offline clients can drop
+    their copy. Written by a database trigger, see api.sync.
+    """
+    KIND_CHOICES = (
+        ('resource', 'Resource'),
+        ('mentorship', 'Mentorship'),
+    )
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.UUIDField()
+    # The mentee a mentorship belonged to; not a key, as it may be gone too
+    mentee_id = models.BigIntegerField(null=True, blank=True)
+    change_seq = models.BigIntegerField(db_index=True)
+    change_txid = models.BigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
+
+class SupplyDemand(models.Model):
+    """
+    Mentee demand against mentor capacity per county and interest.
+    Counts are rebuilt by the refresh_analytics command; match attempts
+    and failures are recorded live by the matching endpoint.
+    """
+    county = models.CharField(max_length=50)
+    interest = models.CharField(max_length=50)
+    mentee_count = models.PositiveIntegerField(default=0)
+    mentor_capacity = models.PositiveIntegerField(default=0)
+    active_mentorships = models.PositiveIntegerField(default=0)
+    match_attempts = models.PositiveIntegerField(default=0)
+    match_failures = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['county', 'interest'], name='supply_demand_county_interest'),
+        ]
     
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return f"{self.county} / {self.interest}"
@@ -0,0 +1,35 @@
+import re
+
+from django.conf import settings
+
+NON_DIGITS = re.compile(r'\D')
+E164 = re.compile(r'^\+[1-9]\d{6,14}$')
+
+
+def normalize_phone(phone):
+    """
+    Normalize a phone number to E.164 so the same subscriber always maps
+    to the same stored value, e.g. '0712 345 678' -> '+254712345678'.
+
+    Numbers without a country code are assumed to be local to
+    settings.PHONE_COUNTRY_CODE. Empty values are returned as None.
+    """
+    if not phone:
+        return None
+
+    phone = phone.strip()
+    digits = NON_DIGITS.sub('', phone)
+
+    if phone.startswith('+'):
+        return f"+{digits}"
+    if digits.startswith('00'):
+        return f"+{digits[2:]}"
+    if digits.startswith('0'):
+        return f"+{settings.PHONE_COUNTRY_CODE}{digits[1:]}"
+    return f"+{digits}"
+
+def is_valid_phone(phone):
+    """
+    Check that an already normalized number is plausible E.164
+    """
+    return bool(phone and E164.match(phone))
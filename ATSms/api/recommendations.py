@@ -0,0 +1,209 @@
+"""
+Resource recommendations for mentees.
+
+Resources are scored against a mentee's interests, language and
+popularity. Candidates come from an inverted index of tag -> resource
+ids kept in the shared cache, so ranking touches only resources that
+share a tag with the mentee and never scans the resource table.
+
+Saving a resource updates the index in place. Popularity and anything
+the in-place updates missed are picked up when the index is rebuilt
+every RECOMMENDATION_INDEX_TIMEOUT seconds.
+"""
+import heapq
+import logging
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Resource
+from .caching import REFRESH_LOCK_TIMEOUT, bump_version, get_or_build, get_version, peek, replace
+from .catalog import CATALOG_NAMESPACE, get_catalog_version, summarize_resources
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAMESPACE = 'resource_index'
+INDEX_KEY = 'index'
+INDEX_LOCK_KEY = 'resource_index_lock'
+RECOMMENDATIONS_KEY = 'recommendations'
+
+# Score = interest overlap + language + popularity, newest first on ties.
+# Overlap is the share of the mentee's interests a resource covers, so it
+# dominates: a resource matching more interests always ranks higher.
+INTEREST_WEIGHT = 2.0
+LANGUAGE_WEIGHT = 0.5  # added in the mentee's language, subtracted in the other
+POPULARITY_WEIGHT = 0.5  # scaled by log against the most popular resource
+
+
+def normalize_tag(tag):
+    return tag.strip().casefold()
+
+
+class ResourceIndex:
+    """
+    Inverted index of resource tags with what scoring needs per resource
+    """
+    def __init__(self):
+        self.postings = {}  # tag -> set of resource ids
+        self.resources = {}  # resource id -> (tags, language, popularity, created timestamp)
+        self.max_popularity = 0
+
+    def add(self, resource_id, tags, language='', popularity=0, created_at=0.0):
+        self.remove(resource_id)
+        tags = frozenset(normalize_tag(tag) for tag in tags if tag)
+        for tag in tags:
+            self.postings.setdefault(tag, set()).add(resource_id)
+        self.resources[resource_id] = (tags, language, popularity, created_at)
+        self.max_popularity = max(self.max_popularity, popularity)
+
+    def remove(self, resource_id):
+        entry = self.resources.pop(resource_id, None)
+        if entry is None:
+            return
+        for tag in entry[0]:
+            ids = self.postings.get(tag)
+            ids.discard(resource_id)
+            if not ids:
+                del self.postings[tag]
+
+    def popularity(self, resource_id):
+        entry = self.resources.get(resource_id)
+        return entry[2] if entry else 0
+
+    def score(self, resource_id, wanted, language):
+        tags, resource_language, popularity, _ = self.resources[resource_id]
+        score = INTEREST_WEIGHT * len(wanted & tags) / len(wanted)
+        if resource_language:
+            score += LANGUAGE_WEIGHT if resource_language == language else -LANGUAGE_WEIGHT
+        if popularity:
+            score += POPULARITY_WEIGHT * math.log1p(popularity) / math.log1p(self.max_popularity)
+        return score
+
+    def top(self, interests, language='en', limit=None):
+        """
+        Rank the resources sharing a tag with interests
+
+        Args:
+            interests (iterable): Mentee interests
+            language (str): Mentee language
+            limit (int): Number of ids to return, None for every match
+
+        Returns:
+            list: Resource ids, best first
+        """
+        wanted = frozenset(normalize_tag(interest) for interest in interests if interest)
+        candidates = set()
+        for tag in wanted:
+            candidates.update(self.postings.get(tag, ()))
+
+        def key(resource_id):
+            return (self.score(resource_id, wanted, language), self.resources[resource_id][3], resource_id)
+
+        if limit is None:
+            return sorted(candidates, key=key, reverse=True)
+        return heapq.nlargest(limit, candidates, key=key)
+
+    def __len__(self):
+        return len(self.resources)
+
+
+def build_index():
+    """
+    Build the index from every resource, with popularity as the total
+    views and clicks rolled up by api.engagement
+    """
+    index = ResourceIndex()
+    rows = Resource.objects.values_list(
+        'id', 'tags', 'language', 'engagement__views', 'engagement__clicks', 'engagement__ussd_views', 'created_at'
+    )
+    for resource_id, tags, language, views, clicks, ussd_views, created_at in rows:
+        popularity = (views or 0) + (clicks or 0) + (ussd_views or 0)
+        index.add(str(resource_id), tags, language, popularity, created_at.timestamp())
+    return index
+
+def get_index():
+    """
+    The current index, from cache when possible. Shared between threads,
+    so it must not be modified; see update_index.
+    """
+    return get_or_build(INDEX_NAMESPACE, INDEX_KEY, build_index, settings.RECOMMENDATION_INDEX_TIMEOUT)
+
+def invalidate_index():
+    """
+    Drop the index, so the next read rebuilds it
+    """
+    bump_version(INDEX_NAMESPACE)
+
+def update_index(change):
+    """
+    Apply change(index) to a copy of the cached index and publish it.
+    Does nothing before the index is first built. Updates are serialized
+    across workers; one that would race another drops the index instead,
+    since a rebuild is always correct.
+    """
+    if not cache.add(INDEX_LOCK_KEY, True, REFRESH_LOCK_TIMEOUT):
+        logger.info("Resource index is being updated elsewhere, rebuilding instead")
+        invalidate_index()
+        return
+    try:
+        index = peek(INDEX_NAMESPACE, INDEX_KEY)
+        if index is None:
+            return
+        change(index)
+        replace(INDEX_NAMESPACE, INDEX_KEY, index, settings.RECOMMENDATION_INDEX_TIMEOUT)
+    finally:
+        cache.delete(INDEX_LOCK_KEY)
+
+def index_resource(resource):
+    """
+    Add a new or edited resource to the index
+    """
+    resource_id = str(resource.pk)
+    update_index(lambda index: index.add(
+        resource_id, resource.tags, resource.language,
+        index.popularity(resource_id), resource.created_at.timestamp()
+    ))
+
+def unindex_resource(resource_id):
+    update_index(lambda index: index.remove(str(resource_id)))
+
+
+def get_recommendations(interests, language='en', comm_pref='app', limit=None):
+    """
+    Get the resources best matching a set of interests in the shape a
+    mentee's communication preference needs. Results are cached per
+    interest set, so mentees with the same interests share them.
+
+    Args:
+        interests (iterable): Mentee interests, or a single pathway goal
+        language (str): Mentee language
+        comm_pref (str): Mentee communication preference
+        limit (int): Number of resources, None for every match
+
+    Returns:
+        tuple: (data, etag, last_modified)
+    """
+    shape = 'ussd' if comm_pref == 'ussd' else 'app'
+    wanted = sorted({normalize_tag(interest) for interest in interests if interest})
+
+    def build():
+        # DRF stays out of module level, as in the catalog
+        from .compact import serialize_resources
+        from .conditional import etag_for
+
+        ids = get_index().top(wanted, language, limit)
+        rank = {resource_id: position for position, resource_id in enumerate(ids)}
+        queryset = Resource.objects.filter(pk__in=ids)
+        if shape == 'ussd':
+            resources = sorted(queryset.only('id', 'title', 'sms_text', 'description'), key=lambda r: rank[str(r.pk)])
+            data = summarize_resources(resources)
+        else:
+            data = sorted(serialize_resources(queryset), key=lambda r: rank[r['id']])
+        return data, etag_for(data)
+
+    # Keyed by index version too, so in-place index updates show up at once
+    key = f"{RECOMMENDATIONS_KEY}:{get_version(INDEX_NAMESPACE)}:{shape}:{language}:{limit}:{','.join(wanted)}"
+    data, etag = get_or_build(CATALOG_NAMESPACE, key, build, settings.RECOMMENDATION_INDEX_TIMEOUT)
+    return data, etag, datetime.fromtimestamp(get_catalog_version(), tz=timezone.utc)
@@ -0,0 +1,314 @@
+"""
+Masked SMS relay between mentors and mentees.
+
+Both sides text the platform's shortcode. An inbound message is routed
+through the sender's active mentorships to the other side and forwarded
+from the shortcode, so neither ever sees the other's number, and an
+anonymous mentor's name is never shown either.
+
+Handling a callback touches only the cache. Each phone's conversations
+are kept as one compact cache entry, built in two indexed queries on a
+miss. Forwarded messages go into an in-memory queue that a background
+thread sends, paced to RELAY_MESSAGES_PER_SECOND.
+
+With several active mentorships, a message goes to whoever last wrote to
+the sender, or to the conversation picked with a leading '#2'. Forwarded
+messages carry that number when the recipient has more than one.
+"""
+import atexit
+import logging
+import re
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connections
+from django.db.models import Q
+
+from .campaigns import Pacer
+from .delivery import outbound_messages
+from .gateways import get_gateway, successful_recipients
+from .models import Mentorship, OutboundMessage, User
+from .segments import SMS_TEMPLATES_GSM7, build_relay_sms, fit, measure
+from .tenants import get_tenant, tenant_context
+from .translations import DEFAULT_LANGUAGE, normalize_language
+
+logger = logging.getLogger(__name__)
+
+RELAY_TEMPLATE = 'relay'
+CONVERSATIONS_KEY = 'relay_conversations'
+# Mentorship the phone last received a message from, where replies go by default
+LAST_SENDER_KEY = 'relay_last'
+# '#2 text' picks the second conversation
+NUMBERED = re.compile(r'^\s*#(\d{1,2})\s*(.*)$', re.DOTALL)
+
+# Fields of a conversation tuple
+MENTORSHIP_ID, PEER_PHONE, PEER_NAME, PEER_LANGUAGE, OWN_NAME = range(5)
+
+
+def conversations_key(phone):
+    return f"{CONVERSATIONS_KEY}:{phone}"
+
+def last_sender_key(phone):
+    return f"{LAST_SENDER_KEY}:{phone}"
+
+def load_conversations(phone):
+    """
+    The active mentorships of a phone, oldest first, from the unique index
+    on User.phone and the partial indexes on active mentorships
+
+    Returns:
+        tuple: (language, conversations), each conversation a tuple of
+        (mentorship id, peer phone, peer name, peer language, own name as
+        the peer sees it). Own and peer names are None for anonymous
+        mentors, and language is None for numbers nobody registered.
+    """
+    profile = (
+        User.objects.filter(phone=phone)
+        .values_list('mentee_profile__id', 'mentee_profile__language',
+                     'mentor_profile__id', 'mentor_profile__language_preference')
+        .first()
+    )
+    if profile is None:
+        return None, ()
+    mentee_id, mentee_language, mentor_id, mentor_language = profile
+    if mentee_id is None and mentor_id is None:
+        return DEFAULT_LANGUAGE, ()
+
+    sides = Q()
+    if mentee_id is not None:
+        sides |= Q(mentee_id=mentee_id)
+    if mentor_id is not None:
+        sides |= Q(mentor_id=mentor_id)
+    rows = (
+        Mentorship.objects.filter(sides, status='active')
+        .order_by('created_at')
+        .values_list('id', 'mentee_id', 'mentee__user__phone', 'mentee__name', 'mentee__language',
+                     'mentor__user__phone', 'mentor__name', 'mentor__visibility', 'mentor__language_preference')
+    )
+    conversations = []
+    for (mentorship_id, row_mentee_id, mentee_phone, mentee_name, row_mentee_language,
+         mentor_phone, mentor_name, visibility, row_mentor_language) in rows:
+        mentor_name = mentor_name if visibility == 'visible' else None
+        if row_mentee_id == mentee_id:
+            conversations.append((str(mentorship_id), mentor_phone, mentor_name, row_mentor_language, mentee_name))
+        else:
+            conversations.append((str(mentorship_id), mentee_phone, mentee_name, row_mentee_language, mentor_name))
+    language = mentee_language if mentee_id is not None else mentor_language
+    return normalize_language(language), tuple(conversations)
+
+def cache_conversations(phone):
+    state = load_conversations(phone)
+    cache.set(conversations_key(phone), state, settings.RELAY_STATE_TIMEOUT)
+    return state
+
+def get_conversations(phone):
+    """
+    A phone's cached conversations, see load_conversations
+    """
+    return cache.get(conversations_key(phone)) or cache_conversations(phone)
+
+def forget_conversations(phones):
+    """
+    Drop cached conversations after a mentorship or profile changed
+    """
+    phones = [phone for phone in phones if phone]
+    if phones:
+        cache.delete_many([conversations_key(phone) for phone in phones])
+
+def forget_peer_conversations(user_ids, phones=()):
+    """
+    Drop the cached conversations of users and of everyone in an active
+    mentorship with them, whose cached state holds their phone and name.
+    phones adds numbers the users no longer have.
+    """
+    rows = Mentorship.objects.filter(
+        Q(mentee__user_id__in=user_ids) | Q(mentor__user_id__in=user_ids), status='active'
+    ).values_list('mentee__user__phone', 'mentor__user__phone')
+    forget_conversations({
+        *phones,
+        *User.objects.filter(pk__in=user_ids).values_list('phone', flat=True),
+        *(phone for row in rows for phone in row),
+    })
+
+def sender_name(name, language):
+    if name is None:
+        return SMS_TEMPLATES_GSM7[language]['relay_anonymous_mentor']
+    return name
+
+def choose_conversation(conversations, text, last_sender):
+    """
+    Pick the conversation a message is for
+
+    Returns:
+        tuple: (conversation or None if the sender must choose, message text)
+    """
+    match = NUMBERED.match(text)
+    if match:
+        number = int(match.group(1))
+        if 1 <= number <= len(conversations):
+            return conversations[number - 1], match.group(2)
+    if len(conversations) == 1:
+        return conversations[0], text
+    for conversation in conversations:
+        if conversation[MENTORSHIP_ID] == last_sender:
+            return conversation, text
+    return None, text
+
+def relay(phone, text):
+    """
+    Route an inbound SMS to the other side of the sender's mentorship.
+    Users without one, or who must say who a message is for, get a reply
+    explaining how instead. Unknown numbers are ignored.
+
+    Args:
+        phone (str): Sender's E.164 number
+        text (str): Message text
+
+    Returns:
+        bool: True if the message was forwarded
+    """
+    state = cache.get_many([conversations_key(phone), last_sender_key(phone)])
+    language, conversations = state.get(conversations_key(phone)) or cache_conversations(phone)
+    if language is None:
+        logger.info(f"Ignoring relay SMS from unregistered number {phone}")
+        return False
+    templates = SMS_TEMPLATES_GSM7[language]
+    if not conversations:
+        relay_outbox.add(phone, templates['relay_no_mentorship'])
+        return False
+
+    conversation, text = choose_conversation(conversations, text, state.get(last_sender_key(phone)))
+    if conversation is None:
+        choices = ', '.join(
+            f"#{number} {sender_name(c[PEER_NAME], language)}" for number, c in enumerate(conversations, 1)
+        )
+        message, _ = fit(templates['relay_choose'], {'choices': choices}, ('choices',))
+        relay_outbox.add(phone, message)
+        return False
+    if not text.strip():
+        return False
+
+    mentorship_id, peer_phone, _, peer_language, own_name = conversation
+    _, peer_conversations = get_conversations(peer_phone)
+    ids = [c[MENTORSHIP_ID] for c in peer_conversations]
+    number = ids.index(mentorship_id) + 1 if len(ids) > 1 and mentorship_id in ids else None
+    if number is not None:
+        cache.set(last_sender_key(peer_phone), mentorship_id, settings.RELAY_STATE_TIMEOUT)
+
+    language = normalize_language(peer_language)
+    message, _ = build_relay_sms(sender_name(own_name, language), text.strip(), number, language)
+    relay_outbox.add(peer_phone, message)
+    return True
+
+
+class RelayOutbox:
+    """
+    Messages waiting to be sent. add() only appends to a bounded queue;
+    one background thread per process sends them one by one, paced to
+    messages_per_second, and records them for delivery reports in
+    batches. If sending falls more than limit messages behind, the oldest
+    are dropped and counted.
+    """
+    def __init__(self, messages_per_second=None, limit=None, gateway=None, pacer=None):
+        self._messages_per_second = messages_per_second
+        self._limit = limit
+        self._gateway = gateway
+        self._pacer = pacer
+        self._queue = None
+        self._sending = False
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    @property
+    def limit(self):
+        return self._limit or settings.RELAY_QUEUE_LIMIT
+
+    @property
+    def pacer(self):
+        if self._pacer is None:
+            self._pacer = Pacer(self._messages_per_second or settings.RELAY_MESSAGES_PER_SECOND)
+        return self._pacer
+
+    def add(self, phone, message):
+        with self._lock:
+            if self._queue is None:
+                self._queue = deque(maxlen=self.limit)
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((get_tenant(), phone, message))
+            if not self._sending:
+                self._sending = True
+                threading.Thread(target=self._send_in_background, daemon=True).start()
+
+    def _take(self, count):
+        with self._lock:
+            batch = []
+            while self._queue and len(batch) < count:
+                batch.append(self._queue.popleft())
+            return batch
+
+    def flush(self):
+        """
+        Send everything queued so far
+
+        Returns:
+            int: Number of messages the gateway accepted
+        """
+        sent = 0
+        while True:
+            batch = self._take(settings.SMS_BATCH_SIZE)
+            if not batch:
+                break
+            sent += self._send(batch)
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            logger.warning(f"Dropped {dropped} relay messages, sending is falling behind")
+        return sent
+
+    def _send(self, batch):
+        gateway = self._gateway or get_gateway()
+        sent = 0
+        records = {}
+        for tenant, phone, message in batch:
+            self.pacer.wait(1)
+            try:
+                response = gateway.send(message, [phone])
+            except Exception as e:
+                logger.error(f"Failed to relay SMS: {e}")
+                continue
+            sent += len(successful_recipients(response))
+            records.setdefault(tenant, []).extend(
+                outbound_messages(response, RELAY_TEMPLATE, segments=measure(message).segments)
+            )
+        for tenant, messages in records.items():
+            try:
+                with tenant_context(tenant):
+                    OutboundMessage.objects.bulk_create(messages, ignore_conflicts=True)
+            except Exception as e:
+                logger.error(f"Failed to record {len(messages)} relay messages for {tenant}: {e}")
+        return sent
+
+    def _send_in_background(self):
+        close_old_connections()
+        try:
+            while True:
+                self.flush()
+                with self._lock:
+                    if not self._queue:
+                        self._sending = False
+                        return
+        except Exception:
+            with self._lock:
+                self._sending = False
+            raise
+        finally:
+            connections.close_all()
+
+    def __len__(self):
+        return len(self._queue or ())
+
+relay_outbox = RelayOutbox()
+atexit.register(relay_outbox.flush)
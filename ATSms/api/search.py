@@ -0,0 +1,86 @@
+from functools import lru_cache
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, Func, TextField, Value
+
+from .models import Resource
+from .tenants import get_tenant, tenant_connection
+
+# Postgres ships no Swahili dictionary, so Swahili uses the unstemmed
+# 'simple' configuration. The stored vector holds both forms.
+SEARCH_CONFIGS = {
+    'en': 'english',
+    'sw': 'simple',
+}
+
+SEARCH_RESULT_LIMIT = 20
+
+tags_text = Func(F('tags'), Value(' '), function='array_to_string', output_field=TextField())
+
+RESOURCE_SEARCH_VECTOR = (
+    SearchVector('title', config='english', weight='A')
+    + SearchVector('title', config='simple', weight='A')
+    + SearchVector(tags_text, config='english', weight='A')
+    + SearchVector(tags_text, config='simple', weight='A')
+    + SearchVector('description', config='english', weight='B')
+    + SearchVector('description', config='simple', weight='B')
+)
+
+
+def update_search_vector(queryset):
+    """
+    Recompute the stored search vector for the resources in queryset
+    with a single set-based UPDATE
+    """
+    return queryset.update(search_vector=RESOURCE_SEARCH_VECTOR)
+
+def trigram_available():
+    """
+    Whether pg_trgm is installed. Migrations only create it on servers
+    that ship it, so fuzzy matching is optional.
+    """
+    return _trigram_available(get_tenant())
+
+@lru_cache(maxsize=None)
+def _trigram_available(tenant):
+    # Tenant databases may live on different servers
+    with tenant_connection().cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+def search_resources(term, language='en', limit=SEARCH_RESULT_LIMIT):
+    """
+    Search resources by title, description and tags.
+
+    Ranked full-text matches come first. If there are too few of them and
+    pg_trgm is available, titles similar to the term fill the rest, so
+    misspellings typed on feature phones still find something.
+
+    Returns:
+        list: Matching resources, best first
+    """
+    config = SEARCH_CONFIGS.get(language, 'simple')
+    query = SearchQuery(term, config=config, search_type='websearch')
+
+    results = list(
+        Resource.objects.filter(search_vector=query)
+        .annotate(rank=SearchRank(F('search_vector'), query))
+        .order_by('-rank', '-created_at')[:limit]
+    )
+
+    if len(results) < limit and trigram_available():
+        found = [r.pk for r in results]
+        results += list(
+            # The lookup uses the trigram index; similarity only orders the hits
+            Resource.objects.filter(title__trigram_word_similar=term)
+            .exclude(pk__in=found)
+            .annotate(similarity=TrigramWordSimilarity(term, 'title'))
+            .order_by('-similarity')[:limit - len(results)]
+        )
+
+    return results
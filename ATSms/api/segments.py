@@ -0,0 +1,271 @@
+"""
+SMS encoding and segment arithmetic.
+
+A message that only uses the GSM 03.38 alphabet is sent as GSM-7: 160
+characters in one segment, 153 per segment once it has to be split. A
+single character outside that alphabet switches the whole message to
+UCS-2: 70 characters in one segment, 67 per part. Every segment is billed,
+so builders here keep messages in GSM-7 where they can and fit them to a
+segment budget.
+"""
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+
+from .translations import DEFAULT_LANGUAGE, SMS_CATALOG, normalize_language
+
+GSM7 = 'GSM-7'
+UCS2 = 'UCS-2'
+
+GSM7_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Sent as an escape plus the character, so each costs two septets
+GSM7_EXTENDED = frozenset("^{}\\[~]|€\f")
+
+# (single segment, per part of a multipart message)
+SEGMENT_LIMITS = {
+    GSM7: (160, 153),
+    UCS2: (70, 67),
+}
+
+# Common characters that pull a message into UCS-2 for no visible benefit,
+# typically pasted from phones or word processors
+GSM7_REPLACEMENTS = str.maketrans({
+    '‘': "'", '’': "'", '‚': "'", 'ʼ': "'", '`': "'", '´': "'",
+    '“': '"', '”': '"', '„': '"',
+    '–': '-', '—': '-', '−': '-',
+    '…': '...',
+    ' ': ' ', ' ': ' ', ' ': ' ', '\t': ' ',
+    '•': '-',
+})
+
+ELLIPSIS = '...'
+
+SegmentInfo = namedtuple('SegmentInfo', ['encoding', 'length', 'segments'])
+
+
+def gsm7_length(text):
+    """
+    Number of septets text takes in GSM-7, or None if it cannot be encoded
+    """
+    length = 0
+    for char in text:
+        if char in GSM7_BASIC:
+            length += 1
+        elif char in GSM7_EXTENDED:
+            length += 2
+        else:
+            return None
+    return length
+
+def ucs2_length(text):
+    """
+    Number of UTF-16 code units, so characters outside the BMP count twice
+    """
+    return len(text.encode('utf-16-le')) // 2
+
+def measure(text):
+    """
+    Work out the encoding, length in encoding units and billed segments
+
+    Returns:
+        SegmentInfo: (encoding, length, segments)
+    """
+    length = gsm7_length(text)
+    encoding = GSM7
+    if length is None:
+        encoding = UCS2
+        length = ucs2_length(text)
+    single, part = SEGMENT_LIMITS[encoding]
+    segments = 1 if length <= single else -(-length // part)
+    return SegmentInfo(encoding, length, segments)
+
+def capacity(encoding, segments):
+    """
+    How many encoding units fit in the given number of segments
+    """
+    single, part = SEGMENT_LIMITS[encoding]
+    return single if segments <= 1 else part * segments
+
+@lru_cache(maxsize=4096)
+def _gsm7_char(char):
+    if char in GSM7_BASIC or char in GSM7_EXTENDED:
+        return char
+    # Drop accents GSM-7 has no room for: 'ā' -> 'a'
+    stripped = ''.join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+    if stripped and gsm7_length(stripped) is not None:
+        return stripped
+    return char
+
+def to_gsm7(text):
+    """
+    Replace look-alike punctuation and accented letters with GSM-7
+    equivalents. Characters with no equivalent are kept, so a message in a
+    non-Latin script still goes out as UCS-2.
+    """
+    text = text.translate(GSM7_REPLACEMENTS)
+    if gsm7_length(text) is not None:
+        return text
+    return ''.join(_gsm7_char(char) for char in text)
+
+def truncate(text, max_segments):
+    """
+    Cut text to fit in max_segments, marking the cut with an ellipsis
+    """
+    info = measure(text)
+    if info.segments <= max_segments:
+        return text
+    budget = capacity(info.encoding, max_segments) - len(ELLIPSIS)
+    cut = []
+    used = 0
+    for char in text:
+        size = gsm7_length(char) if info.encoding == GSM7 else ucs2_length(char)
+        if used + size > budget:
+            break
+        cut.append(char)
+        used += size
+    return ''.join(cut).rstrip() + ELLIPSIS
+
+def shorten(value, overflow):
+    """
+    Drop at least overflow characters from the end of value, or all of it
+    """
+    keep = len(value) - overflow - len(ELLIPSIS)
+    if keep <= 0:
+        return ''
+    return value[:keep].rstrip() + ELLIPSIS
+
+def fit(template, fields, shrinkable, max_segments=None):
+    """
+    Render template with fields, shortening the shrinkable fields in order
+    until the message fits the segment budget.
+
+    Args:
+        template (str): A str.format template, already converted to GSM-7
+        fields (dict): Values for the template, converted to GSM-7 here
+        shrinkable (tuple): Field names that may be shortened, least important first
+        max_segments (int): Budget, settings.SMS_MAX_SEGMENTS by default
+
+    Returns:
+        tuple: (message, SegmentInfo)
+    """
+    max_segments = max_segments or settings.SMS_MAX_SEGMENTS
+    fields = {name: to_gsm7(str(value)) for name, value in fields.items()}
+    message = template.format(**fields)
+    info = measure(message)
+
+    for name in shrinkable:
+        if info.segments <= max_segments:
+            break
+        overflow = info.length - capacity(info.encoding, max_segments)
+        fields[name] = shorten(fields[name], overflow)
+        message = template.format(**fields)
+        info = measure(message)
+
+    if info.segments > max_segments:
+        message = truncate(message, max_segments)
+        info = measure(message)
+    return message, info
+
+def compile_templates(catalog):
+    """
+    Convert every SMS template to GSM-7 once, so only the variable parts
+    need converting when a message is built
+    """
+    return {
+        language: {key: to_gsm7(text) for key, text in templates.items()}
+        for language, templates in catalog.items()
+    }
+
+SMS_TEMPLATES_GSM7 = compile_templates(SMS_CATALOG)
+
+
+def build_welcome_sms(name, interests, links, language=DEFAULT_LANGUAGE, max_segments=None):
+    """
+    Build the registration welcome SMS within the segment budget.
+
+    Resource links are added one by one while they fit; the intro and
+    outro always go in, with the name and interest list shortened if even
+    they do not fit.
+
+    Args:
+        name (str): The mentee's name
+        interests (list): The mentee's interests
+        links (list): (interest, link) pairs in order of preference
+        language (str): Template language
+        max_segments (int): Budget, settings.SMS_MAX_SEGMENTS by default
+
+    Returns:
+        tuple: (message, SegmentInfo)
+    """
+    max_segments = max_segments or settings.SMS_MAX_SEGMENTS
+    templates = SMS_TEMPLATES_GSM7[normalize_language(language)]
+    fields = {'name': to_gsm7(name), 'interests': to_gsm7(', '.join(interests))}
+
+    template = templates['welcome_intro'] + '{links}' + templates['welcome_outro']
+    message, info = fit(template, {**fields, 'links': ''}, ('interests', 'name'), max_segments)
+
+    # Links only go in whole; a cut-off URL is worse than none
+    lines = ''
+    for interest, link in links:
+        candidate = lines + templates['welcome_link'].format(interest=interest, link=link)
+        with_link = template.format(**fields, links=to_gsm7(candidate))
+        with_link_info = measure(with_link)
+        if with_link_info.segments > max_segments:
+            break
+        lines = candidate
+        message, info = with_link, with_link_info
+    return message, info
+
+def build_resource_sms(interest, title, details, language=DEFAULT_LANGUAGE, max_segments=None):
+    """
+    Build a new-resource announcement within the segment budget,
+    shortening the title before the details (usually the link)
+
+    Returns:
+        tuple: (message, SegmentInfo)
+    """
+    templates = SMS_TEMPLATES_GSM7[normalize_language(language)]
+    message, info = fit(
+        templates['new_resource'],
+        {'interest': interest, 'title': title, 'details': details},
+        ('title', 'details'),
+        max_segments
+    )
+    stripped = message.strip()
+    if stripped != message:
+        return stripped, measure(stripped)
+    return message, info
+
+def build_match_sms(name, mentor_name=None, language=DEFAULT_LANGUAGE, max_segments=1):
+    """
+    Tell a waitlisted mentee they have been matched, naming the mentor
+    unless the mentor is anonymous
+
+    Returns:
+        tuple: (message, SegmentInfo)
+    """
+    templates = SMS_TEMPLATES_GSM7[normalize_language(language)]
+    if mentor_name is None:
+        return fit(templates['mentor_matched_anonymous'], {'name': name}, ('name',), max_segments)
+    return fit(templates['mentor_matched'], {'name': name, 'mentor': mentor_name}, ('mentor', 'name'), max_segments)
+
+def build_relay_sms(sender, text, number=None, language=DEFAULT_LANGUAGE, max_segments=None):
+    """
+    Forward a mentorship message under the sender's name, numbered when
+    the recipient has several conversations to reply to
+
+    Returns:
+        tuple: (message, SegmentInfo)
+    """
+    templates = SMS_TEMPLATES_GSM7[normalize_language(language)]
+    if number is None:
+        return fit(templates['relay_message'], {'sender': sender, 'text': text}, ('text', 'sender'), max_segments)
+    return fit(
+        templates['relay_message_numbered'], {'sender': sender, 'number': number, 'text': text},
+        ('text', 'sender'), max_segments
+    )
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from .models import User, Mentee, Mentor, Mentorship, Resource
 from django.contrib.auth import get_user_model
+from .phone import normalize_phone, is_valid_phone
+from .translations import LANGUAGES
 
 User = get_user_model()
 
@@ -9,6 +11,16 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'email', 'phone', 'is_mentor', 'is_mentee')
         read_only_fields = ('id', 'is_mentor', 'is_mentee')
+    
+    def validate_phone(self, value):
+        phone = normalize_phone(value)
+        if phone and not is_valid_phone(phone):
+            raise serializers.ValidationError("Enter a valid phone number")
+        
+        # Compare in normalized form so '07...' and '+2547...' collide
+        if phone and User.objects.filter(phone=phone).exclude(pk=getattr(self.instance, 'pk', None)).exists():
+            raise serializers.ValidationError("user with this phone already exists.")
+        return phone
 
 class MenteeLanguageSerializer(serializers.Serializer):
     language = serializers.ChoiceField(choices=['en', 'sw'])
@@ -67,15 +79,46 @@ class MentorshipSerializer(serializers.ModelSerializer):
         fields = ('id', 'mentor', 'mentee', 'mentor_name', 'mentee_name', 'status', 'created_at')
         read_only_fields = ('id', 'created_at')
 
+class MenteeProfileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Mentee
+        fields = (
+            'id',
+            'name',
+            'age',
+            'county',
+            'language',
+            'device',
+            'interests',
+            'communication_preference'
+        )
+
+class MenteeDashboardSerializer(MenteeProfileSerializer):
+    # Expects mentees fetched with the active mentorships prefetched into
+    # active_mentorships and their mentors select_related
+    mentorships = MentorshipSerializer(source='active_mentorships', many=True, read_only=True)
+    
+    class Meta(MenteeProfileSerializer.Meta):
+        fields = MenteeProfileSerializer.Meta.fields + ('mentorships',)
+
 class TechPathwaySerializer(serializers.Serializer):
     goal = serializers.CharField(max_length=50)
 
+class ResourceEventSerializer(serializers.Serializer):
+    resource = serializers.UUIDField()
+    kind = serializers.ChoiceField(choices=('view', 'click'))
+
 class ResourceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Resource
-        fields = ('id', 'title', 'description', 'tags', 'link', 'sms_text', 'created_by', 'created_at')
+        fields = ('id', 'title', 'description', 'tags', 'link', 'sms_text', 'language', 'created_by', 'created_at')
         read_only_fields = ('id', 'created_at')
     
+    def validate_language(self, value):
+        if value and value not in LANGUAGES:
+            raise serializers.ValidationError(f"Language must be one of {', '.join(LANGUAGES)} or blank")
+        return value
+    
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user.mentor_profile
         return super().create(validated_data)
\ No newline at end of file
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import User, Mentee, Mentor, Mentorship, Resource
+from .catalog import invalidate_catalog
+from .search import update_search_vector
+from .recommendations import index_resource, unindex_resource
+from .callers import forget_caller
+from .relay import forget_conversations, forget_peer_conversations
+from .lifecycle import recount_mentees
+from .tenants import get_tenant
+from .waitlist import drain_waitlist
+
+
+@receiver([post_save, post_delete], sender=Resource)
+def invalidate_resource_catalog(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Resource)
+def update_resource_search_vector(sender, instance, **kwargs):
+    update_search_vector(Resource.objects.filter(pk=instance.pk))
+
+@receiver(post_save, sender=Resource)
+def update_recommendation_index(sender, instance, **kwargs):
+    index_resource(instance)
+
+@receiver(post_delete, sender=Resource)
+def remove_from_recommendation_index(sender, instance, **kwargs):
+    unindex_resource(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Mentee)
+def forget_mentee_caller(sender, instance, **kwargs):
+    phone = User.objects.filter(pk=instance.user_id).values_list('phone', flat=True).first()
+    forget_caller(phone)
+
+@receiver(pre_save, sender=User)
+def remember_previous_phone(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and 'phone' not in update_fields):
+        instance._previous_phone = instance.phone
+    else:
+        instance._previous_phone = User.objects.filter(pk=instance.pk).values_list('phone', flat=True).first()
+
+@receiver(post_save, sender=User)
+def forget_user_caller(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_phone', instance.phone)
+    forget_caller(instance.phone)
+    if previous != instance.phone:
+        forget_caller(previous)
+        # Peers would keep relaying to the old number
+        transaction.on_commit(lambda: forget_peer_conversations([instance.pk], [previous]), using=get_tenant())
+    else:
+        forget_conversations([instance.phone])
+
+
+@receiver(post_save, sender=Mentor)
+def fill_new_mentor_capacity(sender, instance, **kwargs):
+    # Covers new mentors and raised max_mentees; a no-op if nobody is waiting
+    transaction.on_commit(lambda: drain_waitlist([instance.pk]), using=get_tenant())
+
+@receiver(post_save, sender=Mentorship)
+@receiver(post_delete, sender=Mentorship)
+def release_mentorship_capacity(sender, instance, created=False, **kwargs):
+    if created and instance.status == 'active':
+        return
+    def release():
+        recount_mentees([instance.mentor_id])
+        drain_waitlist([instance.mentor_id])
+    transaction.on_commit(release, using=get_tenant())
+
+@receiver(post_save, sender=Mentee)
+@receiver(post_save, sender=Mentor)
+def forget_peer_relay_conversations(sender, instance, **kwargs):
+    # Peers' cached conversations hold this profile's name, and a mentor's visibility
+    transaction.on_commit(lambda: forget_peer_conversations([instance.user_id]), using=get_tenant())
+
+@receiver(post_save, sender=Mentorship)
+@receiver(post_delete, sender=Mentorship)
+def forget_relay_conversations(sender, instance, **kwargs):
+    def forget():
+        forget_conversations(User.objects.filter(
+            Q(mentee_profile__id=instance.mentee_id) | Q(mentor_profile__id=instance.mentor_id)
+        ).values_list('phone', flat=True))
+    transaction.on_commit(forget, using=get_tenant())
@@ -0,0 +1,198 @@
+"""
+Delta sync for the mobile app.
+
+Resources, mentorships and mentee profiles carry a change number from a
+database sequence, set by triggers on every insert and update (see
+migration 0012), and deleting a resource or mentorship leaves a
+Tombstone with one. A client keeps the cursor of its last sync and gets
+back only what changed after it.
+
+Change numbers are taken when a row is written but only become visible
+when its transaction commits, so a number below the cursor can show up
+after a sync has moved past it. Only transactions still running when the
+cursor was issued can do that, so the cursor also lists them (the
+snapshot's xip), and the next sync re-sends whatever they wrote below
+it. Re-sends are fetched apart from the page, so a long transaction
+can't stall paging, and rows other transactions committed meanwhile are
+sent once rather than on every page. Cursors from before the list was
+added re-send everything written since their snapshot xmin. Repeats are
+harmless, as clients apply changes by id.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from .models import Mentee, Resource, Tombstone
+from .tenants import read_connection
+
+REPEATABLE_READ_SQL = "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"
+SNAPSHOT_SQL = (
+    "SELECT txid_snapshot_xmin(s), ARRAY(SELECT txid_snapshot_xip(s)) FROM txid_current_snapshot() AS s"
+)
+
+
+def parse_cursor(value):
+    """
+    Read a cursor from a client
+
+    Returns:
+        tuple: (change number, snapshot xmin, unix time issued, ids of the
+        transactions then running or None for older cursors), or None for
+        no cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not value:
+        return None
+    parts = value.split('.')
+    if len(parts) not in (3, 4):
+        raise ValueError(f"Malformed cursor {value!r}")
+    seq, xmin, issued = (int(part) for part in parts[:3])
+    running = tuple(int(txid) for txid in parts[3].split('-') if txid) if len(parts) == 4 else None
+    return seq, xmin, issued, running
+
+def format_cursor(seq, xmin, running):
+    return f"{seq}.{xmin}.{int(time.time())}.{'-'.join(str(txid) for txid in running)}"
+
+def late(cursor):
+    """
+    Condition for rows written by transactions running when a cursor was
+    issued, which may have committed since
+    """
+    _, xmin, _, running = cursor
+    if running is None:
+        return Q(change_txid__gte=xmin)
+    return Q(change_txid__in=running)
+
+def is_late(txid, cursor):
+    _, xmin, _, running = cursor
+    return txid >= xmin if running is None else txid in running
+
+def changed(queryset, cursor):
+    """
+    Rows of a queryset changed since a cursor, every row for None
+    """
+    if cursor is None:
+        return queryset
+    return queryset.filter(Q(change_seq__gt=cursor[0]) | late(cursor))
+
+def after(queryset, cursor):
+    """
+    Rows numbered after a cursor, what a page is taken from
+    """
+    if cursor is None:
+        return queryset
+    return queryset.filter(change_seq__gt=cursor[0])
+
+def resent(queryset, cursor):
+    """
+    Rows numbered below a cursor by transactions that may have committed
+    after it was issued
+    """
+    if cursor is None:
+        return queryset.none()
+    return queryset.filter(late(cursor), change_seq__lte=cursor[0])
+
+def sync_changes(user, cursor_value=None, limit=None):
+    """
+    Everything that changed for a mentee since a cursor. Without a cursor,
+    or with one older than deletes are kept for, the client gets a full
+    copy and is told to reset. Resources and deletes come in pages of
+    limit, plus any re-sends, with has_more set until the client has
+    caught up.
+
+    Args:
+        user (User): The mentee's user
+        cursor_value (str): Cursor returned by the previous sync
+        limit (int): Page size, SYNC_PAGE_SIZE by default
+
+    Returns:
+        dict: The sync payload
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    # DRF stays out of module level, as in the catalog
+    from .compact import serialize_resources
+    from .serializers import MenteeProfileSerializer, MentorshipSerializer
+
+    limit = limit or settings.SYNC_PAGE_SIZE
+    cursor = parse_cursor(cursor_value)
+    reset = cursor is None or cursor[2] < time.time() - settings.SYNC_TOMBSTONE_DAYS * 86400
+    if reset:
+        cursor = None
+
+    connection = read_connection()
+    with transaction.atomic(using=connection.alias):
+        # One snapshot for every query, so the running transactions match what was read
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(REPEATABLE_READ_SQL)
+            db_cursor.execute(SNAPSHOT_SQL)
+            xmin, running = db_cursor.fetchone()
+
+        mentee = get_object_or_404(Mentee, user=user)
+        mentee_tombstones = Tombstone.objects.filter(Q(kind='resource') | Q(kind='mentorship', mentee_id=mentee.pk))
+        resources = list(
+            after(Resource.objects.all(), cursor)
+            .order_by('change_seq').values_list('pk', 'change_seq')[:limit + 1]
+        )
+        tombstones = [] if cursor is None else list(
+            after(mentee_tombstones, cursor)
+            .order_by('change_seq').values_list('kind', 'object_id', 'change_seq')[:limit + 1]
+        )
+
+        # A page ends at the last change number every list got through
+        ends = [rows[limit - 1][-1] for rows in (resources, tombstones) if len(rows) > limit]
+        bound = min(ends) if ends else None
+
+        def within(seq):
+            return bound is None or seq <= bound
+
+        resource_ids = [pk for pk, seq in resources if within(seq)]
+        tombstones = [row for row in tombstones if within(row[-1])]
+        seqs = [seq for _, seq in resources if within(seq)] + [row[-1] for row in tombstones]
+        resource_ids += resent(Resource.objects.all(), cursor).values_list('pk', flat=True)
+        tombstones += resent(mentee_tombstones, cursor).values_list('kind', 'object_id', 'change_seq')
+        mentorships = [
+            mentorship for mentorship in changed(mentee.mentorships.select_related('mentor', 'mentee'), cursor)
+            if within(mentorship.change_seq)
+        ]
+        profile_changed = within(mentee.change_seq) and (
+            cursor is None or mentee.change_seq > cursor[0] or is_late(mentee.change_txid, cursor)
+        )
+
+        seqs += [mentorship.change_seq for mentorship in mentorships]
+        if profile_changed:
+            seqs.append(mentee.change_seq)
+        next_seq = bound if bound is not None else max(seqs + [cursor[0] if cursor else 0])
+
+        return {
+            'cursor': format_cursor(next_seq, xmin, running),
+            'reset': reset,
+            'has_more': bound is not None,
+            'profile': MenteeProfileSerializer(mentee).data if profile_changed else None,
+            'resources': serialize_resources(Resource.objects.filter(pk__in=resource_ids).order_by('change_seq')),
+            'mentorships': MentorshipSerializer(mentorships, many=True).data,
+            'deleted': {
+                'resources': [str(object_id) for kind, object_id, _ in tombstones if kind == 'resource'],
+                'mentorships': [str(object_id) for kind, object_id, _ in tombstones if kind == 'mentorship'],
+            },
+        }
+
+def prune_tombstones():
+    """
+    Delete tombstones no valid cursor can still need. A day is added to
+    the retention to allow for clock differences with the database.
+
+    Returns:
+        int: Number of tombstones deleted
+    """
+    cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS + 1)
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,278 @@
+"""
+Tenants: the organisations the platform runs for, each in its own
+database (or its own schema, through the connection's search_path).
+
+TenantMiddleware resolves the tenant of a request from the USSD service
+code, the 'tenant' claim of a JWT, or the host, and keeps it in a context
+variable for the rest of the request. TenantRouter sends every query to
+the current tenant's database, and reads inside replica_reads() to its
+read replica when one is configured.
+
+ReadReplicaMiddleware puts GET and HEAD requests on the replica. A
+request that writes pins itself to the primary, and pins its user or
+session for REPLICA_STICKY_SECONDS, so people always read their own
+writes despite replication lag.
+
+Context variables do not cross into new threads on their own: start
+request threads with start_thread, and record the tenant with anything
+buffered for a later write. Caches are keyed per tenant by cache_key.
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+DEFAULT_TENANT = 'default'
+REPLICA_SUFFIX = '_replica'
+TENANT_CLAIM = 'tenant'
+# Africa's Talking posts USSD sessions as a form
+FORM_CONTENT_TYPES = ('application/x-www-form-urlencoded', 'multipart/form-data')
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_KEY = 'replica_sticky'
+
+_tenant = contextvars.ContextVar('tenant', default=DEFAULT_TENANT)
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+_read_state = contextvars.ContextVar('read_state', default=None)
+
+
+class ReadState:
+    """
+    Whether the current request must read from the primary, and whether
+    it has written
+    """
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def tenant_names():
+    return [DEFAULT_TENANT, *settings.TENANTS]
+
+def get_tenant():
+    """
+    The tenant the current request or job runs for
+    """
+    return _tenant.get()
+
+@contextmanager
+def tenant_context(tenant):
+    """
+    Run a block of code for a tenant
+    """
+    if tenant not in tenant_names():
+        raise ValueError(f"Unknown tenant {tenant}")
+    token = _tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _tenant.reset(token)
+
+def each_tenant(tenants=None):
+    """
+    Iterate over tenants, running the loop body in each one's context
+    """
+    for tenant in tenants or tenant_names():
+        with tenant_context(tenant):
+            yield tenant
+
+def tenant_connection():
+    """
+    Connection to the current tenant's primary database, for raw SQL
+    """
+    return connections[get_tenant()]
+
+@contextmanager
+def replica_reads():
+    """
+    Send reads to the tenant's replica, if it has one. For list and
+    analytics endpoints that can tolerate replication lag. Usable as a
+    decorator.
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+def stream_from_replica(chunks):
+    """
+    Keep reading from the replica while a streamed response is consumed
+    """
+    with replica_reads():
+        yield from chunks
+
+def replica_alias(tenant):
+    alias = f"{tenant}{REPLICA_SUFFIX}"
+    return alias if alias in settings.DATABASES else tenant
+
+def read_connection():
+    """
+    Connection reads would be routed to right now, for raw SQL reads
+    """
+    return connections[TenantRouter().db_for_read(None)]
+
+def tenant_of(alias):
+    return alias[:-len(REPLICA_SUFFIX)] if alias.endswith(REPLICA_SUFFIX) else alias
+
+def start_thread(target, args=(), **kwargs):
+    """
+    Start a thread that runs in the caller's tenant
+    """
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(target, *args), **kwargs)
+    thread.start()
+    return thread
+
+def cache_key(key, key_prefix, version):
+    """
+    Django cache KEY_FUNCTION that keeps each tenant's keys apart
+    """
+    return f"{key_prefix}:{version}:{get_tenant()}:{key}"
+
+
+def read_token(authorization):
+    """
+    The valid bearer token of an Authorization header, or None
+    """
+    if not authorization.startswith('Bearer '):
+        return None
+    # Imported here so processes that never see a token don't load simplejwt
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.tokens import AccessToken
+    try:
+        return AccessToken(authorization[len('Bearer '):])
+    except TokenError:
+        return None
+
+def resolve_tenant(request):
+    """
+    Work out which tenant a request is for: the dialled USSD service code
+    or the SMS shortcode a callback was sent to first, then the token's
+    claim, then the host. Anything unknown falls through to the default
+    tenant.
+    """
+    if request.method == 'POST' and request.content_type in FORM_CONTENT_TYPES:
+        code = request.POST.get('serviceCode') or request.POST.get('to', '')
+        tenant = settings.TENANT_SERVICE_CODES.get(code)
+        if tenant:
+            return tenant
+    if request.token is not None and request.token.get(TENANT_CLAIM) in tenant_names():
+        return request.token[TENANT_CLAIM]
+    return settings.TENANT_HOSTS.get(request.get_host().split(':')[0], DEFAULT_TENANT)
+
+
+class TenantMiddleware:
+    """
+    Run each request, including any streamed body, in its tenant
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.token = read_token(request.META.get('HTTP_AUTHORIZATION', ''))
+        tenant = resolve_tenant(request)
+        request.tenant = tenant
+        with tenant_context(tenant):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(tenant, response.streaming_content)
+        return response
+
+    @staticmethod
+    def stream(tenant, chunks):
+        with tenant_context(tenant):
+            yield from chunks
+
+
+def sticky_identity(request, response=None):
+    """
+    Who a request's writes should stay visible to: the token's user, or
+    the session. A response setting a new session cookie (a login) makes
+    that session the one to pin. Needs TenantMiddleware to have read the
+    token.
+    """
+    if request.token is not None:
+        return f"user:{request.token.get('user_id')}"
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if response is not None and settings.SESSION_COOKIE_NAME in response.cookies:
+        session_key = response.cookies[settings.SESSION_COOKIE_NAME].value
+    if session_key:
+        return f"session:{session_key}"
+    return None
+
+def sticky_key(identity):
+    return f"{STICKY_KEY}:{identity}"
+
+
+class ReadReplicaMiddleware:
+    """
+    Serve GET and HEAD requests from the tenant's replica, except for
+    users and sessions that wrote within the last REPLICA_STICKY_SECONDS.
+    Tenants without a replica skip all of this.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if replica_alias(get_tenant()) == get_tenant():
+            return self.get_response(request)
+
+        identity = sticky_identity(request)
+        state = ReadState(pinned=identity is not None and cache.get(sticky_key(identity)) is not None)
+        state_token = _read_state.set(state)
+        replica = settings.REPLICA_SAFE_READS and request.method in SAFE_METHODS
+        replica_token = _replica_reads.set(True) if replica else None
+        try:
+            response = self.get_response(request)
+        finally:
+            if replica_token is not None:
+                _replica_reads.reset(replica_token)
+            _read_state.reset(state_token)
+        if state.wrote:
+            identity = sticky_identity(request, response)
+            if identity is not None:
+                cache.set(sticky_key(identity), True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+
+class TenantRouter:
+    """
+    Route queries to the current tenant's database. Objects stay on the
+    database they were loaded from, and replicas are never migrated.
+    Within a request, reads stop going to the replica once it writes.
+    """
+    def _instance_db(self, hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return None
+
+    def db_for_read(self, model, **hints):
+        db = self._instance_db(hints)
+        if db:
+            return db
+        tenant = get_tenant()
+        if _replica_reads.get():
+            state = _read_state.get()
+            if state is None or not state.pinned:
+                return replica_alias(tenant)
+        return tenant
+
+    def db_for_write(self, model, **hints):
+        state = _read_state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return tenant_of(self._instance_db(hints) or get_tenant())
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db and obj2._state.db:
+            return tenant_of(obj1._state.db) == tenant_of(obj2._state.db)
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return not db.endswith(REPLICA_SUFFIX)
@@ -1,3 +1,1818 @@
-from django.test import TestCase
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import json
+import subprocess
+import sys
+import warnings
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import OperationalError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.middleware.csrf import CsrfViewMiddleware
+from django.conf import settings
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import ussd
+from .search import search_resources, trigram_available
+from .callers import caller_key, unknown_caller
+from .phone import normalize_phone
+from .throttling import get_client_ip, is_rate_limited
+from .analytics import match_attempts, refresh_supply_demand
+from .campaigns import Pacer, run_campaign, run_pending_campaigns
+from .gateways import FakeGateway, get_gateway
+from .background import BackgroundTasks
+from .circuits import CircuitBreaker, CircuitOpen, breaker_states, reset_breakers
+from .faults import InjectedFault, parse_faults
+from .delivery import DeliveryReportBuffer, delivery_reports
+from .engagement import CLICK, USSD_VIEW, VIEW, EventBuffer, engagement_events
+from .lazy import LazyView, lazy_view
+from .warmup import warm_up
+from .compact import render_json, serialize_resources
+from .encoding import brotli
+from .relay import RelayOutbox, get_conversations
+from .translations import SMS_CATALOG, USSD_CATALOG
+from .tenants import TenantRouter, replica_reads, sticky_key, tenant_context
+from .catalog import get_resource_list
+from .recommendations import ResourceIndex, get_index, get_recommendations
+from .caching import LocalCache, bump_version, get_or_build, get_version, local_cache, versioned_key
+from .lifecycle import find_counter_drift, run_lifecycle
+from .waitlist import fill_mentor
+from .segments import GSM7, UCS2, build_resource_sms, build_welcome_sms, measure, to_gsm7
+from .serializers import ResourceSerializer
+from .models import (
+    User, Mentee, Mentor, Mentorship, Resource, SupplyDemand, Campaign, OutboundMessage, WaitlistEntry,
+    ResourceEngagement, ResourceEvent
+)
+
+
+def clear_caches():
+    """
+    Reset the shared cache, this process's in-memory tier and its circuit breakers
+    """
+    cache.clear()
+    local_cache.clear()
+    reset_breakers()
+
+
+def join_background_threads():
+    """
+    Wait for the fire-and-forget threads spawned by the USSD handlers
+    """
+    for thread in threading.enumerate():
+        if thread is not threading.main_thread() and thread is not threading.current_thread():
+            thread.join(timeout=5)
+
+
+def create_mentee(phone='+254711000000', interests=('Coding',), **kwargs):
+    user = User.objects.create_user(phone=phone, is_mentee=True)
+    defaults = {
+        'name': 'Wanjiru',
+        'age': 18,
+        'county': 'Nairobi',
+        'device': 'phone',
+        'interests': list(interests),
+        'communication_preference': 'app',
+    }
+    defaults.update(kwargs)
+    return Mentee.objects.create(user=user, **defaults)
+
+def create_mentor(phone='+254722000000', expertise=('Coding',), **kwargs):
+    user = User.objects.create_user(phone=phone, is_mentor=True)
+    defaults = {
+        'name': 'Otieno',
+        'expertise': list(expertise),
+        'counties': ['Nairobi'],
+    }
+    defaults.update(kwargs)
+    return Mentor.objects.create(user=user, **defaults)
+
+
+COMPLETE = ussd.USSD_CATALOG['en']['registration_complete']
+
+
+class UssdRegistrationIdempotencyTests(SimpleTestCase):
+    def setUp(self):
+        clear_caches()
+        # Known caller, so hops never need the database
+        cache.set(caller_key('+254700000001'), unknown_caller())
+        self.factory = RequestFactory()
+
+    def final_hop(self, session_id='ATUid_session1', phone_number='+254700000001'):
+        request = self.factory.post('/api/ussd/callback/', {
+            'sessionId': session_id,
+            'phoneNumber': phone_number,
+            'text': '1*Amina*19*1*1,2',
+        })
+        return ussd.ussd_callback(request)
+
+    @mock.patch('api.ussd.store_data_locally')
+    @mock.patch('api.ussd.get_http_session')
+    @mock.patch('api.ussd.send_welcome_sms')
+    def test_concurrent_duplicate_callbacks_register_once(self, send_welcome_sms, get_http_session, store_data_locally):
+        get_http_session.return_value.post.return_value.status_code = 201
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(lambda _: self.final_hop(), range(8)))
+        join_background_threads()
+
+        for response in responses:
+            self.assertEqual(response.content.decode(), COMPLETE)
+        self.assertEqual(send_welcome_sms.call_count, 1)
+        self.assertEqual(get_http_session.return_value.post.call_count, 1)
+        self.assertEqual(store_data_locally.call_count, 1)
+
+    @mock.patch('api.ussd.store_data_locally')
+    @mock.patch('api.ussd.get_http_session')
+    @mock.patch('api.ussd.send_welcome_sms')
+    def test_distinct_sessions_each_register(self, send_welcome_sms, get_http_session, store_data_locally):
+        get_http_session.return_value.post.return_value.status_code = 201
+        self.final_hop(session_id='ATUid_a')
+        self.final_hop(session_id='ATUid_b')
+        join_background_threads()
+
+        self.assertEqual(send_welcome_sms.call_count, 2)
+
+    @mock.patch('api.ussd.store_data_locally')
+    @mock.patch('api.ussd.get_http_session')
+    @mock.patch('api.ussd.send_welcome_sms', side_effect=RuntimeError('gateway down'))
+    def test_failed_registration_can_be_retried(self, send_welcome_sms, get_http_session, store_data_locally):
+        get_http_session.return_value.post.return_value.status_code = 201
+        response = self.final_hop()
+        self.assertTrue(response.content.decode().startswith('END Error'))
+
+        send_welcome_sms.side_effect = None
+        response = self.final_hop()
+        join_background_threads()
+
+        self.assertEqual(response.content.decode(), COMPLETE)
+        self.assertEqual(send_welcome_sms.call_count, 2)
+
+
+@override_settings(RATE_LIMITS={
+    'ussd_phone': '3/min',
+    'ussd_session': '100/min',
+    'ussd_ip': '100/min',
+    'auth_ip': '2/min',
+    'auth_account': '100/min',
+})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_ussd_flood_gets_end_message(self):
+        data = {'sessionId': 'ATUid_flood', 'phoneNumber': '+254700000002', 'text': ''}
+        for _ in range(3):
+            response = self.client.post(reverse('ussd-callback'), data)
+            self.assertTrue(response.content.decode().startswith('CON'))
+
+        response = self.client.post(reverse('ussd-callback'), data)
+        self.assertEqual(response.content.decode(), ussd.USSD_CATALOG['en']['rate_limited'])
+
+        # Other callers are unaffected
+        data['phoneNumber'] = '+254700000003'
+        response = self.client.post(reverse('ussd-callback'), data)
+        self.assertTrue(response.content.decode().startswith('CON'))
+
+    def test_register_is_throttled_per_ip(self):
+        for i in range(2):
+            response = self.client.post(reverse('register'), {'phone': f'+25470000001{i}', 'password': 'pass12345'}, content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+
+        response = self.client.post(reverse('register'), {'phone': '+254700000019', 'password': 'pass12345'}, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+
+    def test_forwarded_for_cannot_dodge_the_ip_limit(self):
+        for i in range(2):
+            response = self.client.post(reverse('register'), {'phone': f'+25470000002{i}', 'password': 'pass12345'},
+                                        content_type='application/json', HTTP_X_FORWARDED_FOR=f"10.0.0.{i}")
+            self.assertEqual(response.status_code, 201)
+        response = self.client.post(reverse('register'), {'phone': '+254700000029', 'password': 'pass12345'},
+                                    content_type='application/json', HTTP_X_FORWARDED_FOR='10.0.0.9')
+        self.assertEqual(response.status_code, 429)
+
+    def test_bodies_that_are_not_objects_are_bad_requests(self):
+        for body in (['+254700000030'], '"+254700000030"', 42):
+            response = self.client.post(reverse('register'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            clear_caches()
+        response = self.client.post(reverse('token_obtain_pair'), [{'phone': '+254700000030'}],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_client_ip_is_the_hop_the_proxy_appended(self):
+        request = RequestFactory().get('/', HTTP_X_FORWARDED_FOR='1.2.3.4, 41.90.0.7', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(get_client_ip(request), '41.90.0.7')
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(get_client_ip(request), '10.0.0.1')
+
+
+class UssdLanguageTests(TransactionTestCase):
+    def setUp(self):
+        clear_caches()
+        self.mentee = create_mentee(phone='+254733000000', language='en')
+
+    def hop(self, text, session_id='ATUid_lang'):
+        response = self.client.post(reverse('ussd-callback'), {
+            'sessionId': session_id,
+            'phoneNumber': '+254733000000',
+            'text': text,
+        })
+        return response.content.decode()
+
+    def test_stored_language_is_used(self):
+        self.mentee.language = 'sw'
+        self.mentee.save()
+        self.assertEqual(self.hop(''), ussd.USSD_CATALOG['sw']['welcome_back'].format(name='Wanjiru'))
+
+    def test_language_choice_applies_immediately_and_persists(self):
+        self.assertEqual(self.hop(''), ussd.USSD_CATALOG['en']['welcome_back'].format(name='Wanjiru'))
+        self.assertEqual(self.hop('2*2'), 'END Lugha imewekwa kwa Kiswahili')
+        join_background_threads()
+
+        self.assertEqual(
+            self.hop('', session_id='ATUid_next'),
+            ussd.USSD_CATALOG['sw']['welcome_back'].format(name='Wanjiru')
+        )
+        self.mentee.refresh_from_db()
+        self.assertEqual(self.mentee.language, 'sw')
+
+    @mock.patch('api.ussd.send_sms_async')
+    def test_welcome_sms_uses_language(self, send_sms_async):
+        ussd.send_welcome_sms('+254733000000', 'Amina', ['Coding'], 'sw')
+        message = send_sms_async.call_args[0][1]
+        self.assertTrue(message.startswith('Habari Amina'))
+        self.assertIn('https://bit.ly/coding-basics', message)
+
+
+class ReturningCallerTests(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def hop(self, text, phone_number):
+        response = self.client.post(reverse('ussd-callback'), {
+            'sessionId': 'ATUid_returning',
+            'phoneNumber': phone_number,
+            'text': text,
+        })
+        return response.content.decode()
+
+    def test_phone_numbers_are_normalized(self):
+        self.assertEqual(normalize_phone('0712 345 678'), '+254712345678')
+        self.assertEqual(normalize_phone('254712345678'), '+254712345678')
+        self.assertEqual(normalize_phone('00254712345678'), '+254712345678')
+        self.assertEqual(normalize_phone('+254 712-345-678'), '+254712345678')
+        self.assertIsNone(normalize_phone(''))
+
+        user = User.objects.create_user(phone='0712345678', password='pass12345')
+        self.assertEqual(user.phone, '+254712345678')
+
+    def test_returning_mentee_gets_personal_menu_from_one_lookup(self):
+        create_mentee(phone='0744000000', name='Achieng', interests=['Design'])
+
+        with self.assertNumQueries(1):
+            response = self.hop('', '+254744000000')
+        self.assertEqual(response, ussd.USSD_CATALOG['en']['welcome_back'].format(name='Achieng'))
+
+        # Later hops are served from cache
+        with self.assertNumQueries(0):
+            response = self.hop('1', '+254744000000')
+        self.assertEqual(response, 'END Achieng, you are registered with interests in Design.')
+
+    def test_new_caller_gets_registration_menu(self):
+        self.assertEqual(self.hop('', '+254755000000'), ussd.USSD_CATALOG['en']['welcome'])
+        self.assertEqual(self.hop('1', '+254755000000'), ussd.USSD_CATALOG['en']['enter_name'])
+
+    def test_register_rejects_duplicate_in_other_format(self):
+        User.objects.create_user(phone='+254766000000', password='pass12345')
+        response = self.client.post(
+            reverse('register'), {'phone': '0766000000', 'password': 'pass12345'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class MenteeDashboardTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.mentee = create_mentee(interests=['Coding', 'Design'])
+        self.client = APIClient()
+        self.client.force_authenticate(self.mentee.user)
+
+        for i in range(3):
+            mentor = create_mentor(phone=f'+25472200000{i}', name=f'Mentor {i}')
+            Mentorship.objects.create(mentee=self.mentee, mentor=mentor)
+        Mentorship.objects.create(mentee=self.mentee, mentor=mentor, status='completed')
+
+        for i in range(5):
+            Resource.objects.create(title=f'Coding {i}', description='...', tags=['Coding'])
+        Resource.objects.create(title='Animation', description='...', tags=['Animation'])
+
+    def test_dashboard_uses_constant_queries(self):
+        get_index()
+        # Mentee, prefetched active mentorships with mentors, ranked resources
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('mentee-dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Wanjiru')
+        self.assertEqual(
+            sorted(m['mentor_name'] for m in response.data['mentorships']),
+            ['Mentor 0', 'Mentor 1', 'Mentor 2']
+        )
+        self.assertEqual(len(response.data['resources']), 5)
+
+    def test_conditional_get_returns_not_modified(self):
+        response = self.client.get(reverse('mentee-dashboard'))
+        etag = response['ETag']
+
+        response = self.client.get(reverse('mentee-dashboard'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Resource.objects.create(title='Coding new', description='...', tags=['Coding'])
+        response = self.client.get(reverse('mentee-dashboard'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ResourceCatalogCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.mentee = create_mentee()
+        self.client = APIClient()
+        self.client.force_authenticate(self.mentee.user)
+        Resource.objects.create(title='Python', description='...', tags=['Coding'])
+        Resource.objects.create(title='Figma', description='...', tags=['Design'])
+
+    def test_resource_lists_are_served_from_cache(self):
+        response = self.client.get(reverse('mentee-resources'), {'interest': 'Coding'})
+        self.assertEqual([r['title'] for r in response.data], ['Python'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('mentee-resources'), {'interest': 'Coding'})
+        self.assertFalse([q for q in queries if 'api_resource' in q['sql']])
+        self.assertEqual([r['title'] for r in response.data], ['Python'])
+
+    def test_resource_changes_invalidate_cache_and_etag(self):
+        response = self.client.get(reverse('mentee-resources'), {'interest': 'Coding'})
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        response = self.client.get(reverse('mentee-resources'), {'interest': 'Coding'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Resource.objects.create(title='Django', description='...', tags=['Coding'])
+        response = self.client.get(reverse('mentee-resources'), {'interest': 'Coding'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(r['title'] for r in response.data), ['Django', 'Python'])
+
+    def test_tech_pathway_get_matches_post(self):
+        self.mentee.communication_preference = 'ussd'
+        self.mentee.save()
+
+        get_response = self.client.get(reverse('tech-pathway'), {'goal': 'Design'})
+        post_response = self.client.post(reverse('tech-pathway'), {'goal': 'Design'})
+
+        self.assertEqual(get_response.data, post_response.data)
+        self.assertEqual(get_response.data['resources'], [{'title': 'Figma', 'sms_text': '...'}])
+        self.assertIn('ETag', get_response)
+
+
+class ResourceSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(create_mentee().user)
+        self.python = Resource.objects.create(
+            title='Python for beginners',
+            description='Learn programming by building small games',
+            tags=['Coding'],
+        )
+        self.figma = Resource.objects.create(
+            title='Misingi ya ubunifu',
+            description='Jifunze kutumia Figma kubuni programu',
+            tags=['Design'],
+        )
+
+    def search(self, q, lang='en'):
+        response = self.client.get(reverse('resource-search'), {'q': q, 'lang': lang})
+        self.assertEqual(response.status_code, 200)
+        return [r['title'] for r in response.data]
+
+    def test_english_search_is_stemmed(self):
+        self.assertEqual(self.search('building games'), ['Python for beginners'])
+
+    def test_swahili_search_and_tags(self):
+        self.assertEqual(self.search('ubunifu', lang='sw'), ['Misingi ya ubunifu'])
+        self.assertEqual(self.search('coding'), ['Python for beginners'])
+
+    def test_search_vector_follows_edits(self):
+        self.python.title = 'Django for beginners'
+        self.python.save()
+        self.assertEqual(self.search('django'), ['Django for beginners'])
+        self.assertEqual(self.search('python'), [])
+
+    def test_missing_query_is_rejected(self):
+        response = self.client.get(reverse('resource-search'))
+        self.assertEqual(response.status_code, 400)
+
+    def test_misspelt_title_matches_fuzzily(self):
+        if not trigram_available():
+            self.skipTest('pg_trgm is not installed')
+        self.assertEqual([r.title for r in search_resources('pyhton')], ['Python for beginners'])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        admin_user = User.objects.create_superuser(email='admin@example.com', password='pass12345')
+        self.client.force_login(admin_user)
+
+    def add_mentorships(self, count, start=0):
+        for i in range(start, start + count):
+            mentee = create_mentee(phone=f'+25471100{i:04d}', name=f'Mentee {i}')
+            mentor = create_mentor(phone=f'+25472200{i:04d}', name=f'Mentor {i}')
+            Mentorship.objects.create(mentee=mentee, mentor=mentor)
+
+    def changelist_queries(self, name):
+        # Measure cold loads, with no cached filter choices
+        clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f'admin:api_{name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_query_count_is_bounded(self):
+        self.add_mentorships(2)
+        small = {name: self.changelist_queries(name) for name in ('mentorship', 'mentee', 'mentor')}
+
+        self.add_mentorships(20, start=2)
+        large = {name: self.changelist_queries(name) for name in ('mentorship', 'mentee', 'mentor')}
+
+        self.assertEqual(small, large)
+
+    @mock.patch('api.admin.estimated_count', return_value=250000)
+    def test_large_unfiltered_changelist_uses_estimate(self, estimated_count):
+        self.add_mentorships(2)
+
+        response = self.client.get(reverse('admin:api_mentorship_changelist'))
+        self.assertEqual(response.context['cl'].result_count, 250000)
+
+        response = self.client.get(reverse('admin:api_mentorship_changelist'), {'status__exact': 'active'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        staff = User.objects.create_user(email='analyst@example.com', password='pass12345', is_staff=True)
+        self.client.force_authenticate(staff)
+
+        nairobi = create_mentee(phone='+254711000001', name='Njeri', county='Nairobi')
+        busia = create_mentee(phone='+254711000002', name='Barasa', county='Busia')
+        mentor = create_mentor(expertise=['Coding', 'Design'])
+        Mentorship.objects.create(mentee=nairobi, mentor=mentor)
+        Mentorship.objects.create(mentee=busia, mentor=mentor, status='completed')
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_with_filters(self):
+        response = self.client.get('/api/export/mentorships.csv', {'county': 'Nairobi', 'status': 'active'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+        lines = self.read(response).decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,mentee_id,mentee__name'))
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Njeri', lines[1])
+
+    def test_gzipped_ndjson_export(self):
+        response = self.client.get('/api/export/mentors.ndjson.gz')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+
+        rows = [json.loads(line) for line in gzip.decompress(self.read(response)).splitlines()]
+        self.assertEqual(rows[0]['expertise'], ['Coding', 'Design'])
+
+    def test_invalid_filters_are_rejected(self):
+        response = self.client.get('/api/export/mentees.csv', {'status': 'active'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/export/mentorships.csv', {'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_exports_are_staff_only(self):
+        self.client.force_authenticate(create_mentee().user)
+        response = self.client.get('/api/export/mentees.csv')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(MATCH_FLUSH_INTERVAL=60)
+class SupplyDemandTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.mentee = create_mentee(phone='+254711000001', county='Kisumu', interests=['Coding', 'Design'])
+        create_mentee(phone='+254711000002', county='Kisumu', interests=['Coding'])
+        mentor = create_mentor(counties=['Kisumu', 'Busia'], expertise=['Coding'], max_mentees=3)
+        Mentorship.objects.create(mentee=self.mentee, mentor=mentor)
+        mentor.mentees_count = 1
+        mentor.save()
+
+    def tearDown(self):
+        match_attempts.flush()
+
+    def summary(self, county, interest):
+        return SupplyDemand.objects.get(county=county, interest=interest)
+
+    def test_refresh_builds_counts(self):
+        self.assertEqual(refresh_supply_demand(), 3)
+
+        coding = self.summary('Kisumu', 'Coding')
+        self.assertEqual(
+            (coding.mentee_count, coding.mentor_capacity, coding.active_mentorships),
+            (2, 2, 1)
+        )
+        self.assertEqual(self.summary('Busia', 'Coding').mentor_capacity, 2)
+        self.assertEqual(self.summary('Kisumu', 'Design').mentee_count, 1)
+
+    def test_refresh_resets_pairs_that_disappear(self):
+        refresh_supply_demand()
+        Mentee.objects.filter(interests__contains=['Design']).update(interests=['Coding'])
+        refresh_supply_demand()
+        self.assertEqual(self.summary('Kisumu', 'Design').mentee_count, 0)
+
+    def test_match_failures_are_recorded_and_kept_across_refreshes(self):
+        mentee = create_mentee(phone='+254711000003', county='Busia', interests=['Animation'])
+        client = APIClient()
+        client.force_authenticate(mentee.user)
+
+        # Counted in memory: matches don't queue on the shared summary rows
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(reverse('match-mentor'), {'mentee_id': mentee.id})
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(any('api_supplydemand' in query['sql'] for query in queries))
+        with self.assertNumQueries(1):
+            self.assertEqual(match_attempts.flush(), 1)
+        refresh_supply_demand()
+
+        animation = self.summary('Busia', 'Animation')
+        self.assertEqual((animation.match_attempts, animation.match_failures), (1, 1))
+        self.assertEqual(animation.mentee_count, 1)
+
+        staff = User.objects.create_user(email='pm@example.com', password='pass12345', is_staff=True)
+        client.force_authenticate(staff)
+        response = client.get(reverse('supply-demand'), {'county': 'Busia'})
+        row = next(r for r in response.data if r['interest'] == 'Animation')
+        self.assertEqual(row['match_failure_rate'], 1.0)
+        self.assertEqual(row['shortfall'], 1)
+
+    def test_failed_counter_writes_do_not_fail_matches(self):
+        mentee = Mentee.objects.get(user__phone='+254711000002')
+        client = APIClient()
+        client.force_authenticate(mentee.user)
+        with mock.patch('api.analytics.write_match_attempts', side_effect=OperationalError('server closed the connection')):
+            response = client.post(reverse('match-mentor'), {'mentee_id': mentee.id})
+            self.assertEqual(response.status_code, 201)
+            with self.assertLogs('api.analytics', 'ERROR'):
+                self.assertEqual(match_attempts.flush(), 0)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+class FailingGateway(FakeGateway):
+    def __init__(self, fail_on_batch):
+        super().__init__()
+        self.batches = 0
+        self.fail_on_batch = fail_on_batch
+
+    def send(self, message, recipients):
+        self.batches += 1
+        if self.batches == self.fail_on_batch:
+            raise ConnectionError('gateway unreachable')
+        return super().send(message, recipients)
+
+
+@override_settings(SMS_BATCH_SIZE=2, SMS_MESSAGES_PER_SECOND=1000)
+class CampaignTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.phones = [f'+25471200000{i}' for i in range(5)]
+        for phone in self.phones:
+            create_mentee(phone=phone, interests=['Coding'])
+        create_mentee(phone='+254712000009', interests=['Design'])
+        create_mentee(phone='+254712000010', interests=['Coding'], language='sw')
+
+        self.mentor = create_mentor()
+        self.client = APIClient()
+        self.client.force_authenticate(self.mentor.user)
+
+    def upload(self):
+        response = self.client.post('/api/mentor/upload-resource/', {
+            'title': 'Intro to Python',
+            'description': 'Variables, loops and functions',
+            'tags': ['Coding'],
+            'link': 'https://example.com/python',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Campaign.objects.get(language='en')
+
+    def test_upload_campaign_reaches_interested_mentees_once(self):
+        campaign = self.upload()
+        gateway = FakeGateway()
+
+        self.assertTrue(run_campaign(campaign, gateway=gateway))
+        self.assertEqual(sorted(phone for phone, _ in gateway.outbox), self.phones)
+        self.assertEqual(gateway.outbox[0][1], 'New Coding resource: Intro to Python. https://example.com/python')
+        self.assertEqual((campaign.status, campaign.sent_count), ('completed', 5))
+
+        # Running again sends nothing more
+        run_campaign(campaign, gateway=gateway)
+        self.assertEqual(len(gateway.outbox), 5)
+
+    def test_failed_batch_resumes_without_resending(self):
+        campaign = self.upload()
+        gateway = FailingGateway(fail_on_batch=2)
+
+        self.assertFalse(run_campaign(campaign, gateway=gateway))
+        self.assertEqual(campaign.status, 'failed')
+        self.assertEqual(len(gateway.outbox), 2)
+
+        run_campaign(campaign, gateway=gateway)
+        self.assertEqual(sorted(phone for phone, _ in gateway.outbox), self.phones)
+        self.assertEqual((campaign.status, campaign.sent_count), ('completed', 5))
+
+    def test_sends_are_throttled(self):
+        campaign = self.upload()
+        clock = FakeClock()
+        run_campaign(campaign, gateway=FakeGateway(), pacer=Pacer(2, sleep=clock.sleep, clock=clock))
+
+        # Batches of 2, 2 and 1 at 2 messages/sec: the last batch goes out after 2 seconds
+        self.assertEqual(clock.slept, 2.0)
+
+    @override_settings(SMS_GATEWAY='api.gateways.FakeGateway')
+    def test_pending_campaigns_use_configured_gateway(self):
+        self.upload()
+        from .gateways import get_gateway
+        gateway = get_gateway()
+        gateway.clear()
+
+        self.assertEqual(run_pending_campaigns(), [True, True])
+        self.assertEqual(len(gateway.outbox), 6)
+        self.assertIn(('+254712000010', 'Rasilimali mpya ya Coding: Intro to Python. https://example.com/python'), gateway.outbox)
+
+    def test_mentee_matching_several_tags_is_told_once(self):
+        create_mentee(phone='+254712000011', interests=['Coding', 'Design'])
+        response = self.client.post('/api/mentor/upload-resource/', {
+            'title': 'Design for developers',
+            'description': 'Layout and colour for people who code',
+            'tags': ['Coding', 'Design'],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Campaign.objects.count(), 2)
+
+        gateway = FakeGateway()
+        run_pending_campaigns(gateway=gateway)
+        phones = [phone for phone, _ in gateway.outbox]
+        self.assertEqual(phones.count('+254712000011'), 1)
+        self.assertEqual(sorted(phones), sorted(self.phones + ['+254712000009', '+254712000010', '+254712000011']))
+
+
+@override_settings(SMS_BATCH_SIZE=100, SMS_MESSAGES_PER_SECOND=1000, DLR_FLUSH_INTERVAL=60, SMS_CALLBACK_TOKEN='gateway-token')
+class DeliveryReportTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        for i in range(4):
+            create_mentee(phone=f'+25471300000{i}', interests=['Design'])
+        self.campaign = Campaign.objects.create(name='Figma', message='Try Figma', interests=['Design'])
+        run_campaign(self.campaign, gateway=FakeGateway())
+        self.message_ids = list(OutboundMessage.objects.order_by('phone').values_list('message_id', flat=True))
+
+    def tearDown(self):
+        delivery_reports.flush()
+
+    def test_campaign_sends_are_recorded(self):
+        self.assertEqual(len(self.message_ids), 4)
+        self.assertEqual(
+            set(OutboundMessage.objects.values_list('status', 'template', 'campaign')),
+            {('Submitted', 'campaign', self.campaign.pk)}
+        )
+
+    def test_reports_are_written_in_one_batch(self):
+        buffer = DeliveryReportBuffer(max_size=4)
+        buffer.add(self.message_ids[0], 'Buffered')
+        buffer.add(self.message_ids[0], 'Success')  # coalesced with the earlier report
+        buffer.add(self.message_ids[1], 'Success')
+        buffer.add(self.message_ids[2], 'Failed', 'UserInBlacklist')
+
+        # A full buffer is written from another thread, not the callback's
+        flushed = threading.Event()
+        with mock.patch.object(buffer, '_flush_in_background', side_effect=flushed.set):
+            with self.assertNumQueries(0):
+                buffer.add(self.message_ids[3], 'Success')
+            self.assertTrue(flushed.wait(5))
+        with self.assertNumQueries(1):
+            buffer.flush()
+
+        statuses = dict(OutboundMessage.objects.values_list('message_id', 'status'))
+        self.assertEqual(
+            [statuses[message_id] for message_id in self.message_ids],
+            ['Success', 'Success', 'Failed', 'Success']
+        )
+        self.assertEqual(OutboundMessage.objects.get(message_id=self.message_ids[2]).failure_reason, 'UserInBlacklist')
+
+    def test_callback_buffers_and_stats_report_rates(self):
+        for message_id in self.message_ids[:3]:
+            with self.assertNumQueries(0):
+                response = self.client.post(reverse('sms-delivery-report') + '?token=gateway-token', {
+                    'id': message_id,
+                    'status': 'Success',
+                    'phoneNumber': '+254713000000',
+                })
+            self.assertEqual(response.status_code, 200)
+        delivery_reports.flush()
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='ops@example.com', is_staff=True))
+        response = client.get(reverse('delivery-stats'))
+        self.assertEqual(response.data, [{
+            'template': 'campaign',
+            'campaign': self.campaign.pk,
+            'campaign_name': 'Figma',
+            'total': 4,
+            'delivered': 3,
+            'failed': 0,
+            'pending': 1,
+            'delivery_rate': 0.75,
+            'segments': 4,
+            'segments_per_message': 1.0,
+        }])
+
+    def test_forged_and_malformed_reports_are_dropped(self):
+        url = reverse('sms-delivery-report')
+        response = self.client.post(url, {'id': self.message_ids[0], 'status': 'Failed'})
+        self.assertEqual(response.status_code, 403)
+
+        # One oversized value must not fail the batch it is written with
+        self.client.post(url + '?token=gateway-token', {'id': self.message_ids[1], 'status': 'x' * 40})
+        self.client.post(url + '?token=gateway-token', {
+            'id': self.message_ids[2], 'status': 'Failed', 'failureReason': 'y' * 500,
+        })
+        self.client.post(url + '?token=gateway-token', {'id': self.message_ids[3], 'status': 'Success'})
+        self.assertEqual(delivery_reports.flush(), 2)
+
+        messages = {m.message_id: m for m in OutboundMessage.objects.all()}
+        self.assertEqual([messages[message_id].status for message_id in self.message_ids],
+                         ['Submitted', 'Submitted', 'Failed', 'Success'])
+        self.assertEqual(messages[self.message_ids[2]].failure_reason, 'y' * 100)
+
+
+# Names as they arrive from USSD and the web form, including the curly
+# apostrophes and accents phones like to insert
+NAME_CORPUS = [
+    'Wanjiru Kamau', 'Achieng Otieno', 'Kipchoge Keino', 'Mwanaisha Hamisi',
+    'Njeri Ng’ang’a', 'Ole Sankale', 'Zawadi Mwakilema', 'Fatuma Abdallah',
+    'Barasa Wafula', 'Chebet Jepkosgei', 'Émile Mbeki', 'José Ouma', 'Amina Saïd',
+    'Grace O’Brien', 'Hassan bin Salim', 'Nyokabi “Nyokie” Mwangi',
+    'Mary-Anne Atieno Onyango Odhiambo', 'Juma',
+]
+
+
+class SmsSegmentTests(SimpleTestCase):
+    def test_encoding_and_segment_boundaries(self):
+        self.assertEqual(measure('a' * 160), (GSM7, 160, 1))
+        self.assertEqual(measure('a' * 161), (GSM7, 161, 2))
+        self.assertEqual(measure('a' * 306), (GSM7, 306, 2))
+        self.assertEqual(measure('€' * 80), (GSM7, 160, 1))  # extension characters cost two septets
+        self.assertEqual(measure('ā' * 70), (UCS2, 70, 1))
+        self.assertEqual(measure('ā' * 71), (UCS2, 71, 2))
+
+    def test_lookalikes_stay_in_gsm7(self):
+        self.assertEqual(to_gsm7('Njeri Ng’ang’a – Émile Ōmondi'), "Njeri Ng'ang'a - Émile Omondi")
+        self.assertEqual(measure(to_gsm7('Rasilimali 💡')).encoding, UCS2)
+
+    def test_welcome_sms_fits_budget_for_corpus(self):
+        links = [(interest, f"https://bit.ly/{interest.lower()}-basics") for interest in ('Coding', 'Graphics', 'Design')]
+        interests = ['Coding', 'Graphics', 'Animation', 'Design']
+        for language in ('en', 'sw'):
+            for name in NAME_CORPUS:
+                message, info = build_welcome_sms(name, interests, links, language, max_segments=2)
+                self.assertEqual(info, measure(message))
+                self.assertEqual(info.encoding, GSM7, message)
+                self.assertLessEqual(info.segments, 2, message)
+                self.assertIn('https://bit.ly/coding-basics', message)
+
+    def test_welcome_sms_drops_links_before_intro(self):
+        links = [(interest, f"https://bit.ly/{interest.lower()}-basics") for interest in ('Coding', 'Design')]
+        message, info = build_welcome_sms('Juma', ['Coding', 'Design'], links, 'en', max_segments=1)
+        self.assertEqual(info.segments, 1)
+        self.assertTrue(message.startswith('Hello Juma'))
+        self.assertTrue(message.endswith('Glad to have you on board!'))
+        self.assertNotIn('design-basics', message)
+
+    def test_welcome_sms_shortens_name_when_nothing_else_fits(self):
+        message, info = build_welcome_sms('Wanjiru ' * 30, ['Coding'], [], 'sw', max_segments=1)
+        self.assertEqual(info.segments, 1)
+        self.assertTrue(message.startswith('Habari Wanjiru'))
+        self.assertTrue(message.endswith('Tunafurahi kuwa nawe!'))
+
+    def test_resource_sms_shortens_title_before_link(self):
+        message, info = build_resource_sms('Coding', 'Python ' * 40, 'https://example.com/python', 'en', max_segments=1)
+        self.assertEqual(info.segments, 1)
+        self.assertTrue(message.startswith('New Coding resource: Python'))
+        self.assertTrue(message.endswith('... https://example.com/python'))
+
+
+@override_settings(MENTORSHIP_DURATION_DAYS=30)
+class MentorshipLifecycleTests(TestCase):
+    def setUp(self):
+        self.mentor = create_mentor(max_mentees=2, mentees_count=2)
+        self.other = create_mentor(phone='+254722000001', mentees_count=3)  # drifted, has no mentorships
+        self.stale = Mentorship.objects.create(mentee=create_mentee(), mentor=self.mentor)
+        self.fresh = Mentorship.objects.create(mentee=create_mentee(phone='+254711000001'), mentor=self.mentor)
+        Mentorship.objects.filter(pk=self.stale.pk).update(created_at=timezone.now() - timedelta(days=31))
+
+    def test_drift_is_reported(self):
+        self.assertEqual(
+            [(row['id'], row['mentees_count'], row['active']) for row in find_counter_drift()],
+            [(self.other.pk, 3, 0)]
+        )
+
+    def test_stale_mentorships_release_capacity_in_bulk(self):
+        # savepoint, complete, recount, release savepoint
+        with self.assertNumQueries(5):  # + the empty waitlist check
+            self.assertEqual(run_lifecycle(), (1, 2, 0))
+
+        self.assertEqual(
+            dict(Mentorship.objects.values_list('pk', 'status')),
+            {self.stale.pk: 'completed', self.fresh.pk: 'active'}
+        )
+        self.mentor.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.mentor.mentees_count, self.other.mentees_count), (1, 0))
+        self.assertEqual(find_counter_drift(), [])
+        self.assertEqual(run_lifecycle(), (0, 0, 0))
+
+    def test_completed_mentorships_stop_relaying(self):
+        clear_caches()
+        self.assertEqual(len(get_conversations('+254711000000')[1]), 1)
+        self.assertEqual(len(get_conversations('+254722000000')[1]), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            run_lifecycle()
+
+        self.assertEqual(get_conversations('+254711000000')[1], ())
+        self.assertEqual(len(get_conversations('+254722000000')[1]), 1)
+
+
+@mock.patch('api.waitlist.send_sms_async')
+class WaitlistTests(TestCase):
+    def setUp(self):
+        self.mentees = [
+            create_mentee(phone=f'+25471400000{i}', name=name, interests=['Design'], county='Kisumu')
+            for i, name in enumerate(['Akinyi', 'Baraka', 'Chebet'])
+        ]
+        self.client = APIClient()
+
+    def tearDown(self):
+        match_attempts.flush()
+
+    def request_match(self, mentee):
+        self.client.force_authenticate(mentee.user)
+        return self.client.post(reverse('match-mentor'), {'mentee_id': mentee.id})
+
+    def test_unmatched_mentees_queue_and_polling_skips_the_search(self, send_sms_async):
+        for position, mentee in enumerate(self.mentees, start=1):
+            response = self.request_match(mentee)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data['position'], position)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request_match(self.mentees[0])
+        self.assertEqual(response.data['position'], 1)
+        self.assertFalse(any('api_mentor"' in query['sql'] for query in queries))
+        self.assertEqual(WaitlistEntry.objects.count(), 3)
+
+    def test_new_mentor_fills_slots_oldest_first(self, send_sms_async):
+        for mentee in self.mentees:
+            self.request_match(mentee)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mentor = create_mentor(name='Otieno', expertise=['Design'], counties=['Kisumu'], max_mentees=2)
+
+        self.assertEqual(
+            set(Mentorship.objects.values_list('mentee__name', 'mentor_id')),
+            {('Akinyi', mentor.pk), ('Baraka', mentor.pk)}
+        )
+        self.assertEqual(list(WaitlistEntry.objects.values_list('mentee__name', flat=True)), ['Chebet'])
+        mentor.refresh_from_db()
+        self.assertEqual(mentor.mentees_count, 2)
+        self.assertEqual(
+            send_sms_async.call_args_list[0][0],
+            ('+254714000000', 'Good news Akinyi! Otieno is now your mentor and will contact you soon.', 'waitlist_match')
+        )
+
+        # Completing a mentorship hands the slot to the next in line
+        with self.captureOnCommitCallbacks(execute=True):
+            mentorship = Mentorship.objects.get(mentee__name='Akinyi')
+            mentorship.status = 'completed'
+            mentorship.save()
+
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertTrue(Mentorship.objects.filter(mentee__name='Chebet', mentor=mentor, status='active').exists())
+        mentor.refresh_from_db()
+        self.assertEqual(mentor.mentees_count, 2)
+
+    def test_raised_capacity_drains_waitlist(self, send_sms_async):
+        mentor = create_mentor(expertise=['Design'], counties=['Kisumu'], max_mentees=0, visibility='anonymous')
+        self.request_match(self.mentees[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mentor.max_mentees = 1
+            mentor.save()
+
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertIn('You now have a mentor', send_sms_async.call_args[0][1])
+
+    def test_mentors_filled_after_the_search_are_skipped(self, send_sms_async):
+        first = create_mentor(expertise=['Design'], counties=['Kisumu'], max_mentees=1)
+        second = create_mentor(phone='+254722000001', expertise=['Design'], counties=['Kisumu'], max_mentees=1)
+        taken = []
+
+        def drain_between(mentors):
+            # A waitlist drain takes these slots after the search, before the match
+            Mentor.objects.filter(pk__in=taken).update(mentees_count=1)
+            mentors.sort(key=lambda mentor: mentor.pk != first.pk)
+
+        with mock.patch('api.views.random.shuffle', side_effect=drain_between):
+            taken.append(first.pk)
+            response = self.request_match(self.mentees[0])
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data['mentor'], second.pk)
+
+            Mentor.objects.filter(pk=second.pk).update(mentees_count=0)
+            taken.append(second.pk)
+            response = self.request_match(self.mentees[1])
+            self.assertEqual(response.status_code, 202)
+
+        self.assertEqual(list(Mentor.objects.order_by('pk').values_list('mentees_count', flat=True)), [1, 1])
+        self.assertEqual(Mentorship.objects.count(), 1)
+
+    def test_matched_mentees_can_text_their_mentor(self, send_sms_async):
+        clear_caches()
+        mentor = create_mentor(expertise=['Design'], counties=['Kisumu'], max_mentees=0)
+        self.request_match(self.mentees[0])
+        self.assertEqual(get_conversations('+254714000000')[1], ())
+        self.assertEqual(get_conversations('+254722000000')[1], ())
+
+        Mentor.objects.filter(pk=mentor.pk).update(max_mentees=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            fill_mentor(mentor.pk)
+
+        self.assertEqual(len(get_conversations('+254714000000')[1]), 1)
+        self.assertEqual(len(get_conversations('+254722000000')[1]), 1)
+
+
+class FakeMonotonic:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_local_cache_expires_and_evicts_least_recently_used(self):
+        clock = FakeMonotonic()
+        l1 = LocalCache(max_entries=2, clock=clock)
+        l1.set('a', 1, 10)
+        l1.set('b', 2, 10)
+        l1.get('a')
+        l1.set('c', 3, 10)  # evicts b, the least recently used
+        self.assertEqual((l1.get('a'), l1.get('b'), l1.get('c')), (1, None, 3))
+
+        clock.now = 10
+        self.assertIsNone(l1.get('a'))
+        self.assertEqual(len(l1), 1)
+
+    def test_concurrent_misses_build_once(self):
+        calls = []
+        started = threading.Event()
+
+        def build():
+            calls.append(1)
+            started.wait(1)
+            return ['menu']
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(get_or_build, 'test', 'hot', build, 60) for _ in range(8)]
+            started.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, [['menu']] * 8)
+        self.assertEqual(len(calls), 1)
+
+    def test_keys_from_long_input_stay_valid_for_memcached(self):
+        tag = 'Web Design ' * 30
+        with warnings.catch_warnings():
+            # What memcached raises InvalidCacheKey for, other backends warn about
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.assertEqual(get_resource_list(tag)[0], [])
+            self.assertEqual(get_recommendations([tag, 'Coding'])[0], [])
+            self.assertFalse(is_rate_limited('auth_account', f"{tag}@example.com"))
+
+    def test_stale_value_is_served_while_one_caller_refreshes(self):
+        get_or_build('test', 'hot', lambda: 'old', 60)
+        with mock.patch('api.caching.time.time', return_value=time.time() + 61):
+            local_cache.clear()
+            # Another worker holds the refresh lock, so the old value is served
+            cache.add(f"cache_refresh:{versioned_key('test', get_version('test'), 'hot')}", True, 30)
+            self.assertEqual(get_or_build('test', 'hot', lambda: 'new', 60), 'old')
+            cache.delete(f"cache_refresh:{versioned_key('test', get_version('test'), 'hot')}")
+            self.assertEqual(get_or_build('test', 'hot', lambda: 'new', 60), 'new')
+
+    def test_version_bump_reaches_other_workers(self):
+        self.assertEqual(get_or_build('test', 'key', lambda: 1, 60), 1)
+        # Another node bumps the version in the shared cache
+        other_node_version = time.time() + 1
+        cache.set('cache_version:test', other_node_version, None)
+        self.assertEqual(get_or_build('test', 'key', lambda: 2, 60), 1)  # until our copy of the version expires
+
+        local_cache.delete('cache_version:test')
+        self.assertEqual(get_or_build('test', 'key', lambda: 2, 60), 2)
+        bump_version('test')
+        self.assertEqual(get_or_build('test', 'key', lambda: 3, 60), 3)
+
+    def test_ussd_resource_menu_is_cached_and_invalidated(self):
+        self.assertEqual(ussd.get_resources_for_category('Coding'), ussd.RESOURCES['Coding'])
+        with self.assertNumQueries(0):
+            ussd.get_resources_for_category('Coding')
+
+        Resource.objects.create(title='Intro to Django', description='Web apps', tags=['Coding'])
+        self.assertEqual(ussd.get_resources_for_category('Coding'), ['Intro to Django'])
+
+
+class StartupTests(TestCase):
+    # Warm-up connects to and fills caches for every tenant
+    databases = '__all__'
+
+    def test_loading_urls_does_not_import_views(self):
+        code = (
+            "import os, sys; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ATSms.settings'); "
+            "import django; django.setup(); "
+            "from django.urls import resolve; resolve('/api/ussd/callback/').func.resolve(); "
+            "print(sorted(m for m in ('api.views', 'africastalking', 'requests', 'dotenv') if m in sys.modules))"
+        )
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=settings.BASE_DIR)
+        self.assertEqual(result.stdout.strip(), '[]', result.stderr)
+
+    def test_lazy_views_keep_routing_and_csrf_exemption(self):
+        callback = resolve('/api/match-mentor/').func
+        self.assertIsInstance(callback, LazyView)
+        self.assertTrue(callback.csrf_exempt)
+        self.assertEqual(callback.resolve().cls.__name__, 'MatchMentorView')
+
+        with self.settings(SMS_CALLBACK_TOKEN='gateway-token'):
+            response = Client(enforce_csrf_checks=True).post(reverse('sms-delivery-report') + '?token=gateway-token',
+                                                             {'id': 'ATXid_x', 'status': 'Success'})
+        self.assertEqual(response.status_code, 200)
+        delivery_reports.flush()
+
+        # Exemption is opt-in, so a lazily routed form view keeps its CSRF check
+        middleware = CsrfViewMiddleware(lambda request: None)
+        rejected = middleware.process_view(RequestFactory().post('/form/'), lazy_view('api.views.delivery_report_callback'), (), {})
+        self.assertEqual(getattr(rejected, 'status_code', None), 403)
+
+    def test_warm_up_fills_resource_menus(self):
+        clear_caches()
+        timings = warm_up()
+        self.assertTrue(all(seconds is not None for seconds in timings.values()), timings)
+        with self.assertNumQueries(0):
+            for category in ussd.INTERESTS_MAP.values():
+                ussd.get_resources_for_category(category)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.mentee = create_mentee(interests=['Coding', 'Design'], language='sw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.mentee.user)
+
+    def test_index_ranks_by_overlap_language_and_popularity(self):
+        index = ResourceIndex()
+        index.add('both', ['Coding', 'Design'])
+        index.add('en', ['Coding'], 'en')
+        index.add('sw', ['coding'], 'sw')
+        index.add('popular', ['Design'], popularity=50)
+        index.add('plain', ['Design'], created_at=1.0)
+        index.add('viral', ['Animation'], popularity=1000)
+
+        self.assertEqual(index.top(['Coding', 'Design'], 'sw'), ['both', 'sw', 'popular', 'plain', 'en'])
+        self.assertEqual(index.top(['Design', 'Coding'], 'sw', limit=2), ['both', 'sw'])
+
+        index.remove('both')
+        self.assertEqual(index.top(['Coding'], 'en', limit=1), ['en'])
+        self.assertNotIn('both', index.postings['design'])
+
+    def test_mentee_resources_rank_by_stored_interests(self):
+        mentor = create_mentor()
+        english = Resource.objects.create(title='Python', description='...', tags=['Coding'], language='en')
+        Resource.objects.create(title='Python kwa Kiswahili', description='...', tags=['Coding'], language='sw')
+        Resource.objects.create(title='Figma', description='...', tags=['Design'])
+        Resource.objects.create(title='Blender', description='...', tags=['Animation'])
+        ResourceEngagement.objects.create(resource=english, views=2, clicks=1)
+        Resource.objects.create(title='UI na UX', description='...', tags=['Coding', 'Design'], created_by=mentor)
+
+        response = self.client.get(reverse('mentee-resources'))
+        self.assertEqual(
+            [r['title'] for r in response.data],
+            ['UI na UX', 'Python kwa Kiswahili', 'Figma', 'Python']
+        )
+        self.assertIn('ETag', response)
+
+        # An explicit filter still returns the plain catalog list
+        response = self.client.get(reverse('mentee-resources'), {'interest': 'Animation'})
+        self.assertEqual([r['title'] for r in response.data], ['Blender'])
+
+    def test_created_resources_are_indexed_in_place(self):
+        Resource.objects.create(title='Python', description='...', tags=['Coding'])
+        get_recommendations(['Coding'])
+
+        mentor = create_mentor()
+        client = APIClient()
+        client.force_authenticate(mentor.user)
+        response = client.post(reverse('mentor-resource-list'), {
+            'title': 'Django', 'description': '...', 'tags': ['Coding'], 'language': 'sw'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        with self.assertNumQueries(0):
+            index = get_index()
+        self.assertEqual(index.top(['Coding'], 'sw', limit=1), [response.data['id']])
+
+        data, _, _ = get_recommendations(['Coding'], 'sw')
+        self.assertEqual([r['title'] for r in data], ['Django', 'Python'])
+
+        Resource.objects.filter(pk=response.data['id']).get().delete()
+        self.assertEqual(len(get_index()), 1)
+
+    def test_recommendations_are_cached_per_interest_set(self):
+        Resource.objects.create(title='Python', description='...', tags=['Coding'])
+        first = get_recommendations(['Coding', 'Design'], 'sw', 'ussd', limit=5)
+        with self.assertNumQueries(0):
+            second = get_recommendations(['design', 'Coding'], 'sw', 'ussd', limit=5)
+        self.assertEqual(first, second)
+        self.assertEqual(first[0], [{'title': 'Python', 'sms_text': '...'}])
+
+    def test_rejects_unknown_language(self):
+        mentor = create_mentor()
+        client = APIClient()
+        client.force_authenticate(mentor.user)
+        response = client.post(reverse('mentor-resource-list'), {
+            'title': 'Django', 'description': '...', 'tags': ['Coding'], 'language': 'fr'
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class EngagementEventTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        engagement_events.flush()
+        self.mentee = create_mentee(phone='+254744000000', interests=['Design'])
+        self.resource = Resource.objects.create(title='Figma', description='...', tags=['Design'])
+
+    def test_batches_are_written_with_rollups(self):
+        buffer = EventBuffer(max_size=100, max_age=60)
+        gone = Resource.objects.create(title='Gone', description='...', tags=['Design'])
+        for kind in (VIEW, VIEW, CLICK):
+            buffer.add(str(self.resource.pk), kind, self.mentee.pk)
+        buffer.add(str(gone.pk), VIEW)
+        buffer.add(str(self.resource.pk), USSD_VIEW, 999999)
+        gone.delete()
+
+        # Existence checks, then COPY and the rollup upsert in a transaction
+        with self.assertNumQueries(6):
+            self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(len(buffer), 0)
+
+        buffer.add(str(self.resource.pk), CLICK)
+        buffer.flush()
+        engagement = ResourceEngagement.objects.get(resource=self.resource)
+        self.assertEqual((engagement.views, engagement.clicks, engagement.ussd_views), (2, 2, 1))
+        self.assertEqual(ResourceEvent.objects.filter(mentee=self.mentee).count(), 3)
+        self.assertEqual(ResourceEvent.objects.filter(mentee=None).count(), 2)
+
+    def test_ring_drops_oldest_when_full(self):
+        buffer = EventBuffer(max_size=100, max_age=60, limit=3)
+        for _ in range(5):
+            buffer.add(str(self.resource.pk), VIEW)
+        self.assertEqual((len(buffer), buffer.dropped), (3, 2))
+        self.assertEqual(buffer.flush(), 3)
+
+    def test_ussd_resource_menu_records_views(self):
+        self.client.post(reverse('ussd-callback'), {
+            'sessionId': 'ATUid_events', 'phoneNumber': '+254744000000', 'text': '4*4',
+        })
+        self.assertEqual(len(engagement_events), 1)
+        engagement_events.flush()
+        event = ResourceEvent.objects.get()
+        self.assertEqual((event.resource, event.mentee, event.kind), (self.resource, self.mentee, USSD_VIEW))
+
+    def test_app_events_are_accepted_and_feed_popularity(self):
+        client = APIClient()
+        client.force_authenticate(self.mentee.user)
+        response = client.post(reverse('resource-events'), [
+            {'resource': str(self.resource.pk), 'kind': 'view'},
+            {'resource': str(self.resource.pk), 'kind': 'click'},
+        ], format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, {'accepted': 2})
+
+        response = client.post(reverse('resource-events'), {'resource': 'nope', 'kind': 'view'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        engagement_events.flush()
+        self.assertEqual(get_index().popularity(str(self.resource.pk)), 2)
+
+    @override_settings(RATE_LIMITS={'resource_events': '2/min'})
+    def test_one_account_cannot_inflate_popularity(self):
+        client = APIClient()
+        client.force_authenticate(self.mentee.user)
+        clicks = [{'resource': str(self.resource.pk), 'kind': 'click'}] * 100
+        response = client.post(reverse('resource-events'), clicks, format='json')
+        self.assertEqual(response.data, {'accepted': 1})
+        response = client.post(reverse('resource-events'), clicks, format='json')
+        self.assertEqual(response.data, {'accepted': 0})
+        response = client.post(reverse('resource-events'), clicks, format='json')
+        self.assertEqual(response.status_code, 429)
+
+        engagement_events.flush()
+        self.assertEqual(ResourceEngagement.objects.get(resource=self.resource).clicks, 1)
+
+
+@override_settings(
+    ALLOWED_HOSTS=['testserver', 'ngo-a.example.org', 'ngo-b.example.org'],
+    TENANT_HOSTS={'ngo-a.example.org': 'ngo_a', 'ngo-b.example.org': 'ngo_b'},
+    TENANT_SERVICE_CODES={'*384*100#': 'ngo_a'},
+    # Replicas can't see a TestCase's uncommitted rows; see TenantReplicaTests
+    REPLICA_SAFE_READS=False,
+)
+class TenantTests(TestCase):
+    # The test runner configures tenants ngo_a and ngo_b, each with a replica
+    databases = '__all__'
+
+    def setUp(self):
+        clear_caches()
+
+    def test_rows_stay_in_their_tenant_database(self):
+        with tenant_context('ngo_a'):
+            create_mentee(phone='+254755000000')
+            self.assertEqual(Mentee.objects.count(), 1)
+        self.assertEqual(Mentee.objects.count(), 0)
+        self.assertEqual(Mentee.objects.using('ngo_b').count(), 0)
+        self.assertEqual(Mentee.objects.using('ngo_a').get().user.phone, '+254755000000')
+
+    def test_ussd_service_code_selects_tenant(self):
+        with tenant_context('ngo_a'):
+            create_mentee(phone='+254755000000', name='Akinyi')
+
+        def hop(**extra):
+            return self.client.post(reverse('ussd-callback'), {
+                'sessionId': 'ATUid_tenant', 'phoneNumber': '+254755000000', 'text': '', **extra,
+            }).content.decode()
+
+        self.assertEqual(hop(serviceCode='*384*100#'), ussd.USSD_CATALOG['en']['welcome_back'].format(name='Akinyi'))
+        # Same number on the default tenant's code is a new caller there, cached separately
+        self.assertEqual(hop(serviceCode='*384*999#'), ussd.USSD_CATALOG['en']['welcome'])
+
+    def test_token_claim_routes_api_calls(self):
+        with tenant_context('ngo_b'):
+            user = User.objects.create_user(email='amina@example.org', password='secret-pass', is_mentee=True)
+            Mentee.objects.create(user=user, name='Amina', age=20, county='Kisumu', device='phone')
+
+        client = APIClient()
+        response = client.post(reverse('token_obtain_pair'), {
+            'email': 'amina@example.org', 'password': 'secret-pass',
+        }, HTTP_HOST='ngo-b.example.org')
+        self.assertEqual(response.status_code, 200)
+
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        response = client.get(reverse('mentee-dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Amina')
+
+    def test_buffered_events_are_written_to_their_tenant(self):
+        with tenant_context('ngo_a'):
+            resource = Resource.objects.create(title='Python', description='...', tags=['Coding'])
+            buffer = EventBuffer(max_size=100, max_age=60)
+            buffer.add(str(resource.pk), VIEW)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(ResourceEvent.objects.using('ngo_a').count(), 1)
+        self.assertEqual(ResourceEvent.objects.count(), 0)
+
+
+
+@override_settings(ALLOWED_HOSTS=['ngo-a.example.org'], TENANT_HOSTS={'ngo-a.example.org': 'ngo_a'})
+class TenantReplicaTests(TransactionTestCase):
+    # Test replicas mirror their primary over a second connection, so rows
+    # must be committed to be seen there
+    databases = '__all__'
+
+    def setUp(self):
+        clear_caches()
+
+    def test_list_reads_go_to_the_replica(self):
+        router = TenantRouter()
+        with tenant_context('ngo_a'):
+            self.assertEqual(router.db_for_read(Resource), 'ngo_a')
+            with replica_reads():
+                self.assertEqual(router.db_for_read(Resource), 'ngo_a_replica')
+                self.assertEqual(router.db_for_write(Resource), 'ngo_a')
+            mentee = create_mentee(phone='+254755000000')
+            Resource.objects.create(title='Python', description='...', tags=['Coding'])
+
+        client = APIClient()
+        client.force_authenticate(mentee.user)
+        with CaptureQueriesContext(connections['ngo_a_replica']) as queries:
+            response = client.get(reverse('mentee-resources'), {'interest': 'Coding'}, HTTP_HOST='ngo-a.example.org')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['title'] for r in response.data], ['Python'])
+        self.assertTrue(any('api_resource' in q['sql'] for q in queries.captured_queries))
+
+    def test_writers_read_their_writes_from_the_primary(self):
+        with tenant_context('ngo_a'):
+            writer = create_mentor(phone='+254722000001')
+            reader = create_mentor(phone='+254722000002')
+
+        def client_for(mentor):
+            client = APIClient(HTTP_HOST='ngo-a.example.org')
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(mentor.user).access_token}")
+            return client
+
+        def list_resources(client):
+            with CaptureQueriesContext(connections['ngo_a_replica']) as replica:
+                response = client.get(reverse('mentor-resource-list'))
+            self.assertEqual(response.status_code, 200)
+            return any('api_resource' in q['sql'] for q in replica.captured_queries)
+
+        writer_client, reader_client = client_for(writer), client_for(reader)
+        self.assertTrue(list_resources(writer_client))
+
+        response = writer_client.post(reverse('mentor-resource-list'), {
+            'title': 'Python', 'description': '...', 'tags': ['Coding'],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Within the sticky window only the writer is pinned to the primary
+        self.assertFalse(list_resources(writer_client))
+        self.assertTrue(list_resources(reader_client))
+
+        with tenant_context('ngo_a'):
+            cache.delete(sticky_key(f"user:{writer.user.pk}"))
+        self.assertTrue(list_resources(writer_client))
+
+    def test_admin_login_pins_the_new_session(self):
+        with tenant_context('ngo_a'):
+            User.objects.create_superuser(phone='+254700000009', email='admin@example.org', password='secret')
+        client = Client(HTTP_HOST='ngo-a.example.org')
+        response = client.post(reverse('admin:login'), {'username': 'admin@example.org', 'password': 'secret'})
+        self.assertEqual(response.status_code, 302)
+        # The login wrote a session the replica might not have yet
+        with CaptureQueriesContext(connections['ngo_a']) as primary:
+            response = client.get(reverse('admin:api_resource_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('django_session' in q['sql'] for q in primary.captured_queries))
+
+class CompactSerializerTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.mentor = create_mentor()
+        Resource.objects.create(
+            title='Kujifunza 🐍', description='Line\u2028separator "quoted" </script>',
+            tags=['Coding', 'Design'], link='https://example.com/py', sms_text='Jifunze', created_by=self.mentor
+        )
+        Resource.objects.create(title='Figma', description='', tags=[], link=None)
+
+    def test_matches_resource_serializer(self):
+        queryset = Resource.objects.order_by('pk')
+        expected = ResourceSerializer(queryset, many=True).data
+        self.assertEqual(serialize_resources(queryset), expected)
+        self.assertEqual(render_json(serialize_resources(queryset)), JSONRenderer().render(expected))
+
+    @override_settings(TIME_ZONE='Africa/Nairobi')
+    def test_datetimes_follow_active_timezone(self):
+        queryset = Resource.objects.order_by('pk')
+        with timezone.override('Africa/Nairobi'):
+            expected = ResourceSerializer(queryset, many=True).data
+            compact = serialize_resources(queryset)
+        self.assertEqual(compact, expected)
+        self.assertTrue(compact[0]['created_at'].endswith('+03:00'))
+
+    def test_mentor_resource_list_is_unchanged(self):
+        client = APIClient()
+        client.force_authenticate(self.mentor.user)
+        response = client.get(reverse('mentor-resource-list'))
+        expected = ResourceSerializer(Resource.objects.filter(created_by=self.mentor), many=True).data
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class SyncTests(TransactionTestCase):
+    # Cursors hold the snapshot xmin, so changes must be committed to be
+    # seen the way production sees them
+
+    def setUp(self):
+        clear_caches()
+        self.mentee = create_mentee()
+        Mentorship.objects.create(mentee=self.mentee, mentor=create_mentor())
+        words = 'jifunze programu hatua kwa michoro python design kompyuta mtandao ubunifu html css'.split()
+        rng = random.Random(42)
+        Resource.objects.bulk_create([
+            Resource(title=f"Resource {i}", description=' '.join(rng.choices(words, k=40)), tags=['Coding'])
+            for i in range(200)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.mentee.user)
+
+    def sync(self, cursor=None):
+        response = self.client.get(reverse('mentee-sync'), {'cursor': cursor} if cursor else {},
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        # Bodies too small to gain from it are sent uncompressed
+        content = gzip.decompress(response.content) if response.has_header('Content-Encoding') else response.content
+        return json.loads(content), len(response.content)
+
+    def test_delta_is_a_fraction_of_a_full_refresh(self):
+        full, full_bytes = self.sync()
+        self.assertTrue(full['reset'])
+        self.assertFalse(full['has_more'])
+        self.assertEqual(len(full['resources']), 200)
+        self.assertEqual(len(full['mentorships']), 1)
+        self.assertEqual(full['profile']['name'], 'Wanjiru')
+
+        edited, deleted = Resource.objects.order_by('title')[:2]
+        edited.title = 'Python'
+        edited.save()
+        deleted_id = str(deleted.pk)
+        deleted.delete()
+        self.mentee.language = 'sw'
+        self.mentee.save()
+
+        delta, delta_bytes = self.sync(full['cursor'])
+        self.assertFalse(delta['reset'])
+        self.assertEqual([r['title'] for r in delta['resources']], ['Python'])
+        self.assertEqual(delta['deleted'], {'resources': [deleted_id], 'mentorships': []})
+        self.assertEqual(delta['profile']['language'], 'sw')
+        self.assertEqual(delta['mentorships'], [])
+        self.assertLess(delta_bytes * 20, full_bytes)
+
+        idle, _ = self.sync(delta['cursor'])
+        self.assertEqual((idle['resources'], idle['profile'], idle['deleted']['resources']), ([], None, []))
+
+    @override_settings(SYNC_PAGE_SIZE=60)
+    def test_pages_until_caught_up(self):
+        seen, cursor, pages = [], None, 0
+        while True:
+            page, _ = self.sync(cursor)
+            seen += [r['id'] for r in page['resources']]
+            cursor, pages = page['cursor'], pages + 1
+            if pages == 1:
+                Resource.objects.order_by('-change_seq').first().delete()
+            if not page['has_more']:
+                break
+        self.assertEqual(pages, 4)
+        self.assertEqual(len(seen), 199)
+        self.assertEqual(len(page['deleted']['resources']), 1)
+
+    def test_late_commit_below_the_cursor_is_not_skipped(self):
+        first, _ = self.sync()
+        # A write that takes its change number first but commits last
+        other = connections.create_connection('default')
+        try:
+            other.set_autocommit(False)
+            with other.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO api_resource (id, title, description, tags, language, created_at) "
+                    "VALUES (gen_random_uuid(), 'Late', '', '{}', '', now())"
+                )
+            Resource.objects.create(title='Early', description='', tags=[])
+            second, _ = self.sync(first['cursor'])
+            other.commit()
+        finally:
+            other.close()
+        self.assertEqual([r['title'] for r in second['resources']], ['Early'])
+
+        third, _ = self.sync(second['cursor'])
+        self.assertIn('Late', [r['title'] for r in third['resources']])
+
+    @override_settings(SYNC_PAGE_SIZE=60)
+    def test_long_transaction_neither_stalls_nor_repeats_pages(self):
+        first = {'has_more': True, 'cursor': None}
+        while first['has_more']:
+            first, _ = self.sync(first['cursor'])
+        # Holds the snapshot xmin back, as a slow bulk update would
+        other = connections.create_connection('default')
+        try:
+            other.set_autocommit(False)
+            with other.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO api_resource (id, title, description, tags, language, created_at) "
+                    "VALUES (gen_random_uuid(), 'Slow', '', '{}', '', now())"
+                )
+            Resource.objects.bulk_create([Resource(title=f"New {i}", description='', tags=[]) for i in range(150)])
+
+            sent, cursor = [], first['cursor']
+            for _ in range(10):
+                page, _ = self.sync(cursor)
+                sent += [r['title'] for r in page['resources']]
+                cursor = page['cursor']
+                if not page['has_more']:
+                    break
+            self.assertFalse(page['has_more'])
+            other.commit()
+        finally:
+            other.close()
+        # Each row once, rather than every page re-sending the earlier ones
+        self.assertEqual(len(sent), 150)
+        self.assertEqual(len(set(sent)), 150)
+
+        late, _ = self.sync(cursor)
+        self.assertEqual([r['title'] for r in late['resources']], ['Slow'])
+
+    def test_invalid_and_expired_cursors(self):
+        response = self.client.get(reverse('mentee-sync'), {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        stale, _ = self.sync('1.1.1000')
+        self.assertTrue(stale['reset'])
+        self.assertEqual(len(stale['resources']), 200)
+
+        # Cursors issued before they listed running transactions still work
+        legacy, _ = self.sync(stale['cursor'].rsplit('.', 1)[0])
+        self.assertFalse(legacy['reset'])
+        self.assertEqual(legacy['resources'], [])
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli_when_accepted(self):
+        response = self.client.get(reverse('mentee-sync'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(len(json.loads(brotli.decompress(response.content))['resources']), 200)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+
+@override_settings(RATE_LIMITS={'relay_phone': '5/min'}, SMS_CALLBACK_TOKEN='gateway-token')
+class SmsRelayTests(TransactionTestCase):
+    # The outbox records sent messages from its own thread and connection
+
+    def setUp(self):
+        clear_caches()
+        self.mentor = create_mentor(phone='+254722000000')
+        self.wanjiru = create_mentee(phone='+254711000000')
+        self.amina = create_mentee(phone='+254711000001', name='Amina', language='sw')
+        Mentorship.objects.create(mentee=self.wanjiru, mentor=self.mentor)
+        Mentorship.objects.create(mentee=self.amina, mentor=self.mentor)
+        self.gateway = FakeGateway()
+        self.seen = 0
+        self.outbox = RelayOutbox(gateway=self.gateway, pacer=Pacer(1000))
+        patcher = mock.patch('api.relay.relay_outbox', self.outbox)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_inbound(self, phone, text, query='?token=gateway-token', **extra):
+        return self.client.post(reverse('sms-inbound') + query, {
+            'from': phone, 'to': '40100', 'text': text, 'id': 'ATXid_in', 'date': '2026-10-19 12:00:00',
+        }, **extra)
+
+    def inbound(self, phone, text):
+        self.assertEqual(self.post_inbound(phone, text).status_code, 200)
+
+    def sent(self):
+        self.outbox.flush()
+        join_background_threads()
+        # Sliced rather than cleared, so the fake message ids stay unique
+        messages = self.gateway.outbox[self.seen:]
+        self.seen = len(self.gateway.outbox)
+        return messages
+
+    def test_messages_are_relayed_without_numbers(self):
+        self.inbound('+254711000000', 'Habari, nina swali')
+        self.assertEqual(self.sent(), [('+254722000000', 'Wanjiru (#1): Habari, nina swali')])
+
+        # Replies go to whoever wrote last, '#2' picks another mentee
+        self.inbound('+254722000000', 'Uliza tu')
+        self.inbound('+254722000000', '#2 Karibu Amina')
+        self.assertEqual(self.sent(), [
+            ('+254711000000', 'Otieno: Uliza tu'),
+            ('+254711000001', 'Otieno: Karibu Amina'),
+        ])
+        self.assertEqual(OutboundMessage.objects.filter(template='relay').count(), 3)
+
+    def test_anonymous_mentor_is_not_named(self):
+        self.mentor.visibility = 'anonymous'
+        self.mentor.save()
+        self.inbound('+254722000000', '#2 Karibu')
+        self.assertEqual(self.sent(), [('+254711000001', 'Mshauri wako: Karibu')])
+
+    def test_profile_changes_reach_peers_cached_state(self):
+        self.inbound('+254722000000', '#2 Karibu')
+        self.inbound('+254711000001', 'Asante')
+        self.assertEqual([message for _, message in self.sent()], ['Otieno: Karibu', 'Amina (#2): Asante'])
+
+        self.mentor.visibility = 'anonymous'
+        self.mentor.save()
+        self.amina.name = 'Amina W'
+        self.amina.save()
+        self.inbound('+254722000000', '#2 Habari')
+        self.inbound('+254711000001', 'Sawa')
+        self.assertEqual([message for _, message in self.sent()], ['Mshauri wako: Habari', 'Amina W (#2): Sawa'])
+
+        self.mentor.user.phone = '+254722000001'
+        self.mentor.user.save()
+        self.inbound('+254711000001', 'Uko wapi?')
+        self.assertEqual(self.sent(), [('+254722000001', 'Amina W (#2): Uko wapi?')])
+
+    def test_only_the_gateway_can_relay(self):
+        # Anyone can post to the callback claiming to be a mentee
+        self.assertEqual(self.post_inbound('+254711000000', 'Forged', query='').status_code, 403)
+        self.assertEqual(self.post_inbound('+254711000000', 'Forged', query='?token=guess').status_code, 403)
+        self.assertEqual(self.sent(), [])
+
+        response = self.post_inbound('+254711000000', 'Header', query='', HTTP_X_CALLBACK_TOKEN='gateway-token')
+        self.assertEqual(response.status_code, 200)
+        with self.settings(SMS_CALLBACK_TOKEN='', SMS_CALLBACK_IPS=['127.0.0.1']):
+            self.assertEqual(self.post_inbound('+254711000000', 'Allowed', query='').status_code, 200)
+            self.assertEqual(self.post_inbound('+254711000000', 'Stale', query='?token=gateway-token',
+                                               REMOTE_ADDR='10.0.0.9').status_code, 403)
+        self.assertEqual(self.sent(), [
+            ('+254722000000', 'Wanjiru (#1): Header'),
+            ('+254722000000', 'Wanjiru (#1): Allowed'),
+        ])
+
+    def test_sender_is_asked_to_choose(self):
+        self.inbound('+254722000000', 'Hello')
+        [(phone, message)] = self.sent()
+        self.assertEqual(phone, '+254722000000')
+        self.assertTrue(message.endswith('#1 Wanjiru, #2 Amina'))
+
+    def test_unknown_and_unmatched_numbers(self):
+        self.inbound('+254799999999', 'Hello')
+        create_mentee(phone='+254711000002')
+        self.inbound('+254711000002', 'Hello')
+        self.assertEqual(self.sent(), [('+254711000002', SMS_CATALOG['en']['relay_no_mentorship'])])
+
+    def test_cached_conversations_skip_the_database(self):
+        self.inbound('+254711000000', 'One')
+        with self.assertNumQueries(0):
+            self.inbound('+254711000000', 'Two')
+        self.assertEqual(len(self.sent()), 2)
+
+    def test_ended_mentorship_stops_relaying(self):
+        self.inbound('+254711000000', 'One')
+        Mentorship.objects.filter(mentee=self.wanjiru).get().delete()
+        self.inbound('+254711000000', 'Two')
+        self.assertEqual([message for _, message in self.sent()], [
+            'Wanjiru (#1): One', SMS_CATALOG['en']['relay_no_mentorship'],
+        ])
+
+    def test_senders_are_rate_limited(self):
+        for i in range(7):
+            self.inbound('+254711000000', f"Message {i}")
+        self.assertEqual(len(self.sent()), 5)
+
+
+@override_settings(
+    SMS_GATEWAY='api.gateways.FakeGateway',
+    CIRCUIT_FAILURE_THRESHOLD=3,
+    CIRCUIT_RESET_SECONDS=0.2,
+    API_TIMEOUT=0.2,
+    FAULT_SLOW_SECONDS=0.05,
+    BACKGROUND_WORKERS=2,
+)
+class FaultInjectionTests(TransactionTestCase):
+    # Background tasks write from their own threads and connections
+
+    def setUp(self):
+        clear_caches()
+
+    def register(self, count, offset=0):
+        """
+        Complete registrations for known callers, returning the slowest hop
+        """
+        slowest = 0
+        for i in range(offset, offset + count):
+            phone = f"+2547000{i:05d}"
+            cache.set(caller_key(phone), unknown_caller())
+            start = time.perf_counter()
+            response = self.client.post(reverse('ussd-callback'), {
+                'sessionId': f"ATUid_chaos{i}", 'phoneNumber': phone, 'text': '1*Amina*19*1*1,2',
+            })
+            slowest = max(slowest, time.perf_counter() - start)
+            self.assertEqual(response.content.decode(), COMPLETE)
+        return slowest
+
+    def test_circuit_breaker_trips_and_recovers(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker('test', threshold=2, reset_seconds=10, clock=clock)
+        for _ in range(2):
+            with self.assertRaises(InjectedFault), breaker:
+                raise InjectedFault()
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpen), breaker:
+            pass
+
+        # One trial call after the reset time; a failure opens it again
+        clock.sleep(10)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        clock.sleep(10)
+        with breaker:
+            pass
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_unknown_faults_are_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_faults(('api=melt',))
+
+    @mock.patch('api.ussd.store_data_locally')
+    def test_api_partition_keeps_ussd_fast_and_threads_bounded(self, store_data_locally):
+        threads = threading.active_count()
+        with override_settings(FAULTS=['api=partition']):
+            slowest = self.register(12)
+            self.assertLessEqual(threading.active_count(), threads + 2)
+            join_background_threads()
+        self.assertLess(slowest, 0.2)
+        # Every registration is kept, and the breaker spared most of them the timeout
+        self.assertEqual(store_data_locally.call_count, 12)
+        self.assertEqual(breaker_states()['api'], 'open')
+
+        time.sleep(0.2)
+        with override_settings(FAULTS=['api=slow:0']):
+            self.register(1, offset=12)
+            join_background_threads()
+        self.assertEqual(breaker_states()['api'], 'closed')
+
+    def test_sms_gateway_errors_open_the_breaker(self):
+        with override_settings(FAULTS=['sms_gateway=error']):
+            for _ in range(5):
+                ussd.send_sms_async('+254711000000', 'Hello')
+            join_background_threads()
+            self.assertEqual(get_gateway().outbox, [])
+        self.assertEqual(breaker_states()['sms_gateway'], 'open')
+
+        time.sleep(0.2)
+        with override_settings(FAULTS=['sms_gateway=slow']):
+            ussd.send_sms_async('+254711000000', 'Hello')
+            join_background_threads()
+            self.assertEqual(get_gateway().outbox, [('+254711000000', 'Hello')])
+        self.assertEqual(breaker_states()['sms_gateway'], 'closed')
+        self.assertEqual(OutboundMessage.objects.count(), 1)
+
+    def test_database_errors_fall_back_without_failing_hops(self):
+        Resource.objects.create(title="Uploaded", description='...', tags=['Coding'])
+        menu = USSD_CATALOG['en']['resources'].format(category='Coding')
+        with override_settings(FAULTS=['database=error']):
+            for i in range(5):
+                response = self.client.post(reverse('ussd-callback'), {
+                    'sessionId': f"ATUid_db{i}", 'phoneNumber': f"+25471100{i:04d}", 'text': '4*1',
+                })
+                self.assertEqual(response.content.decode(), menu + "1. HTML Basics - structure first\n"
+                                 "2. CSS - make it look good\n3. JavaScript - add interactivity\n")
+        self.assertEqual(breaker_states()['database:default'], 'open')
+
+        time.sleep(0.2)
+        response = self.client.post(reverse('ussd-callback'), {
+            'sessionId': 'ATUid_db9', 'phoneNumber': '+254711009999', 'text': '4*1',
+        })
+        self.assertEqual(response.content.decode(), menu + "1. Uploaded\n")
+
+    def test_background_queue_refuses_work_past_its_limit(self):
+        release = threading.Event()
+        tasks = BackgroundTasks(workers=2, limit=3)
+        accepted = sum(tasks.submit(release.wait) for _ in range(10))
+        self.assertLessEqual(tasks.running, 2)
+        self.assertLessEqual(accepted, 5)
+        self.assertEqual(tasks.refused, 10 - accepted)
+        release.set()
+        join_background_threads()
+        self.assertEqual((len(tasks), tasks.running), (0, 0))
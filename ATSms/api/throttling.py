@@ -0,0 +1,102 @@
+import hashlib
+import time
+from collections.abc import Mapping
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+RATE_LIMIT_KEY = 'rate_limit'
+
+PERIODS = {
+    's': 1,
+    'm': 60,
+    'h': 3600,
+    'd': 86400,
+}
+
+@lru_cache(maxsize=32)
+def parse_rate(rate):
+    """
+    Parse a rate such as '30/min' into (requests, seconds)
+    """
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+def _incr(key, timeout):
+    """
+    Increment a counter, creating it if needed, in as few cache round trips as possible
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+def hit(scope, ident, rate):
+    """
+    Record a request for ident and check it against a sliding window.
+
+    The window is approximated from the current and previous fixed window
+    counters, weighted by how far we are into the current window. Counters
+    use atomic cache increments so every worker sharing the cache sees the
+    same totals. ident is hashed, as it comes from request input and may
+    not be a valid memcached key.
+
+    Returns True if the request is allowed.
+    """
+    limit, period = parse_rate(rate)
+    now = time.time()
+    window = int(now // period)
+    prefix = f"{RATE_LIMIT_KEY}:{scope}:{hashlib.md5(str(ident).encode()).hexdigest()}"
+
+    current = _incr(f"{prefix}:{window}", period * 2)
+    if current > limit:
+        return False
+
+    previous = cache.get(f"{prefix}:{window - 1}", 0)
+    weight = 1 - (now % period) / period
+    return previous * weight + current <= limit
+
+def is_rate_limited(scope, ident):
+    """
+    Check a request against the configured rate for a scope
+    """
+    rate = settings.RATE_LIMITS.get(scope)
+    if not rate or not ident:
+        return False
+    return not hit(scope, ident, rate)
+
+def get_client_ip(request):
+    """
+    Get the client IP. Behind TRUSTED_PROXY_COUNT proxies it is the hop
+    the outermost one appended to X-Forwarded-For, counted from the
+    right: anything further left was sent by the client and can be
+    forged. Otherwise X-Forwarded-For is ignored.
+    """
+    proxies = settings.TRUSTED_PROXY_COUNT
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(',')]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+class AuthRateThrottle(BaseThrottle):
+    """
+    Throttles the auth endpoints per client IP and per submitted phone/email.
+    """
+    def allow_request(self, request, view):
+        if is_rate_limited('auth_ip', get_client_ip(request)):
+            return False
+
+        # Bodies that aren't JSON objects are left for the view to reject with a 400
+        data = request.data if isinstance(request.data, Mapping) else {}
+        ident = data.get('phone') or data.get('email')
+        return not is_rate_limited('auth_account', str(ident) if ident else None)
+
+    def wait(self):
+        rate = settings.RATE_LIMITS.get('auth_ip')
+        return parse_rate(rate)[1] if rate else None
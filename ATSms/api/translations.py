@@ -0,0 +1,114 @@
+"""
+English and Swahili texts for USSD screens and SMS templates.
+
+Screens are compiled once at import into their final response strings,
+so rendering a hop is a plain dict lookup.
+"""
+
+LANGUAGES = ('en', 'sw')
+DEFAULT_LANGUAGE = 'en'
+
+# Each screen is (response type, text): CON keeps the session open, END closes it
+USSD_SCREENS = {
+    'en': {
+        'welcome': ('CON', "Welcome to the Mentorship Platform\n"
+                           "1. Register\n2. Set language (EN/SW)\n3. View tech pathways\n4. Access resources"),
+        'welcome_back': ('CON', "Welcome back, {name}!\n"
+                                "1. My profile\n2. Set language (EN/SW)\n3. View tech pathways\n4. Access resources"),
+        'my_profile': ('END', "{name}, you are registered with interests in {interests}."),
+        'enter_name': ('CON', "Please enter your name"),
+        'enter_age': ('CON', "Enter your age"),
+        'select_county': ('CON', "Select your county\n1. Nairobi\n2. Mombasa\n3. Kisumu\n4. Kakamega\n5. Busia"),
+        'select_interests': ('CON', "Select your interests (separated by commas)\n"
+                                    "1. Coding\n2. Graphics\n3. Animation\n4. Design"),
+        'registration_complete': ('END', "Thank you for registering! We've matched you with a mentor who will "
+                                         "contact you soon. Check your SMS for resources and more information."),
+        'registration_error': ('END', "Error during registration. Please try again later."),
+        'select_language': ('CON', "Select language\n1. English\n2. Swahili"),
+        'language_set': ('END', "Language set to English"),
+        'select_pathway': ('CON', "Select your tech pathway\n1. Coding\n2. Graphics\n3. Animation\n4. Design"),
+        'select_category': ('CON', "Select category\n1. Coding\n2. Graphics\n3. Animation\n4. Design"),
+        'resources': ('END', "{category} Resources:\n"),
+        'rate_limited': ('END', "Too many requests. Please try again in a few minutes."),
+        'invalid_option': ('END', "Invalid option"),
+    },
+    'sw': {
+        'welcome': ('CON', "Karibu kwenye Jukwaa la Ushauri\n"
+                           "1. Jisajili\n2. Chagua lugha (EN/SW)\n3. Njia za teknolojia\n4. Pata rasilimali"),
+        'welcome_back': ('CON', "Karibu tena, {name}!\n"
+                                "1. Wasifu wangu\n2. Chagua lugha (EN/SW)\n3. Njia za teknolojia\n4. Pata rasilimali"),
+        'my_profile': ('END', "{name}, umesajiliwa na unachopenda: {interests}."),
+        'enter_name': ('CON', "Tafadhali weka jina lako"),
+        'enter_age': ('CON', "Weka umri wako"),
+        'select_county': ('CON', "Chagua kaunti yako\n1. Nairobi\n2. Mombasa\n3. Kisumu\n4. Kakamega\n5. Busia"),
+        'select_interests': ('CON', "Chagua unachopenda (tenganisha kwa koma)\n"
+                                    "1. Coding\n2. Graphics\n3. Animation\n4. Design"),
+        'registration_complete': ('END', "Asante kwa kujisajili! Tumekuunganisha na mshauri atakayewasiliana "
+                                         "nawe hivi karibuni. Angalia SMS yako kwa rasilimali na maelezo zaidi."),
+        'registration_error': ('END', "Hitilafu wakati wa usajili. Tafadhali jaribu tena baadaye."),
+        'select_language': ('CON', "Chagua lugha\n1. Kiingereza\n2. Kiswahili"),
+        'language_set': ('END', "Lugha imewekwa kwa Kiswahili"),
+        'select_pathway': ('CON', "Chagua njia yako ya teknolojia\n1. Coding\n2. Graphics\n3. Animation\n4. Design"),
+        'select_category': ('CON', "Chagua aina\n1. Coding\n2. Graphics\n3. Animation\n4. Design"),
+        'resources': ('END', "Rasilimali za {category}:\n"),
+        'rate_limited': ('END', "Maombi mengi mno. Tafadhali jaribu tena baada ya dakika chache."),
+        'invalid_option': ('END', "Chaguo si sahihi"),
+    },
+}
+
+SMS_TEMPLATES = {
+    'en': {
+        # Kept short: the welcome SMS has to fit settings.SMS_MAX_SEGMENTS with its links
+        'welcome_intro': "Hello {name}, welcome to the Mentorship Platform! "
+                         "A mentor in {interests} will contact you soon. Start here:\n",
+        'welcome_link': "- {interest}: {link}\n",
+        'welcome_outro': "Glad to have you on board!",
+        'new_resource': "New {interest} resource: {title}. {details}",
+        'mentor_matched': "Good news {name}! {mentor} is now your mentor and will contact you soon.",
+        'mentor_matched_anonymous': "Good news {name}! You now have a mentor who will contact you soon.",
+        # Relayed messages name the sender but never show their number
+        'relay_message': "{sender}: {text}",
+        'relay_message_numbered': "{sender} (#{number}): {text}",
+        'relay_anonymous_mentor': "Your mentor",
+        'relay_choose': "Start your message with # and a number to choose who it is for: {choices}",
+        'relay_no_mentorship': "You have no active mentorship to send messages to.",
+    },
+    'sw': {
+        'welcome_intro': "Habari {name}, karibu kwenye Jukwaa la Ushauri! "
+                         "Mshauri wa {interests} atawasiliana nawe hivi karibuni. Anza hapa:\n",
+        'welcome_link': "- {interest}: {link}\n",
+        'welcome_outro': "Tunafurahi kuwa nawe!",
+        'new_resource': "Rasilimali mpya ya {interest}: {title}. {details}",
+        'mentor_matched': "Habari njema {name}! {mentor} sasa ni mshauri wako na atawasiliana nawe hivi karibuni.",
+        'mentor_matched_anonymous': "Habari njema {name}! Sasa una mshauri atakayewasiliana nawe hivi karibuni.",
+        'relay_anonymous_mentor': "Mshauri wako",
+        'relay_choose': "Anza ujumbe wako kwa # na nambari kuchagua unayemwandikia: {choices}",
+        'relay_no_mentorship': "Huna ushauri unaoendelea wa kutumia ujumbe.",
+    },
+}
+
+
+def compile_catalog(screens, templates):
+    """
+    Render every screen into its final response string and fill any
+    missing translation from the default language.
+
+    Returns:
+        tuple: (ussd catalog, sms catalog), each keyed by language then message key
+    """
+    ussd = {}
+    sms = {}
+    for language in LANGUAGES:
+        merged = {**screens[DEFAULT_LANGUAGE], **screens.get(language, {})}
+        ussd[language] = {key: f"{kind} {text}" for key, (kind, text) in merged.items()}
+        sms[language] = {**templates[DEFAULT_LANGUAGE], **templates.get(language, {})}
+    return ussd, sms
+
+USSD_CATALOG, SMS_CATALOG = compile_catalog(USSD_SCREENS, SMS_TEMPLATES)
+
+
+def normalize_language(language):
+    """
+    Map any stored language value onto a supported catalog language
+    """
+    return language if language in USSD_CATALOG else DEFAULT_LANGUAGE
@@ -1,46 +1,62 @@
-from django.urls import path, include
-from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from django.urls import path, re_path
 
-from .views import (
-    MenteeLanguageSelectView,
-    MenteeSetupView,
-    MentorSetupView,
-    MatchMentorView,
-    TechPathwayView,
-    MentorResourceView,
-    MenteeResourceView,
-    MenteeQuickSetupView,
-)
-from .ussd import ussd_callback
-from .auth_views import RegisterView
+from .lazy import lazy_view
 
-router = DefaultRouter()
-router.register(r'mentor/upload-resource', MentorResourceView, basename='mentor-resource')
+# Views are imported on first use (see api.lazy); api.warmup imports them
+# all before a web worker takes traffic. Each route repeats the CSRF
+# exemption its view has: every view here is a DRF view or a gateway callback.
 
 urlpatterns = [
-    path('', include(router.urls)),
-    
     # Auth endpoints
-    path('auth/register/', RegisterView.as_view(), name='register'),
-    path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/register/', lazy_view('api.auth_views.RegisterView', csrf_exempt=True), name='register'),
+    path('auth/token/', lazy_view('api.auth_views.ThrottledTokenObtainPairView', csrf_exempt=True), name='token_obtain_pair'),
+    path('auth/token/refresh/', lazy_view('api.auth_views.ThrottledTokenRefreshView', csrf_exempt=True), name='token_refresh'),
     
     # Mentee endpoints
-    path('mentee/language-select/', MenteeLanguageSelectView.as_view(), name='mentee-language-select'),
-    path('mentee/setup/', MenteeSetupView.as_view(), name='mentee-setup'),
-    path('mentee/tech-pathway/', TechPathwayView.as_view(), name='tech-pathway'),
-    path('mentee/resources/', MenteeResourceView.as_view(), name='mentee-resources'),
-    path('mentee/quicksetup/', MenteeQuickSetupView.as_view(), name='mentor-quicksetup'),
+    path('mentee/language-select/', lazy_view('api.views.MenteeLanguageSelectView', csrf_exempt=True), name='mentee-language-select'),
+    path('mentee/setup/', lazy_view('api.views.MenteeSetupView', csrf_exempt=True), name='mentee-setup'),
+    path('mentee/tech-pathway/', lazy_view('api.views.TechPathwayView', csrf_exempt=True), name='tech-pathway'),
+    path('mentee/resources/', lazy_view('api.views.MenteeResourceView', csrf_exempt=True), name='mentee-resources'),
+    path('mentee/quicksetup/', lazy_view('api.views.MenteeQuickSetupView', csrf_exempt=True), name='mentor-quicksetup'),
+    path('mentee/dashboard/', lazy_view('api.views.MenteeDashboardView', csrf_exempt=True), name='mentee-dashboard'),
+    path('mentee/sync/', lazy_view('api.views.SyncView', csrf_exempt=True), name='mentee-sync'),
+    
     
+    # Resource search
+    path('resources/search/', lazy_view('api.views.ResourceSearchView', csrf_exempt=True), name='resource-search'),
+    # App resource views and clicks
+    path('resources/events/', lazy_view('api.views.ResourceEventView', csrf_exempt=True), name='resource-events'),
     
     # Mentor endpoints
-    path('mentor/setup/', MentorSetupView.as_view(), name='mentor-setup'),
+    path('mentor/setup/', lazy_view('api.views.MentorSetupView', csrf_exempt=True), name='mentor-setup'),
     # path('mentee/quicksetup/', MenteeQuickSetupView.as_view(), name='mentor-quicksetup'),
     
+    # Mentor resources, routed by hand as a DefaultRouter would so the viewset can load lazily
+    path('mentor/upload-resource/', lazy_view('api.views.MentorResourceView', {
+        'get': 'list',
+        'post': 'create',
+    }, csrf_exempt=True), name='mentor-resource-list'),
+    path('mentor/upload-resource/<str:pk>/', lazy_view('api.views.MentorResourceView', {
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    }, csrf_exempt=True), name='mentor-resource-detail'),
+    
     # Matching endpoint
-    path('match-mentor/', MatchMentorView.as_view(), name='match-mentor'),
+    path('match-mentor/', lazy_view('api.views.MatchMentorView', csrf_exempt=True), name='match-mentor'),
+    
+    # Analytics
+    path('analytics/supply-demand/', lazy_view('api.views.SupplyDemandView', csrf_exempt=True), name='supply-demand'),
+    path('analytics/delivery/', lazy_view('api.views.DeliveryStatsView', csrf_exempt=True), name='delivery-stats'),
+    
+    # Analytics exports, e.g. export/mentorships.csv or export/mentees.ndjson.gz
+    re_path(r'^export/(?P<dataset>\w+)\.(?P<fmt>csv|ndjson)(?P<gzip>\.gz)?$', lazy_view('api.views.ExportView', csrf_exempt=True), name='export'),
     
     # USSD endpoint
-    path('ussd/callback/', ussd_callback, name='ussd-callback'),
-]
\ No newline at end of file
+    path('ussd/callback/', lazy_view('api.ussd.ussd_callback', csrf_exempt=True), name='ussd-callback'),
+    
+    # SMS delivery reports
+    path('sms/delivery-report/', lazy_view('api.views.delivery_report_callback', csrf_exempt=True), name='sms-delivery-report'),
+    path('sms/inbound/', lazy_view('api.views.sms_inbound_callback', csrf_exempt=True), name='sms-inbound'),
+]
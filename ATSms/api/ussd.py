@@ -1,42 +1,45 @@
-import requests
 import json
-import os
-import africastalking
+import uuid
+from pathlib import Path
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.cache import cache
 from django.conf import settings
-from dotenv import load_dotenv
 import logging
 import threading
 import time
-from functools import lru_cache
 
-# Set up logging with less verbose output for production
-logging.basicConfig(level=logging.WARNING)
-logger = logging.getLogger(__name__)
-
-# Load environment variables once at startup
-load_dotenv()
+from .throttling import is_rate_limited, get_client_ip
+from .translations import USSD_CATALOG, DEFAULT_LANGUAGE
+from .callers import get_caller, get_cached_language, set_caller_language
+from .phone import normalize_phone
+from .delivery import record_outbound
+from .engagement import USSD_VIEW, engagement_events
+from .segments import build_welcome_sms, measure
+from .caching import get_or_build
+from .catalog import CATALOG_NAMESPACE
+from .models import Resource
+from .gateways import get_gateway
+from .tenants import tenant_connection
+from .background import background_tasks
+from .circuits import database_breaker, get_breaker
+from .faults import API, SMS_GATEWAY, api_stub, is_faulted
 
-# API configuration with sane defaults
-API_BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:8000/api/')
-
-# Africa's Talking configuration
-username = os.environ.get('AT_USERNAME', 'sandbox')
-api_key = os.environ.get('AT_API_KEY')
+logger = logging.getLogger(__name__)
 
-# Initialize Africa's Talking SDK once at startup
-if api_key:
-    africastalking.initialize(username, api_key)
-    sms = africastalking.SMS
-else:
-    logger.warning("Africa's Talking API key is missing! SMS functionality will not work.")
-    sms = None
+# Nothing here talks to the network at import: the SMS gateway and the
+# HTTP session are created on first use, so workers boot quickly
+_http_session = None
+_http_session_lock = threading.Lock()
 
 # Cache configuration
 CACHE_TIMEOUT = 3600  # 1 hour cache for static data
 
+# Africa's Talking retries callbacks that respond slowly, so the final
+# registration hop can arrive several times for the same session
+REGISTRATION_DONE_KEY = 'ussd_registration_done'
+REGISTRATION_DEDUP_TIMEOUT = 3600  # well beyond the lifetime of a USSD session
+
 # Preload and cache static data
 COUNTIES = {
     '1': 'Nairobi',
@@ -53,8 +56,8 @@ INTERESTS_MAP = {
     '4': 'Design'
 }
 
-RESOURCE_CACHE_KEY = 'resource_data'
-# Preload resources into cache
+RESOURCE_MENU_KEY = 'resource_menu'
+# Shown when mentors have not uploaded anything for a category yet
 RESOURCES = {
     'Coding': [
         "HTML Basics - structure first",
@@ -78,105 +81,180 @@ RESOURCES = {
     ]
 }
 
-def send_sms_async(recipients, message):
+def get_http_session():
+    """
+    Shared keep-alive session for calls back into the REST API, created
+    on first use so requests is only imported by workers that need it
     """
-    Send SMS asynchronously in a background thread
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                import requests
+                
+                session = requests.Session()
+                session.headers.update({
+                    'Content-Type': 'application/json',
+                    'Accept': 'application/json'
+                })
+                _http_session = session
+    return _http_session
+
+def send_sms_async(recipients, message, template='adhoc'):
+    """
+    Send SMS asynchronously in a background thread. Nothing is sent while
+    the gateway's circuit breaker is open.
     
     Args:
         recipients (str or list): Phone number(s) in international format
         message (str): The message to send
+        template (str): Template name that delivery reports are grouped by
+
+    Returns:
+        bool: False if the background queue refused the message
     """
     def _send(recips, msg):
         try:
-            if sms is None:
-                logger.error("Cannot send SMS - Africa's Talking API not initialized")
-                return
-
             # Format recipients
             if isinstance(recips, str):
                 recips = [recips]
                 
-            formatted_recipients = [
-                f"+{phone}" if not phone.startswith('+') else phone 
-                for phone in recips
-            ]
+            formatted_recipients = [normalize_phone(phone) for phone in recips]
             
             # Send the message
-            response = sms.send(
-                message=msg, 
-                recipients=formatted_recipients,
-                sender_id="10136"
-            )
+            with get_breaker(SMS_GATEWAY):
+                response = get_gateway().send(msg, formatted_recipients)
             
             if response and "SMSMessageData" in response and "Recipients" in response["SMSMessageData"]:
                 successful = any(recipient["status"] == "Success" for recipient in response["SMSMessageData"]["Recipients"])
-                logger.info(f"SMS sent successfully: {successful}")
+                info = measure(msg)
+                logger.info(f"SMS sent successfully: {successful} ({info.segments} {info.encoding} segments)")
+                # Keep message ids so delivery reports can be matched
+                with database_breaker():
+                    record_outbound(response, template, segments=info.segments)
             else:
                 logger.warning(f"SMS sending failed with response: {response}")
         except Exception as e:
             logger.error(f"Failed to send SMS: {e}")
+        finally:
+            tenant_connection().close()
     
-    # Start the SMS sending in a background thread, passing the parameters
-    threading.Thread(target=_send, args=(recipients, message)).start()
+    # Send in the background, passing the parameters
+    return background_tasks.submit(_send, recipients, message)
 
-def send_welcome_sms(phone_number, name, interests):
+def send_welcome_sms(phone_number, name, interests, language=DEFAULT_LANGUAGE):
     """
     Send a welcome SMS with resources to the user after registration
     """
-    interests_str = ', '.join(interests)
-    message = f"Hello {name}, thank you for registering on our Mentorship Platform! "
-    message += f"Based on your interests in {interests_str}, "
-    message += "we've matched you with a mentor who will contact you soon. "
-    message += "Meanwhile, check out these resources:\n"
-    
-    # Only add up to 3 resources to keep SMS short
-    resource_count = 0
-    for interest in interests[:3]:
-        if interest in RESOURCES and resource_count < 3:
-            message += f"- {interest}: https://bit.ly/{interest.lower()}-basics\n"
-            resource_count += 1
-    
-    message += "We're excited to have you on board!"
+    # Up to 3 resource links, added only while they fit the segment budget
+    links = [
+        (interest, f"https://bit.ly/{interest.lower()}-basics")
+        for interest in interests[:3]
+        if interest in RESOURCES
+    ]
+    message, _ = build_welcome_sms(name, interests, links, language)
     
     # Send SMS asynchronously
-    send_sms_async(phone_number, message)
-    return True
+    return send_sms_async(phone_number, message, 'welcome')
+
+def load_resource_menu(category):
+    """
+    Ids and titles of the newest uploaded resources for a category,
+    falling back to the built-in titles, which have no id
+    """
+    with database_breaker():
+        rows = [
+            (str(resource_id), title)
+            for resource_id, title in Resource.objects.filter(tags__contains=[category])
+            .order_by('-created_at')
+            .values_list('id', 'title')[:3]
+        ]
+    return rows or [(None, title) for title in RESOURCES.get(category, ["No resources available"])]
+
+def get_resource_menu(category):
+    """
+    Get the resource menu for a category from the shared cache. The menu
+    is rebuilt by one worker at a time and dropped on every node when a
+    resource changes. If it can't be built, the built-in titles are
+    served without caching them.
+    """
+    try:
+        return get_or_build(
+            CATALOG_NAMESPACE,
+            f"{RESOURCE_MENU_KEY}:{category}",
+            lambda: load_resource_menu(category),
+            CACHE_TIMEOUT
+        )
+    except Exception as e:
+        logger.error(f"Resource menu unavailable: {e}")
+        return [(None, title) for title in RESOURCES.get(category, ["No resources available"])]
 
-@lru_cache(maxsize=128)
 def get_resources_for_category(category):
     """
-    Get cached resources for a category
+    Titles on the resource menu for a category
+    """
+    return [title for _, title in get_resource_menu(category)]
+
+def resource_menu_response(messages, category, mentee_id=None):
+    """
+    Render a category's resource menu and record a view of each uploaded
+    resource on it. Recording only appends to a buffer.
     """
-    if category in RESOURCES:
-        return RESOURCES[category]
-    return ["No resources available"]
+    response = messages['resources'].format(category=category)
+    for i, (resource_id, title) in enumerate(get_resource_menu(category)[:3], 1):  # 3 keeps the screen fast
+        response += f"{i}. {title}\n"
+        if resource_id:
+            engagement_events.add(resource_id, USSD_VIEW, mentee_id)
+    return HttpResponse(response)
 
-def make_api_request_async(endpoint, method='GET', data=None, callback=None):
+def make_api_request_async(endpoint, method='GET', data=None, callback=None, headers=None):
     """
-    Make an API request asynchronously
+    Make an API request asynchronously. Timeouts, connection errors and
+    5xx responses count against the API's circuit breaker, and while it
+    is open the callback gets a failure without a request being made.
     
     Args:
         endpoint (str): The API endpoint to call
         method (str): HTTP method (GET, POST, etc.)
         data (dict): Data to send in the request
         callback (callable): Function to call with the result
+        headers (dict): Extra request headers, such as Authorization
+
+    Returns:
+        bool: False if the background queue refused the request
     """
     def _make_request():
-        url = f"{API_BASE_URL.rstrip('/')}/{endpoint.lstrip('/')}"
+        url = f"{settings.API_BASE_URL.rstrip('/')}/{endpoint.lstrip('/')}"
+        breaker = get_breaker(API)
         try:
-            headers = {
+            request_headers = {
                 'Content-Type': 'application/json',
-                'Accept': 'application/json'
+                'Accept': 'application/json',
+                **(headers or {})
             }
             
-            if method.upper() == 'GET':
-                response = requests.get(url, headers=headers, timeout=10)
-            elif method.upper() == 'POST':
-                response = requests.post(url, json=data, headers=headers, timeout=10)
-            else:
+            if method.upper() not in ('GET', 'POST'):
                 if callback:
                     callback(False, f"Unsupported method: {method}")
                 return
+            if not breaker.allow():
+                if callback:
+                    callback(False, "API circuit is open")
+                return
+            try:
+                if is_faulted(API):
+                    response = api_stub(url, timeout=settings.API_TIMEOUT)
+                elif method.upper() == 'GET':
+                    response = get_http_session().get(url, headers=request_headers, timeout=settings.API_TIMEOUT)
+                else:
+                    response = get_http_session().post(url, json=data, headers=request_headers, timeout=settings.API_TIMEOUT)
+            except Exception:
+                breaker.record_failure()
+                raise
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
                 
             # Try to get JSON response, fall back to text if not JSON
             try:
@@ -196,17 +274,60 @@ def make_api_request_async(endpoint, method='GET', data=None, callback=None):
             if callback:
                 callback(False, f"Request failed: {str(e)}")
     
-    # Start the API request in a background thread
-    threading.Thread(target=_make_request).start()
+    # Run the API request in the background
+    return background_tasks.submit(_make_request)
+
+def registration_dedup_key(session_id, phone_number):
+    """
+    Build the cache key marking a session's registration as completed
+    """
+    return f"{REGISTRATION_DONE_KEY}:{session_id}:{phone_number}"
+
+def claim_registration(session_id, phone_number):
+    """
+    Atomically claim the registration for a session.
+
+    Returns True for the first completion of a session and False for any
+    retried duplicate, which must not repeat the side effects.
+    """
+    return cache.add(
+        registration_dedup_key(session_id, phone_number),
+        True,
+        REGISTRATION_DEDUP_TIMEOUT
+    )
+
+def persist_language(phone_number, language):
+    """
+    Save a caller's language choice to their mentee profile
+    """
+    from .models import Mentee
+    
+    try:
+        with database_breaker():
+            Mentee.objects.filter(user__phone=phone_number).update(language=language)
+    except Exception as e:
+        logger.error(f"Failed to save language: {e}")
+    finally:
+        # This runs outside the request cycle, so nothing else closes the connection
+        tenant_connection().close()
+
+def set_session_language(phone_number, language):
+    """
+    Switch a caller's language immediately and persist it in the background
+    """
+    set_caller_language(phone_number, language)
+    background_tasks.submit(persist_language, phone_number, language)
 
 def store_data_locally(data):
     """
-    Store user data locally as a fallback
+    Store user data locally as a fallback, one file per registration in
+    settings.PENDING_REGISTRATIONS_DIR
     """
     try:
         import datetime
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_path = f"pending_registrations_{timestamp}.json"
+        # Many registrations can complete within the same second
+        file_path = Path(settings.PENDING_REGISTRATIONS_DIR) / f"pending_registrations_{timestamp}_{uuid.uuid4().hex[:8]}.json"
         
         with open(file_path, 'w') as f:
             json.dump(data, f)
@@ -227,35 +348,60 @@ def ussd_callback(request):
     
     # Extract USSD parameters quickly
     session_id = request.POST.get('sessionId', '')
-    phone_number = request.POST.get('phoneNumber', '')
+    phone_number = normalize_phone(request.POST.get('phoneNumber', '')) or ''
     text = request.POST.get('text', '')
     
     # Only log minimal information
     logger.info(f"USSD: {session_id[:8]}..., Text: '{text}'")
     
+    # Reject floods before doing any DB or thread work
+    if (is_rate_limited('ussd_phone', phone_number)
+            or is_rate_limited('ussd_session', session_id)
+            or is_rate_limited('ussd_ip', get_client_ip(request))):
+        logger.warning(f"USSD rate limit hit for session {session_id[:8]}...")
+        return HttpResponse(USSD_CATALOG[get_cached_language(phone_number)]['rate_limited'])
+    
+    # Known callers and their language come from cache, with at most one
+    # indexed lookup the first time a number is seen
+    caller = get_caller(phone_number)
+    language = caller['language']
+    messages = USSD_CATALOG[language]
+    
     # Initial menu - most common case
     if text == '':
-        response = "CON Welcome to the Mentorship Platform\n"
-        response += "1. Register\n2. Set language (EN/SW)\n3. View tech pathways\n4. Access resources"
-        return HttpResponse(response)
+        if caller['mentee_id']:
+            return HttpResponse(messages['welcome_back'].format(name=caller['name']))
+        return HttpResponse(messages['welcome'])
     
     # Handle menu based on first option for faster routing
     first_option = text.split('*')[0] if '*' in text else text
     
+    # Returning mentees see their profile instead of registering again
+    if first_option == '1' and caller['mentee_id']:
+        return HttpResponse(messages['my_profile'].format(
+            name=caller['name'],
+            interests=', '.join(caller['interests'])
+        ))
+    
     # Registration flow
     if first_option == '1':
         parts = text.split('*')
         parts_count = len(parts)
         
         if parts_count == 1:
-            return HttpResponse("CON Please enter your name")
+            return HttpResponse(messages['enter_name'])
         elif parts_count == 2:
-            return HttpResponse("CON Enter your age")
+            return HttpResponse(messages['enter_age'])
         elif parts_count == 3:
-            return HttpResponse("CON Select your county\n1. Nairobi\n2. Mombasa\n3. Kisumu\n4. Kakamega\n5. Busia")
+            return HttpResponse(messages['select_county'])
         elif parts_count == 4:
-            return HttpResponse("CON Select your interests (separated by commas)\n1. Coding\n2. Graphics\n3. Animation\n4. Design")
+            return HttpResponse(messages['select_interests'])
         elif parts_count == 5:
+            # Retried callbacks for an already completed session are no-ops
+            if not claim_registration(session_id, phone_number):
+                logger.info(f"Duplicate registration callback for session {session_id[:8]}...")
+                return HttpResponse(messages['registration_complete'])
+            
             # Handle registration completion
             try:
                 name = parts[1].strip()
@@ -278,7 +424,7 @@ def ussd_callback(request):
                     'name': name,
                     'age': age_int,
                     'county': county,
-                    'language': 'en',
+                    'language': language,
                     'device': 'phone',
                     'interests': interests,
                     'phone_number': phone_number,
@@ -287,103 +433,69 @@ def ussd_callback(request):
                 
                 # Start API request asynchronously with authentication, but return response immediately
                 headers = {
-                    'Authorization': f'Bearer {os.environ.get("API_TOKEN", "")}',
-                    'Content-Type': 'application/json'
+                    'Authorization': f'Bearer {settings.API_TOKEN}',
                 }
                 
-                # Define API callback function
+                # The local backup below already holds the profile if this fails
                 def api_callback(success, result):
                     if success:
                         logger.info("Profile created successfully")
                     else:
-                        logger.error(f"API error: {result}")
-                        # Store locally as backup on API failure
-                        store_data_locally(profile_data)
+                        logger.error(f"API error, registration kept locally: {result}")
                 
-                # Update make_api_request_async call to include auth headers
-                def _make_api_auth_request():
-                    try:
-                        url = f"{API_BASE_URL.rstrip('/')}/mentee/setup/"
-                        response = requests.post(
-                            url, 
-                            json=profile_data, 
-                            headers=headers, 
-                            timeout=10
-                        )
-                        logger.info(f"API status: {response.status_code}")
-                    except Exception as e:
-                        logger.error(f"API request failed: {e}")
-                        store_data_locally(profile_data)
-                
-                # Start API request in background
-                threading.Thread(target=_make_api_auth_request).start()
+                # Queued work is bounded; past the limit, only the local copy is kept
+                queued = make_api_request_async('mentee/setup/', 'POST', profile_data, api_callback, headers)
                 
                 # Send SMS in background
-                send_welcome_sms(phone_number, name, interests)
+                send_welcome_sms(phone_number, name, interests, language)
                 
-                # Store data locally as a backup without waiting
-                threading.Thread(
-                    target=store_data_locally,
-                    args=(profile_data,)
-                ).start()
+                # Store data locally as a backup without waiting, or now if the queue is full
+                if not (queued and background_tasks.submit(store_data_locally, profile_data)):
+                    store_data_locally(profile_data)
                 
                 # Return immediately to improve USSD response time
-                return HttpResponse(
-                    "END Thank you for registering! We've matched you with a mentor who will contact you soon. "
-                    "Check your SMS for resources and more information."
-                )
+                return HttpResponse(messages['registration_complete'])
             except Exception as e:
                 logger.error(f"Registration error: {str(e)}")
-                return HttpResponse("END Error during registration. Please try again later.")
+                # Release the claim so a retry can complete the registration
+                cache.delete(registration_dedup_key(session_id, phone_number))
+                return HttpResponse(messages['registration_error'])
     
     # Language setting flow - simplest flow
     elif first_option == '2':
         if text == '2':
-            return HttpResponse("CON Select language\n1. English\n2. Swahili")
-        elif text == '2*1':
-            return HttpResponse("END Language set to English")
-        elif text == '2*2':
-            return HttpResponse("END Lugha imewekwa kwa Kiswahili")
+            return HttpResponse(messages['select_language'])
+        elif text in ('2*1', '2*2'):
+            chosen = 'en' if text == '2*1' else 'sw'
+            set_session_language(phone_number, chosen)
+            # Confirm in the newly chosen language
+            return HttpResponse(USSD_CATALOG[chosen]['language_set'])
     
     # Tech pathways flow - use cached data
     elif first_option == '3':
         if text == '3':
-            return HttpResponse("CON Select your tech pathway\n1. Coding\n2. Graphics\n3. Animation\n4. Design")
+            return HttpResponse(messages['select_pathway'])
         else:
             parts = text.split('*')
             if len(parts) == 2:
                 pathway_choice = parts[1]
                 pathway = INTERESTS_MAP.get(pathway_choice, 'Unknown')
                 
-                # Get cached resources
-                resources = get_resources_for_category(pathway)
-                
-                response = f"END {pathway} Resources:\n"
-                for i, resource in enumerate(resources, 1):
-                    if i <= 3:  # Limit to 3 resources for faster response
-                        response += f"{i}. {resource}\n"
-                
-                return HttpResponse(response)
+                # Served from cache
+                return resource_menu_response(messages, pathway, caller['mentee_id'])
     
     # Resources flow - use cached data
     elif first_option == '4':
         if text == '4':
-            return HttpResponse("CON Select category\n1. Coding\n2. Graphics\n3. Animation\n4. Design")
+            return HttpResponse(messages['select_category'])
         else:
             parts = text.split('*')
             if len(parts) == 2:
                 category_choice = parts[1]
                 category = INTERESTS_MAP.get(category_choice, 'Unknown')
                 
-                # Get cached resources
-                resources = get_resources_for_category(category)
-                
-                response = f"END {category} Resources:\n"
-                for i, resource in enumerate(resources, 1):
-                    if i <= 3:  # Limit to 3 resources for faster response
-                        response += f"{i}. {resource}\n"
-                
-                return HttpResponse(response)
+                # Served from cache
+                return resource_menu_response(messages, category, caller['mentee_id'])
     
     # Default fallback
-    return HttpResponse("END Invalid option")
\ No newline at end of file
+    return HttpResponse(messages['invalid_option'])
\ No newline at end of file
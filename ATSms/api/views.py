@@ -1,25 +1,59 @@
 from rest_framework import viewsets, status, generics
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.views import APIView
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.exceptions import Throttled
+import hmac
 import logging
 
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.db.models import F, Q
+from django.http import StreamingHttpResponse, HttpResponse, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.db import transaction
+from django.db.models import F, Q, Prefetch
+from django.utils.cache import patch_cache_control
 import random
 
 logger = logging.getLogger(__name__)
 
-from .models import Mentee, Mentor, Mentorship, Resource
+from .models import Mentee, Mentor, Mentorship, Resource, WaitlistEntry
 from .serializers import (
     MenteeLanguageSerializer, 
     MenteeSetupSerializer,
     MentorSetupSerializer,
     MentorshipSerializer,
+    MenteeDashboardSerializer,
     TechPathwaySerializer,
-    ResourceSerializer
+    ResourceSerializer,
+    ResourceEventSerializer
 )
 from .permissions import IsMentor, IsMentee
+from .conditional import conditional_response
+from .compact import CompactJSONRenderer, serialize_resources
+from .encoding import compressed_json_response
+from .catalog import get_resource_list
+from .recommendations import get_recommendations
+from .search import search_resources, SEARCH_CONFIGS
+from .exports import stream_export
+from .analytics import record_match_attempt, get_supply_demand
+from .campaigns import create_resource_campaigns
+from .delivery import delivery_reports, delivery_stats
+from .engagement import engagement_events
+from .waitlist import join_waitlist, waitlist_position
+from .sync import sync_changes
+from .relay import relay
+from .phone import normalize_phone
+from .throttling import is_rate_limited, get_client_ip
+from .tenants import get_tenant, replica_reads, stream_from_replica
+
+# Number of recommended resources shown on the mentee dashboard
+DASHBOARD_RESOURCE_LIMIT = 10
+# Most events the app may send in one request
+EVENT_BATCH_LIMIT = 100
 
 class MenteeLanguageSelectView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated, IsMentee]
@@ -81,6 +115,11 @@ class MatchMentorView(generics.CreateAPIView):
         # Get the mentee
         mentee = get_object_or_404(Mentee, id=mentee_id)
         
+        # Already waiting: a freed slot will match them, so skip the search
+        entry = WaitlistEntry.objects.filter(mentee=mentee).first()
+        if entry is not None:
+            return self.waitlisted(entry)
+        
         # Get mentee's county and interests
         county = mentee.county
         interests = mentee.interests
@@ -102,99 +141,319 @@ class MatchMentorView(generics.CreateAPIView):
             if any(interest in mentor.expertise for interest in interests):
                 matching_mentors.append(mentor)
         
-        if not matching_mentors:
-            return Response({"message": "No matching mentors found"}, status=status.HTTP_404_NOT_FOUND)
-        
-        # Randomly select a mentor
-        selected_mentor = random.choice(matching_mentors)
-        
-        # Create mentorship relation
-        mentorship = Mentorship.objects.create(
-            mentee=mentee,
-            mentor=selected_mentor,
-            status='active'
-        )
-        
-        # Update mentor's mentee count
-        selected_mentor.mentees_count += 1
-        selected_mentor.save()
+        # Try the mentors in random order until one still has a slot
+        random.shuffle(matching_mentors)
+        for mentor in matching_mentors:
+            mentorship = self.claim_slot(mentee, mentor)
+            if mentorship is not None:
+                # Feed match failure rates into the supply/demand analytics
+                record_match_attempt(county, interests, matched=True)
+                serializer = self.get_serializer(mentorship)
+                return Response(serializer.data, status=status.HTTP_201_CREATED)
         
-        serializer = self.get_serializer(mentorship)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        record_match_attempt(county, interests, matched=False)
+        return self.waitlisted(join_waitlist(mentee))
+    
+    def claim_slot(self, mentee, mentor):
+        """
+        Match the mentee with the mentor if they still have a free slot.
+
+        The mentor row is locked and capacity checked again, as waitlist
+        drains and other matches may have taken the slot since the search.
+
+        Returns:
+            Mentorship: The new mentorship, or None if the mentor is full
+        """
+        with transaction.atomic(using=get_tenant()):
+            mentor = Mentor.objects.select_for_update().filter(pk=mentor.pk).first()
+            if mentor is None or mentor.mentees_count >= mentor.max_mentees:
+                return None
+            mentorship = Mentorship.objects.create(mentee=mentee, mentor=mentor, status='active')
+            Mentor.objects.filter(pk=mentor.pk).update(mentees_count=F('mentees_count') + 1)
+        return mentorship
+    
+    def waitlisted(self, entry):
+        return Response({
+            "message": "No matching mentors found. You are on the waitlist and will get an SMS when matched.",
+            "position": waitlist_position(entry),
+        }, status=status.HTTP_202_ACCEPTED)
 
 class TechPathwayView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated, IsMentee]
     serializer_class = TechPathwaySerializer
     
-    def post(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
+    def get_resources(self, data):
+        serializer = self.get_serializer(data=data)
         serializer.is_valid(raise_exception=True)
         
         goal = serializer.validated_data['goal']
         
-        # Get the mentee to check communication preference
-        mentee = get_object_or_404(Mentee, user=request.user)
-        comm_pref = mentee.communication_preference
-        
-        # Fetch resources based on goal/interest
-        resources = Resource.objects.filter(tags__contains=[goal])
-        
-        # Format response based on communication preference
-        if comm_pref == 'ussd':
-            # For USSD, return short summaries
-            result = [{"title": r.title, "sms_text": r.sms_text or r.description[:100]} for r in resources]
-        else:
-            # For app, return full resources
-            serializer = ResourceSerializer(resources, many=True)
-            result = serializer.data
+        # Get the mentee to check language and communication preference
+        mentee = get_object_or_404(Mentee, user=self.request.user)
         
+        # Every resource on the pathway, best for this mentee first; cached per goal
+        resources, etag, last_modified = get_recommendations(
+            [goal], mentee.language, mentee.communication_preference
+        )
+        return goal, resources, etag, last_modified
+    
+    def get(self, request, *args, **kwargs):
+        goal, resources, etag, last_modified = self.get_resources(request.query_params)
+        data = {
+            "goal": goal,
+            "resources": resources
+        }
+        return conditional_response(request, data, etag=etag, last_modified=last_modified)
+    
+    # Only reads, though clients send it as a POST
+    @replica_reads()
+    def post(self, request, *args, **kwargs):
+        goal, resources, etag, last_modified = self.get_resources(request.data)
         return Response({
             "goal": goal,
-            "resources": result
+            "resources": resources
         })
 
 class MentorResourceView(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsMentor]
     serializer_class = ResourceSerializer
+    renderer_classes = [CompactJSONRenderer, BrowsableAPIRenderer]
     
     def get_queryset(self):
         return Resource.objects.filter(created_by=self.request.user.mentor_profile)
     
+    @replica_reads()
+    def list(self, request, *args, **kwargs):
+        # Straight from tuples; creates and updates still validate through ResourceSerializer
+        return Response(serialize_resources(self.get_queryset()))
+    
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    def perform_create(self, serializer):
+        resource = serializer.save()
+        # Announce to interested mentees; the run_campaigns worker sends them
+        create_resource_campaigns(resource)
 
 class MenteeResourceView(generics.ListAPIView):
     permission_classes = [IsAuthenticated, IsMentee]
     serializer_class = ResourceSerializer
+    renderer_classes = [CompactJSONRenderer, BrowsableAPIRenderer]
     
-    def get_queryset(self):
-        queryset = Resource.objects.all()
-        
+    @replica_reads()
+    def list(self, request, *args, **kwargs):
         # Filter by interest if provided
-        interest = self.request.query_params.get('interest', None)
-        if interest:
-            queryset = queryset.filter(tags__contains=[interest])
-            
-        # Get mentee for communication preference
-        mentee = self.request.user.mentee_profile
+        interest = request.query_params.get('interest', None)
+        
+        mentee = request.user.mentee_profile
+        comm_pref = mentee.communication_preference
+        
+        # USSD mentees get short summaries, app mentees full resources
+        if interest or not mentee.interests:
+            resources, etag, last_modified = get_resource_list(interest, comm_pref)
+        else:
+            # Without a filter, rank by the mentee's own interests
+            resources, etag, last_modified = get_recommendations(
+                mentee.interests, mentee.language, comm_pref, settings.RECOMMENDATION_LIMIT
+            )
+        return conditional_response(request, resources, etag=etag, last_modified=last_modified)
+
+class MenteeDashboardView(generics.GenericAPIView):
+    """
+    Everything the mobile app shows on its home screen in one response:
+    profile, active mentorships with mentor names and recommended resources.
+    Served in a constant number of queries with an ETag for cheap re-polls.
+    """
+    permission_classes = [IsAuthenticated, IsMentee]
+    serializer_class = MenteeDashboardSerializer
+    
+    def get_object(self):
+        active_mentorships = Mentorship.objects.filter(status='active').select_related('mentor')
+        queryset = Mentee.objects.prefetch_related(
+            Prefetch('mentorships', queryset=active_mentorships, to_attr='active_mentorships')
+        )
+        return get_object_or_404(queryset, user=self.request.user)
+    
+    def get(self, request, *args, **kwargs):
+        mentee = self.get_object()
+        
+        # USSD mentees get short summaries, app mentees full resources
+        resource_data, _, _ = get_recommendations(
+            mentee.interests, mentee.language, mentee.communication_preference, DASHBOARD_RESOURCE_LIMIT
+        )
         
-        # If USSD communication, we'll handle in get method
-        return queryset
+        data = self.get_serializer(mentee).data
+        data['resources'] = resource_data
+        
+        return conditional_response(request, data, private=True)
+
+
+class SyncView(APIView):
+    """
+    What changed in resources, mentorships and the mentee's profile since
+    the cursor the app last got, compressed for slow, metered networks.
+    See api.sync.
+    """
+    permission_classes = [IsAuthenticated, IsMentee]
     
+    def get(self, request, *args, **kwargs):
+        try:
+            data = sync_changes(request.user, request.query_params.get('cursor'))
+        except ValueError:
+            return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        response = compressed_json_response(request, data)
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+
+
+class ResourceSearchView(generics.ListAPIView):
+    """
+    Full-text search over resource titles, descriptions and tags, with
+    fuzzy title matching for misspellings.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ResourceSerializer
+    
+    @replica_reads()
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            return Response({"error": "Query parameter 'q' is required"}, status=status.HTTP_400_BAD_REQUEST)
         
-        mentee = request.user.mentee_profile
-        comm_pref = mentee.communication_preference
+        language = request.query_params.get('lang', 'en')
+        if language not in SEARCH_CONFIGS:
+            return Response({"error": "lang must be 'en' or 'sw'"}, status=status.HTTP_400_BAD_REQUEST)
         
-        if comm_pref == 'ussd':
-            # For USSD, return short summaries
-            result = [{"title": r.title, "sms_text": r.sms_text or r.description[:100]} for r in queryset]
-            return Response(result)
+        resources = search_resources(term, language)
+        serializer = self.get_serializer(resources, many=True)
+        return Response(serializer.data)
+
+
+class ResourceEventView(APIView):
+    """
+    Record resource views and link clicks from the app, as one event or
+    a list of them. Events are buffered and written in batches, so this
+    returns before they reach the database. A user's repeats of an event
+    count once per batch.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request, *args, **kwargs):
+        # Events feed popularity for everyone, so each account gets a budget
+        if is_rate_limited('resource_events', request.user.pk):
+            raise Throttled()
+        if isinstance(request.data, list):
+            serializer = ResourceEventSerializer(data=request.data, many=True, max_length=EVENT_BATCH_LIMIT)
+            serializer.is_valid(raise_exception=True)
+            events = serializer.validated_data
         else:
-            # For app, return full resources
-            serializer = self.get_serializer(queryset, many=True)
-            return Response(serializer.data)
\ No newline at end of file
+            serializer = ResourceEventSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            events = [serializer.validated_data]
+        
+        mentee_id = None
+        if request.user.is_mentee:
+            mentee_id = Mentee.objects.filter(user=request.user).values_list('id', flat=True).first()
+        accepted = sum(
+            engagement_events.add(str(event['resource']), event['kind'], mentee_id, once_per=request.user.pk)
+            for event in events
+        )
+        return Response({"accepted": accepted}, status=status.HTTP_202_ACCEPTED)
+
+
+class ExportView(APIView):
+    """
+    Stream a dataset as CSV or NDJSON, optionally gzipped, for analysts.
+    Supports county, status, created_after and created_before filters
+    where they apply to the dataset.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    
+    def get(self, request, dataset, fmt, gzip=None):
+        filters = {
+            name: request.query_params.get(name)
+            for name in ('county', 'status', 'created_after', 'created_before')
+        }
+        try:
+            chunks, content_type = stream_export(dataset, fmt, filters, compress=bool(gzip))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        filename = f"{dataset}.{fmt}{gzip or ''}"
+        # Analysts' exports read from the replica, away from USSD traffic
+        response = StreamingHttpResponse(stream_from_replica(chunks), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class SupplyDemandView(generics.GenericAPIView):
+    """
+    Mentee demand against mentor capacity per county and interest, from
+    the summary maintained by the refresh_analytics command.
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    
+    @replica_reads()
+    def get(self, request, *args, **kwargs):
+        rows = get_supply_demand(request.query_params.get('county'))
+        return conditional_response(request, rows, private=True)
+
+
+def is_from_sms_gateway(request):
+    """
+    Whether a callback carries SMS_CALLBACK_TOKEN or comes from one of
+    SMS_CALLBACK_IPS. Anyone can post to the URL, so nothing it says about
+    the sender can be trusted otherwise.
+    """
+    token = request.GET.get('token') or request.headers.get('X-Callback-Token', '')
+    if settings.SMS_CALLBACK_TOKEN and hmac.compare_digest(token.encode(), settings.SMS_CALLBACK_TOKEN.encode()):
+        return True
+    return get_client_ip(request) in settings.SMS_CALLBACK_IPS
+
+def refuse_callback(request, name):
+    logger.warning(f"Refused {name} callback from {get_client_ip(request)}")
+    return HttpResponseForbidden()
+
+@csrf_exempt
+@require_POST
+def delivery_report_callback(request):
+    """
+    Africa's Talking delivery report callback. Reports are buffered and
+    written in batches, so this returns without touching the database.
+    """
+    if not is_from_sms_gateway(request):
+        return refuse_callback(request, 'delivery report')
+    message_id = request.POST.get('id')
+    report_status = request.POST.get('status')
+    if message_id and report_status:
+        delivery_reports.add(message_id, report_status, request.POST.get('failureReason', ''))
+    return HttpResponse("OK")
+
+@csrf_exempt
+@require_POST
+def sms_inbound_callback(request):
+    """
+    Africa's Talking incoming SMS callback, relayed to the other side of
+    the sender's mentorship. Answers from the cache alone.
+    """
+    if not is_from_sms_gateway(request):
+        return refuse_callback(request, 'incoming SMS')
+    phone = normalize_phone(request.POST.get('from'))
+    text = request.POST.get('text', '')
+    if phone and text and not is_rate_limited('relay_phone', phone):
+        relay(phone, text)
+    return HttpResponse("OK")
+
+class DeliveryStatsView(generics.GenericAPIView):
+    """
+    Delivery rates per SMS template and campaign
+    """
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    
+    @replica_reads()
+    def get(self, request, *args, **kwargs):
+        return Response(delivery_stats())
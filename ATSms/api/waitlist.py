@@ -0,0 +1,118 @@
+import logging
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Mentor, Mentorship, User, WaitlistEntry
+from .relay import forget_conversations
+from .segments import build_match_sms
+from .tenants import get_tenant
+from .ussd import send_sms_async
+
+logger = logging.getLogger(__name__)
+
+
+def join_waitlist(mentee):
+    """
+    Put a mentee on the waitlist, keeping their place if already there
+
+    Returns:
+        WaitlistEntry: The mentee's entry
+    """
+    entry, _ = WaitlistEntry.objects.get_or_create(
+        mentee=mentee,
+        defaults={'county': mentee.county, 'interests': mentee.interests}
+    )
+    return entry
+
+def waitlist_position(entry):
+    """
+    1-based place among entries competing for the same mentors
+    """
+    return WaitlistEntry.objects.filter(
+        county=entry.county,
+        interests__overlap=entry.interests,
+        created_at__lt=entry.created_at
+    ).count() + 1
+
+def fill_mentor(mentor_id):
+    """
+    Give a mentor's free slots to the longest-waiting matching mentees.
+
+    The mentor row is locked so two drains can't hand out the same slot,
+    and entries another drain is already taking are skipped.
+
+    Returns:
+        list: (mentee, mentor) pairs matched
+    """
+    with transaction.atomic(using=get_tenant()):
+        mentor = Mentor.objects.select_for_update().filter(pk=mentor_id).first()
+        if mentor is None:
+            return []
+        free = mentor.max_mentees - mentor.mentees_count
+        if free <= 0 or not mentor.counties or not mentor.expertise:
+            return []
+
+        entries = list(
+            WaitlistEntry.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('mentee__user')
+            .filter(county__in=mentor.counties, interests__overlap=mentor.expertise)
+            .order_by('created_at')[:free]
+        )
+        if not entries:
+            return []
+
+        Mentorship.objects.bulk_create([
+            Mentorship(mentee=entry.mentee, mentor=mentor, status='active') for entry in entries
+        ])
+        WaitlistEntry.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+        Mentor.objects.filter(pk=mentor.pk).update(mentees_count=F('mentees_count') + len(entries))
+
+        # bulk_create skips the Mentorship signals that drop cached relay conversations
+        def forget():
+            forget_conversations([
+                *(entry.mentee.user.phone for entry in entries),
+                *User.objects.filter(pk=mentor.user_id).values_list('phone', flat=True),
+            ])
+        transaction.on_commit(forget, using=get_tenant())
+
+    return [(entry.mentee, mentor) for entry in entries]
+
+def drain_waitlist(mentor_ids=None):
+    """
+    Match waitlisted mentees to mentors with free capacity, oldest request
+    first. Costs a single query when nobody is waiting.
+
+    Args:
+        mentor_ids (list): Only consider these mentors, e.g. the one whose
+            capacity just changed. All mentors if None.
+
+    Returns:
+        int: Number of mentees matched
+    """
+    if not WaitlistEntry.objects.exists():
+        return 0
+
+    mentors = Mentor.objects.filter(mentees_count__lt=F('max_mentees'))
+    if mentor_ids is not None:
+        mentors = mentors.filter(pk__in=mentor_ids)
+
+    matched = 0
+    for mentor_id in mentors.order_by('pk').values_list('pk', flat=True):
+        for mentee, mentor in fill_mentor(mentor_id):
+            notify_match(mentee, mentor)
+            matched += 1
+    if matched:
+        logger.info(f"Matched {matched} mentees from the waitlist")
+    return matched
+
+def notify_match(mentee, mentor):
+    """
+    SMS the mentee that a mentor has been found
+    """
+    phone = mentee.user.phone
+    if not phone:
+        return
+    mentor_name = mentor.name if mentor.visibility == 'visible' else None
+    message, _ = build_match_sms(mentee.name, mentor_name, mentee.language)
+    send_sms_async(phone, message, 'waitlist_match')
@@ -0,0 +1,70 @@
+import logging
+import time
+
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from .catalog import get_catalog_version
+from .lazy import LazyView
+from .recommendations import get_index
+from .tenants import each_tenant
+from .ussd import INTERESTS_MAP, get_resource_menu
+
+logger = logging.getLogger(__name__)
+
+
+def iter_callbacks(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_callbacks(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern.callback
+
+def load_views():
+    """
+    Load the URLconf and import every lazily routed view
+    """
+    count = 0
+    for callback in iter_callbacks(get_resolver().url_patterns):
+        if isinstance(callback, LazyView):
+            callback.resolve()
+            count += 1
+    return count
+
+def open_connections():
+    """
+    Connect to every configured database, so the first request skips the
+    handshake. Needs CONN_MAX_AGE for the connection to outlive it.
+    """
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+def fill_caches():
+    """
+    Load the data the first USSD hops and recommendations need into the
+    shared and local caches
+    """
+    for _ in each_tenant():
+        get_catalog_version()
+        get_index()
+        for category in INTERESTS_MAP.values():
+            get_resource_menu(category)
+
+def warm_up():
+    """
+    Get a worker ready for traffic. Each step is best effort: a worker
+    that fails to warm up still boots and pays the cost on first use.
+
+    Returns:
+        dict: Seconds spent per step, None for steps that failed
+    """
+    timings = {}
+    for name, step in (('views', load_views), ('database', open_connections), ('caches', fill_caches)):
+        start = time.perf_counter()
+        try:
+            step()
+            timings[name] = time.perf_counter() - start
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+            timings[name] = None
+    return timings